@@ -0,0 +1,95 @@
+"""
+Benchmark GET /blocks/full: legacy per-block/per-phase reads vs batched hydration vs materialized block trees.
+
+    python benchmarks/bench_blocks_full.py --blocks 200 --phases 8 --latency 0.002
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from shared.memory_store import MemoryFirestore
+from shared.hydration import hydrate_blocks
+from shared.block_trees import iter_block_trees, rebuild_block_trees
+
+
+def legacy_blocks_full(db, main_user_id):
+    # implementation previously used by get_blocks_full, kept for comparison
+    blocks_ref = db.collection('users').document(main_user_id).collection("blocks").get()
+    blocks = []
+    for block_doc in blocks_ref:
+        block_data = block_doc.to_dict()
+        block_data["id"] = block_doc.id
+        phases_ref = block_doc.reference.collection("phases").get()
+        phases = []
+        for phase_doc in phases_ref:
+            phase_data = phase_doc.to_dict()
+            phase_data["id"] = phase_doc.id
+            if phase_data.get("resources") and len(phase_data["resources"]) > 0:
+                resource_id = phase_data["resources"][0]
+                resource_doc = db.collection('users').document(main_user_id).collection("resources").document(resource_id).get()
+                if resource_doc.exists:
+                    resource_data = resource_doc.to_dict()
+                    resource_data["id"] = resource_id
+                    phase_data["resource"] = resource_data
+            phases.append(phase_data)
+        block_data["phases"] = phases
+        blocks.append(block_data)
+    return blocks
+
+
+def seed(db, main_user_id, n_blocks, n_phases, n_resources):
+    user_ref = db.collection('users').document(main_user_id)
+    user_ref.set({"name": "bench", "isMain": True})
+    for r in range(n_resources):
+        user_ref.collection("resources").document(f"res{r:05d}").set(
+            {"name": f"Resource {r}", "mainUserId": main_user_id, "templateId": "t1", "active": True}
+        )
+    for b in range(n_blocks):
+        block_ref = user_ref.collection("blocks").document(f"blk{b:05d}")
+        block_ref.set({"name": f"Block {b}", "mainUserId": main_user_id, "templateId": "t1", "durationType": 1})
+        for p in range(n_phases):
+            block_ref.collection("phases").document(f"ph{p:03d}").set({
+                "name": f"Phase {p}",
+                "duration": 1.5,
+                "mainUserId": main_user_id,
+                "resources": [f"res{(b * n_phases + p) % n_resources:05d}"],
+            })
+    db.stats.reset()
+
+
+def run(label, fn, db, main_user_id):
+    db.stats.reset()
+    start = time.perf_counter()
+    result = fn(db, main_user_id)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} rpcs={db.stats.rpcs:<6} reads={db.stats.reads:<6} time={elapsed * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--phases", type=int, default=8)
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per RPC")
+    args = parser.parse_args()
+
+    db = MemoryFirestore(latency=args.latency)
+    seed(db, "bench-user", args.blocks, args.phases, args.resources)
+
+    print(f"{args.blocks} blocks x {args.phases} phases, {args.resources} resources, {args.latency * 1000:.1f} ms/RPC")
+    legacy = run("legacy", legacy_blocks_full, db, "bench-user")
+    batched = run("hydration", hydrate_blocks, db, "bench-user")
+    assert legacy == batched, "hydration result differs from legacy implementation"
+
+    rebuild_block_trees(db, "bench-user")
+    trees = run("trees", lambda db, main_user_id: list(iter_block_trees(db, main_user_id)), db, "bench-user")
+    assert trees == batched, "block trees differ from hydration"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark OP duration estimates: per-OP Python loop over the block phases vs the vectorized PhaseIndex.
+
+    python benchmarks/bench_estimates.py --ops 100000 --blocks 500 --phases 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from services.full_block.estimates import PhaseIndex, op_block_id
+
+UNIT = {0: 1, 1: 60}
+
+
+def make_input(n_ops, n_blocks, n_phases, seed=1):
+    rnd = random.Random(seed)
+    blocks = [
+        {
+            "id": f"blk{b:05d}",
+            "templateId": "t1",
+            "durationType": rnd.choice([0, 1, 2]),
+            "phases": [{"id": f"ph{p:03d}", "duration": rnd.choice([0.5, 1, 2, 15])} for p in range(rnd.randint(1, n_phases))],
+        }
+        for b in range(n_blocks)
+    ]
+    ops = [{"block": {"id": f"blk{rnd.randrange(n_blocks):05d}"}, "quantity": rnd.randint(1, 20)} for _ in range(n_ops)]
+    return blocks, ops
+
+
+def python_estimates(blocks, ops, day_minutes):
+    # straightforward implementation: walk the phases of the block of every op
+    by_id = {block["id"]: block for block in blocks}
+    result = []
+    for op in ops:
+        block = by_id[op_block_id(op)]
+        unit = day_minutes[block["templateId"]] if block["durationType"] == 2 else UNIT[block["durationType"]]
+        result.append(round(sum(phase["duration"] * unit for phase in block["phases"]) * max(op["quantity"], 1), 2))
+    return result
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<10} time={(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=100000)
+    parser.add_argument("--blocks", type=int, default=500)
+    parser.add_argument("--phases", type=int, default=10)
+    args = parser.parse_args()
+
+    blocks, ops = make_input(args.ops, args.blocks, args.phases)
+    day_minutes = {"t1": 480}
+    print(f"{args.ops} ops, {args.blocks} blocks, up to {args.phases} phases")
+
+    expected = timed("python", lambda: python_estimates(blocks, ops, day_minutes))
+
+    def vectorized():
+        index = PhaseIndex(blocks, day_minutes)
+        return index.estimate([op_block_id(op) for op in ops], [op["quantity"] for op in ops])
+
+    estimates = timed("numpy", vectorized)
+    assert np.allclose(estimates, expected), "vectorized estimates differ from the python loop"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark the JSON response of a large list (GET /ops): FastAPI's default path (jsonable_encoder + JSONResponse)
+vs FastJSONResponse (orjson with the Firestore encoders), plus the gzip/brotli body sizes.
+
+    python benchmarks/bench_json.py --ops 5000 --repeat 5
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from shared.responses import FastJSONResponse, brotli, orjson
+
+BASE = datetime(2026, 11, 2, tzinfo=timezone.utc)
+
+
+def timestamp(rnd):
+    # what the Firestore client returns for timestamp fields
+    value = BASE + timedelta(minutes=rnd.randrange(200000))
+    return DatetimeWithNanoseconds(value.year, value.month, value.day, value.hour, value.minute, tzinfo=timezone.utc)
+
+
+def make_ops(n, seed=1):
+    rnd = random.Random(seed)
+    return [
+        {
+            "id": f"op{i:06d}",
+            "mainUserId": "bench-user",
+            "templateId": "t1",
+            "description": f"Ordem de produção {i}",
+            "code": f"OP-{i}",
+            "dateCreated": timestamp(rnd),
+            "dateLimit": timestamp(rnd),
+            "dateStart": None,
+            "dateEnd": None,
+            "status": rnd.randrange(4),
+            "priority": rnd.randrange(5),
+            "estimatedDuration": round(rnd.uniform(10, 5000), 2),
+            "quantity": rnd.randint(1, 20),
+            "progressPrc": rnd.randrange(101),
+            "inProducing": rnd.random() < 0.3,
+            "active": True,
+            "customColumn": "",
+            "operatorName": None,
+            "block": {"id": f"blk{rnd.randrange(200):04d}", "name": "Bloco", "description": "", "templateId": "t1", "durationType": 0},
+            "phase": None,
+            "resource": None,
+            "createdAt": timestamp(rnd),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(label, fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<22} time={best * 1000:8.1f} ms  bytes={len(body)}")
+    return body, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = {"ops": make_ops(args.ops)}
+    print(f"{args.ops} ops, serializer={'orjson' if orjson else 'pydantic-core'}, brotli={'yes' if brotli else 'no'}")
+
+    default_body, default_time = timed("jsonable_encoder", lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)
+    fast_body, fast_time = timed("FastJSONResponse", lambda: FastJSONResponse(payload).body, args.repeat)
+    assert json.loads(default_body) == json.loads(fast_body), "FastJSONResponse output differs from the default path"
+    print(f"speedup={default_time / fast_time:.1f}x")
+
+    timed("gzip (level 6)", lambda: gzip.compress(fast_body, 6), args.repeat)
+    if brotli is not None:
+        timed("brotli (quality 4)", lambda: brotli.compress(fast_body, quality=4), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark OP import: one create_op per row (template read + add) vs POST /ops/bulk engine.
+
+    python benchmarks/bench_ops_bulk.py --ops 5000 --latency 0.002
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi import HTTPException
+from shared.memory_store import MemoryFirestore
+from services.full_block.bulk import import_ops, iter_body_rows
+from services.full_block.models import OpModel
+
+
+class FakeRequest:
+    # body delivered in 64 KiB chunks, as uvicorn does
+    def __init__(self, body: bytes, content_type: str):
+        self.headers = {"content-type": content_type}
+        self._body = body
+
+    async def stream(self):
+        for i in range(0, len(self._body), 65536):
+            yield self._body[i:i + 65536]
+
+
+def make_rows(n):
+    return [
+        {"code": f"OP{i:06d}", "description": f"Order {i}", "templateId": "t1",
+         "quantity": 1 + i % 20, "priority": i % 5}
+        for i in range(n)
+    ]
+
+
+def template_validator(db):
+    async def validate(template_id, main_user_id):
+        doc = db.collection("users").document(main_user_id).collection("templates").document(template_id).get()
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Template not found")
+    return validate
+
+
+async def one_by_one(db, main_user_id, rows):
+    # what the ERP sync does today: one create_op request per row
+    validate = template_validator(db)
+    ops_ref = db.collection("users").document(main_user_id).collection("ops")
+    for row in rows:
+        op = OpModel(**row)
+        await validate(op.templateId, main_user_id)
+        op_data = op.model_dump(by_alias=True, exclude_unset=True)
+        op_data["mainUserId"] = main_user_id
+        ops_ref.add(op_data)
+
+
+async def bulk(db, main_user_id, rows):
+    body = "\n".join(json.dumps(row) for row in rows).encode()
+    request = FakeRequest(body, "application/x-ndjson")
+    report = await import_ops(db, main_user_id, iter_body_rows(request), template_validator(db))
+    assert report["created"] == len(rows), report["results"][:3]
+
+
+def run(label, fn, rows, latency):
+    db = MemoryFirestore(latency=latency)
+    db.collection("users").document("bench-user").collection("templates").document("t1").set({"user_id": "bench-user"})
+    db.stats.reset()
+    start = time.perf_counter()
+    asyncio.run(fn(db, "bench-user", rows))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} rpcs={db.stats.rpcs:<6} writes={db.stats.writes:<6} "
+          f"time={elapsed * 1000:9.1f} ms  {len(rows) / elapsed:10.0f} OPs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per RPC")
+    args = parser.parse_args()
+
+    rows = make_rows(args.ops)
+    print(f"{args.ops} ops, {args.latency * 1000:.1f} ms/RPC")
+    run("one-by-one", one_by_one, rows, args.latency)
+    run("bulk", bulk, rows, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the incremental rescheduling of production_orders (planner.py) against a full rebuild.
+Applies random OP edits (quantity changes, new OPs, deletions) and exits with status 1 when the
+median edit takes longer than --budget seconds.
+
+    python benchmarks/bench_planner.py --ops 10000 --edits 200 --budget 0.005
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from bench_scheduler import TEMPLATE, make_input
+from services.production_orders.planner import Planner
+from shared.working_calendar import WorkingCalendar
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=10000)
+    parser.add_argument("--phases", type=int, default=10)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--resources", type=int, default=200)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=0.005, help="seconds allowed for the median edit")
+    args = parser.parse_args()
+
+    ops, blocks = make_input(args.ops, args.phases, args.blocks, args.resources)
+    start = datetime(2026, 11, 2, 8, 0)
+    calendar = WorkingCalendar(TEMPLATE, start)
+    print(f"{args.ops} ops x {args.phases} phases, {args.blocks} blocks, {args.resources} resources")
+
+    t0 = time.perf_counter()
+    planner = Planner("tpl", calendar, start, blocks, ops)
+    planner.plan()
+    rebuild = time.perf_counter() - t0
+    print(f"{'rebuild':<12} time={rebuild * 1000:9.1f} ms")
+
+    rnd = random.Random(2)
+    block_ids = list(blocks)
+    live = [op["id"] for op in ops]
+    timings = {"update": [], "create": [], "delete": []}
+    moved = []
+    for e in range(args.edits):
+        kind = rnd.choice(list(timings))
+        t0 = time.perf_counter()
+        if kind == "update":
+            op = dict(planner.jobs[rnd.choice(live)][0])
+            op["quantity"] = rnd.randint(1, 3)
+            result = planner.upsert_op(op)
+        elif kind == "create":
+            op = {"id": f"new{e:05d}", "priority": rnd.randrange(5), "quantity": 1, "status": 0, "active": True,
+                  "block": {"id": rnd.choice(block_ids)}}
+            result = planner.upsert_op(op)
+            live.append(op["id"])
+        else:
+            result = planner.remove_op(live.pop(rnd.randrange(len(live))))
+        timings[kind].append(time.perf_counter() - t0)
+        moved.append(result["moved"])
+
+    every = [t for values in timings.values() for t in values]
+    for kind, values in timings.items():
+        if values:
+            print(f"{kind:<12} n={len(values):4d} median={statistics.median(values) * 1000:7.3f} ms max={max(values) * 1000:8.3f} ms")
+    median = statistics.median(every)
+    print(f"moved median={statistics.median(moved)} max={max(moved)} speedup={rebuild / median:.0f}x")
+    if median > args.budget:
+        print(f"FAIL: median edit took {median:.4f}s, budget {args.budget:.4f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
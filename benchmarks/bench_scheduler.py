@@ -0,0 +1,96 @@
+"""
+Benchmark the finite-capacity scheduler of production_orders (no Firestore, engine only).
+Exits with status 1 when the full plan takes longer than --budget seconds.
+
+    python benchmarks/bench_scheduler.py --ops 10000 --phases 10 --budget 1.0
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.production_orders.scheduler import build_jobs, build_plan, schedule
+from shared.working_calendar import WorkingCalendar
+
+TEMPLATE = {
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+    "weekStart": 1,
+    "weekEnd": 5,
+    "holidays": {"holidays": [{"date": "2026-12-25", "name": "Natal"}, {"date": "2027-01-01", "name": "Ano novo"}]},
+}
+
+
+def make_input(n_ops, n_phases, n_blocks, n_resources, seed=1):
+    rnd = random.Random(seed)
+    blocks = {}
+    for b in range(n_blocks):
+        blocks[f"blk{b:04d}"] = {
+            "id": f"blk{b:04d}",
+            "durationType": 0 if b % 10 else 1,  # mostly minutes, some blocks in hours
+            "phases": [
+                {
+                    "id": f"ph{p:03d}",
+                    "duration": rnd.choice([5, 10, 15, 30, 60]) if b % 10 else rnd.choice([0.25, 0.5, 1]),
+                    "resources": [f"res{rnd.randrange(n_resources):04d}"],
+                }
+                for p in range(n_phases)
+            ],
+        }
+    block_ids = list(blocks)
+    base = datetime(2026, 11, 2)
+    ops = [
+        {
+            "id": f"op{o:06d}",
+            "code": f"OP-{o}",
+            "priority": rnd.randrange(5),
+            "quantity": rnd.randint(1, 3),
+            "dateLimit": base + timedelta(days=rnd.randint(1, 120)),
+            "status": 0,
+            "active": True,
+            "block": {"id": rnd.choice(block_ids)},
+        }
+        for o in range(n_ops)
+    ]
+    return ops, blocks
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} time={elapsed * 1000:9.1f} ms")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=10000)
+    parser.add_argument("--phases", type=int, default=10)
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--resources", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds allowed for the full plan")
+    args = parser.parse_args()
+
+    ops, blocks = make_input(args.ops, args.phases, args.blocks, args.resources)
+    start = datetime(2026, 11, 2, 8, 0)
+    print(f"{args.ops} ops x {args.phases} phases, {args.blocks} blocks, {args.resources} resources")
+
+    calendar, _ = timed("calendar", lambda: WorkingCalendar(TEMPLATE, start))
+    (jobs, _), _ = timed("expand", lambda: build_jobs(ops, blocks, calendar.day_minutes))
+    timed("dispatch", lambda: schedule(jobs, calendar.to_working(start)))
+    plan, elapsed = timed("full plan", lambda: build_plan(ops, blocks, WorkingCalendar(TEMPLATE, start), start))
+
+    late = sum(1 for op in plan["ops"] if op["late"])
+    print(f"scheduled={len(plan['ops'])} late={late} end={max(op['end'] for op in plan['ops'])}")
+    if elapsed > args.budget:
+        print(f"FAIL: full plan took {elapsed:.3f}s, budget {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+End-to-end load test of the three services (auth_template 8001, full_block 8002, production_orders 8003).
+
+The services are started as uvicorn subprocesses with the in-memory storage (STORAGE_BACKEND=memory) seeded
+with synthetic tenants and the stub token verifier (AUTH_VERIFIER=stub), then each scenario is driven for a
+fixed time by concurrent clients. The JSON report (latency percentiles, requests/second, status counts per
+endpoint, startup times, commit) is meant to be compared across commits:
+
+    python -m benchmarks.loadtest run --tenants 5 --blocks 50 --phases 6 --ops 2000 --duration 20 --out report.json
+    python -m benchmarks.loadtest compare old.json report.json
+"""
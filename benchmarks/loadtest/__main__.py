@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from .scenarios import SCENARIOS
+from .seed import make_seed, stub_token, tenant_id, write_seed
+from .services import ROOT, start_services, stop_services
+from .runner import run_scenario
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def run(args) -> int:
+    scenarios = args.scenarios.split(",")
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"unknown scenarios: {', '.join(unknown)} (available: {', '.join(SCENARIOS)})")
+        return 2
+
+    work_dir = tempfile.mkdtemp(prefix="loadtest-")
+    seed_file = os.path.join(work_dir, "seed.json")
+    documents = make_seed(args.tenants, args.templates, args.blocks, args.phases, args.resources, args.ops, args.seed)
+    write_seed(seed_file, documents)
+    print(f"seeded {len(documents)} documents for {args.tenants} tenants in {seed_file}")
+
+    services = start_services(seed_file, work_dir, latency=args.latency, workers=args.workers, monolith=args.monolith)
+    try:
+        urls = {name: service.url for name, service in services.items()}
+        tenants = [{"mainUserId": tenant_id(t), "token": stub_token(tenant_id(t))} for t in range(args.tenants)]
+        options = {"blocks": args.blocks, "bulk_size": args.bulk_size}
+        report = {
+            **git_revision(),
+            "createdAt": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("func", "out")},
+            "documents": len(documents),
+            "startup": {name: service.startup for name, service in services.items()},
+            "scenarios": {},
+        }
+        for name in scenarios:
+            result = run_scenario(name, urls, tenants, options, args.duration, args.concurrency, args.warmup, args.seed)
+            report["scenarios"][name] = result
+            latency = result["latencyMs"]
+            print(
+                f"{name:<12} {result['requests']:7d} req  {result['rps']:8.1f} req/s  errors={result['errors']:<5d}"
+                f" p50={latency.get('p50', 0):8.1f} ms  p99={latency.get('p99', 0):8.1f} ms"
+            )
+            for label, endpoint in result["endpoints"].items():
+                print(f"    {label:<22} {endpoint['requests']:7d} req  p50={endpoint['latencyMs']['p50']:8.1f} ms"
+                      f"  p99={endpoint['latencyMs']['p99']:8.1f} ms  {endpoint['statuses']}")
+    finally:
+        stop_services(services)
+
+    with open(args.out, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    print(f"report written to {args.out} (service logs in {work_dir})")
+    return 1 if any(result["errors"] for result in report["scenarios"].values()) else 0
+
+
+def _change(old, new) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(args) -> int:
+    with open(args.old, encoding="utf-8") as old_file, open(args.new, encoding="utf-8") as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f"old {str(old.get('commit'))[:10]}  ->  new {str(new.get('commit'))[:10]}")
+    regressions = []
+    for name, new_result in new["scenarios"].items():
+        old_result = old["scenarios"].get(name)
+        if old_result is None:
+            continue
+        rows = [("rps", old_result["rps"], new_result["rps"], False)] + [
+            (key, old_result["latencyMs"].get(key), new_result["latencyMs"].get(key), True) for key in ("p50", "p99")
+        ]
+        print(name)
+        for key, old_value, new_value, lower_is_better in rows:
+            print(f"    {key:<4} {old_value:>10} -> {new_value:>10}  {_change(old_value, new_value)}")
+            if args.max_regression is not None and old_value:
+                change = (new_value - old_value) / old_value
+                if (change if lower_is_better else -change) > args.max_regression:
+                    regressions.append(f"{name} {key}")
+    if regressions:
+        print(f"FAIL: regression above {args.max_regression:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="start the services and drive the scenarios")
+    run_parser.add_argument("--scenarios", default="polling,blocks_full,bulk,mixed", help=f"comma separated: {', '.join(SCENARIOS)}")
+    run_parser.add_argument("--tenants", type=int, default=5)
+    run_parser.add_argument("--templates", type=int, default=2)
+    run_parser.add_argument("--blocks", type=int, default=50)
+    run_parser.add_argument("--phases", type=int, default=6)
+    run_parser.add_argument("--resources", type=int, default=30)
+    run_parser.add_argument("--ops", type=int, default=2000, help="OPs per tenant")
+    run_parser.add_argument("--bulk-size", type=int, default=200, help="rows per POST /ops/bulk")
+    run_parser.add_argument("--duration", type=float, default=20, help="measured seconds per scenario")
+    run_parser.add_argument("--warmup", type=float, default=2, help="seconds per scenario not measured")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of auth_template and full_block")
+    run_parser.add_argument("--monolith", action="store_true", help="run the routers in one process (root main.py)")
+    run_parser.add_argument("--latency", type=float, default=0.0, help="seconds added per storage RPC")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--out", default="loadtest-report.json")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--max-regression", type=float, default=None, help="ex: 0.2 fails on a 20%% worse rps/p50/p99")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from .scenarios import SCENARIOS, pick
+
+REQUEST_TIMEOUT = 60
+
+
+class Client:
+    # one per worker thread: its own HTTP session, random generator and ETags
+    def __init__(self, urls: dict, tenants: list, options: dict, seed: int):
+        self.urls = urls
+        self.tenants = tenants
+        self.options = options
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        self.etags = {}
+
+    def tenant(self) -> dict:
+        return self.random.choice(self.tenants)
+
+    def _headers(self, tenant: dict, headers=None) -> dict:
+        return {"Authorization": f"Bearer {tenant['token']}", "Accept-Encoding": "gzip", **(headers or {})}
+
+    def get(self, service: str, path: str, tenant: dict, headers=None):
+        return self.session.get(self.urls[service] + path, headers=self._headers(tenant, headers), timeout=REQUEST_TIMEOUT)
+
+    def post(self, service: str, path: str, tenant: dict, data=None, headers=None):
+        return self.session.post(
+            self.urls[service] + path, data=data, headers=self._headers(tenant, headers), timeout=REQUEST_TIMEOUT
+        )
+
+
+def percentiles(latencies: list) -> dict:
+    # milliseconds, nearest rank
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))] * 1000
+
+    return {
+        "p50": round(rank(0.50), 2),
+        "p90": round(rank(0.90), 2),
+        "p99": round(rank(0.99), 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _summary(samples: list, elapsed: float) -> dict:
+    latencies = [latency for _, _, latency in samples]
+    statuses = defaultdict(int)
+    for _, status, _ in samples:
+        statuses[str(status)] += 1
+    errors = sum(count for status, count in statuses.items() if status == "error" or int(status) >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "latencyMs": percentiles(latencies),
+    }
+
+
+def run_scenario(name: str, urls: dict, tenants: list, options: dict, duration: float, concurrency: int,
+                 warmup: float = 2.0, seed: int = 1) -> dict:
+    """
+    Drives the scenario with `concurrency` threads for `duration` seconds (after `warmup` seconds not measured).
+    """
+    mix = SCENARIOS[name]
+    samples = []
+    samples_lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    def worker(index: int):
+        client = Client(urls, tenants, options, seed * 1000 + index)
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            action = pick(mix, client.random)
+            t0 = time.perf_counter()
+            try:
+                label, response = action(client)
+                status = response.status_code
+            except requests.RequestException:
+                label, status = action.__name__, "error"
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                local.append((label, status, t1 - t0))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = duration
+    by_endpoint = defaultdict(list)
+    for label, status, latency in samples:
+        by_endpoint[label].append((label, status, latency))
+    report = {"durationSeconds": duration, "concurrency": concurrency, **_summary(samples, elapsed)}
+    report["endpoints"] = {label: _summary(items, elapsed) for label, items in sorted(by_endpoint.items())}
+    return report
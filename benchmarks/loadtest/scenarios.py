@@ -0,0 +1,83 @@
+import json
+import random
+
+# Request mixes. Each action does one request for a random tenant and returns (endpoint label, response).
+# The list endpoints are polled like the clients do: the ETag of the previous answer is sent in If-None-Match.
+
+
+def _poll(client, service: str, path: str, label: str):
+    tenant = client.tenant()
+    key = (tenant["mainUserId"], service, path)
+    headers = {}
+    if key in client.etags:
+        headers["If-None-Match"] = client.etags[key]
+    response = client.get(service, path, tenant, headers=headers)
+    if response.headers.get("ETag"):
+        client.etags[key] = response.headers["ETag"]
+    return label, response
+
+
+def templates(client):
+    return _poll(client, "auth_template", "/templates", "GET /templates")
+
+
+def resource_types(client):
+    return _poll(client, "auth_template", "/resources-types", "GET /resources-types")
+
+
+def blocks(client):
+    return _poll(client, "full_block", "/blocks", "GET /blocks")
+
+
+def resources(client):
+    return _poll(client, "full_block", "/resources", "GET /resources")
+
+
+def ops(client):
+    return _poll(client, "full_block", "/ops?limit=200", "GET /ops")
+
+
+def schedule(client):
+    return "GET /schedule", client.get("production_orders", "/schedule", client.tenant())
+
+
+def blocks_full(client):
+    # full catalog load (first screen of the planner), no conditional request
+    return "GET /blocks/full", client.get("full_block", "/blocks/full", client.tenant())
+
+
+def bulk_ops(client):
+    tenant = client.tenant()
+    rnd = client.random
+    rows = [
+        {
+            "description": f"Carga {rnd.randrange(10 ** 9)}", "code": f"LT-{rnd.randrange(10 ** 9)}",
+            "templateId": "tpl000", "quantity": rnd.randint(1, 3), "priority": rnd.randrange(5),
+            "block": {
+                "id": f"blk{rnd.randrange(client.options['blocks']):05d}", "name": "Bloco", "description": "",
+                "templateId": "tpl000", "durationType": 0,
+            },
+        }
+        for _ in range(client.options["bulk_size"])
+    ]
+    body = "\n".join(json.dumps(row) for row in rows)
+    response = client.post(
+        "full_block", "/ops/bulk", tenant, data=body.encode(), headers={"Content-Type": "application/x-ndjson"}
+    )
+    return "POST /ops/bulk", response
+
+
+POLLING = [(1, templates), (1, resource_types), (2, blocks), (2, resources), (3, ops), (1, schedule)]
+
+SCENARIOS = {
+    "polling": POLLING,
+    "blocks_full": [(1, blocks_full)],
+    "bulk": [(1, bulk_ops)],
+    # ~80% polling, ~15% catalog loads, ~5% imports
+    "mixed": POLLING + [(2, blocks_full), (0.5, bulk_ops)],
+}
+
+
+def pick(mix, rnd: random.Random):
+    weights = [weight for weight, _ in mix]
+    return rnd.choices([action for _, action in mix], weights=weights)[0]
@@ -0,0 +1,100 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+
+# Synthetic tenants written as a MEMORY_SEED_FILE ({document path: data}), same shapes the services write.
+TEMPLATE = {
+    "name": "Padrão",
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+    "weekStart": 1,
+    "weekEnd": 5,
+    "holidays": {"holidays": [{"date": "2026-12-25", "name": "Natal"}]},
+}
+RESOURCE_TYPES = ["Máquina", "Operador", "Bancada"]
+BASE_DATE = datetime(2026, 11, 2, tzinfo=timezone.utc)
+
+
+def _timestamp(value: datetime) -> dict:
+    return {"$timestamp": value.isoformat()}
+
+
+def tenant_id(index: int) -> str:
+    return f"loadtest-{index:03d}"
+
+
+def make_tenant(main_user_id: str, templates: int, blocks: int, phases: int, resources: int, ops: int, rnd) -> dict:
+    user_path = f"users/{main_user_id}"
+    created = _timestamp(BASE_DATE - timedelta(days=30))
+    documents = {
+        user_path: {
+            "name": main_user_id, "email": f"{main_user_id}@loadtest.local", "role": "main",
+            "mainUserId": main_user_id, "selectedTemplate": "tpl000", "createdAt": created,
+        },
+    }
+    for t in range(templates):
+        documents[f"{user_path}/templates/tpl{t:03d}"] = {**TEMPLATE, "name": f"Template {t}", "user_id": main_user_id}
+    for i, name in enumerate(RESOURCE_TYPES):
+        documents[f"{user_path}/resourcesTypes/type{i:02d}"] = {"name": name, "mainUserId": main_user_id, "createdAt": created}
+
+    template_ids = [f"tpl{t:03d}" for t in range(templates)]
+    resource_ids = []
+    for r in range(resources):
+        resource_id = f"res{r:05d}"
+        resource_ids.append(resource_id)
+        documents[f"{user_path}/resources/{resource_id}"] = {
+            "name": f"Recurso {r}", "description": "", "code": f"R{r}", "type": RESOURCE_TYPES[r % len(RESOURCE_TYPES)],
+            "templateId": template_ids[r % templates], "mainUserId": main_user_id, "active": True, "createdAt": created,
+        }
+
+    block_docs = {}
+    for b in range(blocks):
+        block_id = f"blk{b:05d}"
+        block = {
+            "name": f"Bloco {b}", "description": "", "mainUserId": main_user_id,
+            "templateId": template_ids[b % templates], "durationType": 0, "createdAt": created,
+        }
+        block_docs[block_id] = block
+        documents[f"{user_path}/blocks/{block_id}"] = block
+        for p in range(phases):
+            documents[f"{user_path}/blocks/{block_id}/phases/ph{p:03d}"] = {
+                "name": f"Fase {p}", "description": "", "duration": rnd.choice([5, 10, 15, 30, 60]),
+                "mainUserId": main_user_id, "templateId": block["templateId"],
+                "resources": [rnd.choice(resource_ids)] if resource_ids else [], "createdAt": created,
+            }
+
+    block_ids = list(block_docs)
+    for o in range(ops):
+        block_id = rnd.choice(block_ids) if block_ids else None
+        block = block_docs.get(block_id) or {}
+        documents[f"{user_path}/ops/op{o:06d}"] = {
+            "description": f"Ordem {o}", "code": f"OP-{o}", "templateId": block.get("templateId", template_ids[0]),
+            "mainUserId": main_user_id, "status": 0, "priority": rnd.randrange(5), "quantity": rnd.randint(1, 3),
+            "estimatedDuration": 0.0, "progressPrc": 0, "active": True,
+            "dateCreated": created, "dateLimit": _timestamp(BASE_DATE + timedelta(days=rnd.randint(1, 120))),
+            "block": {"id": block_id, **{key: block[key] for key in ("name", "description", "templateId", "durationType")}}
+            if block_id else None,
+            "createdAt": created,
+        }
+    return documents
+
+
+def make_seed(tenants: int, templates: int, blocks: int, phases: int, resources: int, ops: int, seed: int = 1) -> dict:
+    rnd = random.Random(seed)
+    documents = {}
+    for t in range(tenants):
+        documents.update(make_tenant(tenant_id(t), templates, blocks, phases, resources, ops, rnd))
+    return documents
+
+
+def write_seed(path: str, documents: dict) -> None:
+    with open(path, "w", encoding="utf-8") as seed_file:
+        json.dump(documents, seed_file)
+
+
+def stub_token(main_user_id: str, hours: int = 24) -> str:
+    # accepted by AUTH_VERIFIER=stub (signature not checked)
+    claims = {"uid": main_user_id, "role": "main", "mainUserId": main_user_id, "exp": int(time.time()) + hours * 3600}
+    return jwt.encode(claims, "loadtest-stub-token-signing-key-0", algorithm="HS256")
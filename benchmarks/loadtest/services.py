@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# name -> (uvicorn app, port); the monolith (root main.py) serves the three on one port
+SERVICES = {
+    "auth_template": ("services.auth_template.main:app", 8001),
+    "full_block": ("services.full_block.main:app", 8002),
+    "production_orders": ("services.production_orders.main:app", 8003),
+}
+MONOLITH = ("main:app", 8000)
+READY_TIMEOUT = 60
+
+
+class ServiceProcess:
+    def __init__(self, name: str, process: subprocess.Popen, port: int, log_path: str):
+        self.name = name
+        self.process = process
+        self.port = port
+        self.log_path = log_path
+        self.url = f"http://127.0.0.1:{port}"
+        self.startup = {}
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> dict:
+        # GET /ready answers 200 after the lifespan ran (memory store seeded)
+        started = time.perf_counter()
+        while time.perf_counter() - started < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with {self.process.returncode}, see {self.log_path}")
+            try:
+                response = requests.get(f"{self.url}/ready", timeout=1)
+                if response.status_code == 200:
+                    self.startup = {**response.json(), "readySeconds": round(time.perf_counter() - started, 3)}
+                    return self.startup
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"{self.name} not ready after {timeout}s, see {self.log_path}")
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def start_services(seed_file: str, log_dir: str, latency: float = 0.0, workers: int = 1, names=None,
+                   monolith: bool = False) -> dict:
+    """
+    Starts the services with uvicorn on the memory backend and waits until they are ready.
+
+    Args:
+        seed_file: MEMORY_SEED_FILE loaded by every service (each process has its own copy of the data).
+        latency: MEMORY_LATENCY, seconds added per storage RPC.
+        workers: uvicorn workers of auth_template and full_block (production_orders keeps one).
+        monolith: one process with every router (one copy of the data, events in process), same names returned.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    base_env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "STORAGE_BACKEND": "memory",
+        "AUTH_VERIFIER": "stub",
+        "MEMORY_SEED_FILE": os.path.abspath(seed_file),
+        "MEMORY_LATENCY": str(latency),
+        "INTERNAL_API_KEY": "loadtest",
+        "PLANNER_EVENTS_URL": f"http://127.0.0.1:{SERVICES['production_orders'][1]}/schedule/events",
+    }
+    if monolith:
+        base_env.pop("PLANNER_EVENTS_URL")
+        targets = {"monolith": MONOLITH}
+    else:
+        targets = {name: SERVICES[name] for name in names or SERVICES}
+    processes = {}
+    try:
+        for name, (app, port) in targets.items():
+            log_path = os.path.join(log_dir, f"{name}.log")
+            command = [
+                sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers if name in ("auth_template", "full_block") else 1), "--log-level", "warning",
+            ]
+            with open(log_path, "w") as log_file:
+                process = subprocess.Popen(command, cwd=ROOT, env=base_env, stdout=log_file, stderr=subprocess.STDOUT)
+            processes[name] = ServiceProcess(name, process, port, log_path)
+        for service in processes.values():
+            service.wait_ready()
+    except Exception:
+        stop_services(processes)
+        raise
+    if monolith:
+        return {name: processes["monolith"] for name in names or SERVICES}
+    return processes
+
+
+def stop_services(processes: dict) -> None:
+    for service in processes.values():
+        service.stop()
@@ -1,8 +1,48 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # before any other import, reported as importSeconds (shared/lifecycle.py)
+
 from fastapi import FastAPI
 
-app = FastAPI()  #uvicorn main:app look for main.py file in instance app
+from shared.responses import FastJSONResponse, CompressionMiddleware
+from shared.lifecycle import health_router, service_lifespan
+from shared.metrics import MetricsMiddleware, metrics_router
+from shared.logs import LogContextMiddleware
+
+from services.auth_template.main import resume_deletion_jobs, users_router
+from services.auth_template.template import template_router
+from services.auth_template.resource_types import resources_type_router
+from services.full_block.blocks import blocks_router
+from services.full_block.phases import phases_router
+from services.full_block.resources import resources_router
+from services.full_block.ops import op_router
+from services.production_orders.schedule import schedule_router
+
+# Monolith mode: the routers of the three services in one process, for small sites. One Firebase app,
+# one gRPC channel and one set of caches instead of one per container, and the change events of
+# full_block go to the planner in process (schedule.py subscribes it on import, shared/events.py)
+# instead of PLANNER_EVENTS_URL. Run from the repository root with one worker, the planner lives in memory:
+#   uvicorn main:app --host 0.0.0.0 --port 8000 --workers 1
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=service_lifespan("monolith", resume_deletion_jobs, import_started=IMPORT_STARTED))  #uvicorn main:app look for main.py file in instance app
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(LogContextMiddleware)
+app.add_middleware(MetricsMiddleware, service="monolith")
+
+app.include_router(health_router)
+app.include_router(metrics_router)
+
+# auth_template
+app.include_router(template_router)
+app.include_router(resources_type_router)
+app.include_router(users_router)
+# full_block
+app.include_router(blocks_router)
+app.include_router(phases_router)
+app.include_router(resources_router)
+app.include_router(op_router)
+# production_orders
+app.include_router(schedule_router)
 
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to Planejafacil API"}
\ No newline at end of file
+    return {"message": "Welcome to Planejafacil API"}
@@ -0,0 +1,323 @@
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from firebase_admin import firestore
+from google.cloud.firestore_v1 import FieldFilter
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, BulkRetry
+from shared.config import db, fb_auth
+from shared.config import logger
+from shared.auth import evict_user_tokens
+from shared.repository import user_document
+
+# Recursive tenant deletion as a background job.
+# The job document (deletion_jobs/{user_id}) keeps the status and progress, so an interrupted job
+# can be started again: deleted documents are gone and the walk only finds what is left.
+# Collections are walked by a pool of workers (one collection page at a time), documents are deleted
+# through a throttled BulkWriter and the child users are removed from Firebase Auth in batches.
+# A run first claims the job in a transaction (leaseOwner/leaseExpiresAt, renewed while it runs), so with
+# several workers or replicas only one of them runs a job; the others wait for the lease to expire.
+DELETION_WORKERS = int(os.getenv("DELETION_WORKERS", "8"))
+DELETION_PAGE_SIZE = int(os.getenv("DELETION_PAGE_SIZE", "300"))
+DELETION_MAX_OPS_PER_SECOND = int(os.getenv("DELETION_MAX_OPS_PER_SECOND", "500"))
+PROGRESS_EVERY = 500  # documents between job progress updates
+AUTH_DELETE_BATCH = 1000  # fb_auth.delete_users limit
+DELETION_LEASE_SECONDS = int(os.getenv("DELETION_LEASE_SECONDS", "120"))
+
+# legacy top-level collections linked by user_id
+LEGACY_COLLECTIONS = ['templates', 'blocks', 'phases', 'resources']
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_running = set()  # job ids running in this process
+_running_lock = threading.Lock()
+
+
+def job_ref(job_id: str):
+    return db.collection('deletion_jobs').document(job_id)
+
+
+def create_deletion_job(user_id: str, requested_by: str) -> dict:
+    """
+    Creates (or returns the unfinished) deletion job of a main user. The job id is the user id.
+    """
+    ref = job_ref(user_id)
+    job_doc = ref.get()
+    if job_doc.exists and job_doc.to_dict().get('status') in (JOB_PENDING, JOB_RUNNING):
+        return {"id": user_id, **job_doc.to_dict()}
+
+    if job_doc.exists and job_doc.to_dict().get('status') == JOB_FAILED:
+        # retry: keep childUsers (the child_users subcollection may be deleted already) and the progress
+        retry = {'status': JOB_PENDING, 'error': None, 'updatedAt': firestore.SERVER_TIMESTAMP}
+        ref.update(retry)
+        return {"id": user_id, **job_doc.to_dict(), **retry}
+
+    job = {
+        'userId': user_id,
+        'requestedBy': requested_by,
+        'status': JOB_PENDING,
+        'deletedDocuments': 0,
+        'deletedChildUsers': 0,
+        'error': None,
+        'createdAt': firestore.SERVER_TIMESTAMP,
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    }
+    ref.set(job)
+    return {"id": user_id, **job}
+
+
+def get_deletion_job(job_id: str):
+    job_doc = job_ref(job_id).get()
+    if not job_doc.exists:
+        return None
+    return {"id": job_id, **job_doc.to_dict()}
+
+
+def unfinished_job_ids() -> list:
+    # jobs interrupted by a restart, resumed at startup
+    query = db.collection('deletion_jobs').where(filter=FieldFilter('status', 'in', [JOB_PENDING, JOB_RUNNING]))
+    return [doc.id for doc in query.stream()]
+
+
+@firestore.transactional
+def _claim_job(transaction, ref, owner: str):
+    # the job when this owner may run it: not done and without a live lease of another owner
+    snapshot = ref.get(transaction=transaction)
+    job = snapshot.to_dict() if snapshot.exists else None
+    if job is None or job.get('status') == JOB_DONE:
+        return None
+    now = datetime.now(timezone.utc)
+    expires = job.get('leaseExpiresAt')
+    if job.get('leaseOwner') not in (None, owner) and expires is not None and expires > now:
+        return None
+    transaction.update(ref, {
+        'status': JOB_RUNNING,
+        'leaseOwner': owner,
+        'leaseExpiresAt': now + timedelta(seconds=DELETION_LEASE_SECONDS),
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    })
+    return job
+
+
+def claim_deletion_job(job_id: str, owner: str):
+    """
+    Claims a deletion job for `owner`.
+
+    Returns:
+        The job data, or None when it is done, missing or leased by another owner.
+    """
+    return _claim_job(db.transaction(), job_ref(job_id), owner)
+
+
+def _renew_lease(ref, owner: str, stop: threading.Event) -> None:
+    while not stop.wait(DELETION_LEASE_SECONDS / 3):
+        try:
+            ref.update({'leaseExpiresAt': datetime.now(timezone.utc) + timedelta(seconds=DELETION_LEASE_SECONDS)})
+        except Exception as e:
+            logger.warning("Lease of deletion job %s not renewed by %s: %s", ref.id, owner, str(e))
+
+
+def resume_deletion_job(job_id: str) -> None:
+    """
+    Runs an unfinished job found at startup (blocking, meant for a thread). When another process holds
+    the lease, waits for it to expire (owner gone) or for the job to finish.
+    """
+    while True:
+        job = get_deletion_job(job_id)
+        if job is None or job.get('status') in (JOB_DONE, JOB_FAILED):
+            return
+        if run_deletion_job(job_id):
+            return
+        expires = job.get('leaseExpiresAt')
+        wait = (expires - datetime.now(timezone.utc)).total_seconds() if expires else 0
+        time.sleep(max(wait, 0) + 1)
+
+
+def run_deletion_job(job_id: str) -> bool:
+    """
+    Runs a deletion job (blocking, meant for BackgroundTasks or a thread). Safe to call again to resume.
+
+    Returns:
+        False when the job was not run: done, or claimed by another worker.
+    """
+    with _running_lock:
+        if job_id in _running:
+            logger.info("Deletion job %s already running", job_id)
+            return False
+        _running.add(job_id)
+
+    ref = job_ref(job_id)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    stop_renewal = threading.Event()
+    try:
+        job = claim_deletion_job(job_id, owner)
+        if job is None:
+            logger.info("Deletion job %s done or claimed by another worker", job_id)
+            return False
+        threading.Thread(target=_renew_lease, args=(ref, owner, stop_renewal), daemon=True).start()
+        user_id = job.get('userId', job_id)
+        user_ref = user_document(db, user_id)
+
+        # child users are listed before their documents are deleted, and kept in the job for a resume
+        child_ids = job.get('childUsers')
+        if child_ids is None:
+            child_ids = [doc.id for doc in user_ref.collection('child_users').select([]).stream()]
+            ref.update({'childUsers': child_ids})
+
+        progress = _Progress(ref, job.get('deletedDocuments', 0))
+        delete_document_tree(user_ref, progress)
+        for collection in LEGACY_COLLECTIONS:
+            delete_by_user_id(collection, user_id, progress)
+        progress.flush()
+
+        deleted_children = delete_auth_users(child_ids)
+        ref.update({'deletedChildUsers': deleted_children})
+
+        # the main user is removed last, so it can follow the job status until the data is gone
+        try:
+            fb_auth.delete_user(user_id)
+        except fb_auth.UserNotFoundError:
+            pass
+        evict_user_tokens(user_id)
+
+        stop_renewal.set()
+        ref.update({
+            'status': JOB_DONE, 'leaseOwner': None, 'leaseExpiresAt': None,
+            'updatedAt': firestore.SERVER_TIMESTAMP, 'finishedAt': firestore.SERVER_TIMESTAMP,
+        })
+        logger.info("Deletion job %s done: %s documents, %s child users", job_id, progress.total, deleted_children)
+    except Exception as e:
+        stop_renewal.set()
+        logger.error(f"Deletion job {job_id} failed: {str(e)}")
+        ref.update({
+            'status': JOB_FAILED, 'error': str(e), 'leaseOwner': None, 'leaseExpiresAt': None,
+            'updatedAt': firestore.SERVER_TIMESTAMP,
+        })
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+    return True
+
+
+def delete_document_tree(doc_ref, progress) -> None:
+    """
+    Deletes a document and everything below it. Subcollections are walked concurrently by
+    DELETION_WORKERS threads and the deletes go through one throttled BulkWriter.
+    """
+    writer = db.bulk_writer(BulkWriterOptions(
+        initial_ops_per_second=min(500, DELETION_MAX_OPS_PER_SECOND),
+        max_ops_per_second=DELETION_MAX_OPS_PER_SECOND,
+        retry=BulkRetry.exponential,
+    ))
+    writer_lock = threading.Lock()  # BulkWriter is not thread-safe
+    pending = queue.Queue()
+    errors = []
+
+    for subcoll in doc_ref.collections():
+        pending.put(subcoll)
+
+    def delete_doc(ref):
+        with writer_lock:
+            writer.delete(ref)
+        progress.add(1)
+
+    def worker():
+        while True:
+            coll_ref = pending.get()
+            if coll_ref is None:
+                pending.task_done()
+                return
+            try:
+                last = None
+                while True:
+                    # key-only pages, the documents content is not needed
+                    page = coll_ref.select([]).limit(DELETION_PAGE_SIZE)
+                    if last is not None:
+                        page = page.start_after(last)
+                    docs = list(page.stream())
+                    for doc in docs:
+                        for subcoll in doc.reference.collections():
+                            pending.put(subcoll)
+                        delete_doc(doc.reference)
+                    if len(docs) < DELETION_PAGE_SIZE:
+                        break
+                    last = docs[-1]
+            except Exception as e:
+                errors.append(e)
+            finally:
+                pending.task_done()
+
+    with ThreadPoolExecutor(max_workers=DELETION_WORKERS, thread_name_prefix="deletion") as pool:
+        for _ in range(DELETION_WORKERS):
+            pool.submit(worker)
+        pending.join()
+        for _ in range(DELETION_WORKERS):
+            pending.put(None)
+
+    if errors:
+        writer.close()
+        raise errors[0]
+
+    delete_doc(doc_ref)
+    writer.close()  # flushes the remaining deletes
+
+
+def delete_by_user_id(collection_name: str, user_id: str, progress) -> None:
+    # documents of legacy top-level collections, linked by user_id
+    batch = db.batch()
+    count = 0
+    for doc in db.collection(collection_name).where(filter=FieldFilter('user_id', '==', user_id)).select([]).stream():
+        batch.delete(doc.reference)
+        count += 1
+        if count % 500 == 0:
+            batch.commit()
+            batch = db.batch()
+    if count % 500:
+        batch.commit()
+    progress.add(count)
+
+
+def delete_auth_users(uids: list) -> int:
+    """
+    Deletes users from Firebase Authentication in batches of 1000 and evicts their cached tokens.
+
+    Returns:
+        Number of users deleted.
+    """
+    deleted = 0
+    for i in range(0, len(uids), AUTH_DELETE_BATCH):
+        chunk = uids[i:i + AUTH_DELETE_BATCH]
+        result = fb_auth.delete_users(chunk)
+        for error in result.errors:
+            logger.warning("Failed to delete child user %s from Firebase Auth: %s", chunk[error.index], error.reason)
+        deleted += result.success_count
+        for uid in chunk:
+            evict_user_tokens(uid)
+    return deleted
+
+
+class _Progress:
+    # deleted documents counter, written to the job document every PROGRESS_EVERY documents
+    def __init__(self, ref, total: int = 0):
+        self.ref = ref
+        self.total = total
+        self._reported = total
+        self._lock = threading.Lock()
+
+    def add(self, count: int) -> None:
+        with self._lock:
+            self.total += count
+            if self.total - self._reported < PROGRESS_EVERY:
+                return
+            self._reported = self.total
+        self.flush()
+
+    def flush(self) -> None:
+        self.ref.update({'deletedDocuments': self.total, 'updatedAt': firestore.SERVER_TIMESTAMP})
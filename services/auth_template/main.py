@@ -1,27 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import time
+IMPORT_STARTED = time.perf_counter()  # before any other import, reported as importSeconds (shared/lifecycle.py)
+
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, status, Response, BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from pydantic import BaseModel
 from shared.config import db, fb_auth
 from firebase_admin import firestore
 from dotenv import load_dotenv
 import os
+import threading
 import requests
 from google.cloud.firestore_v1 import FieldFilter, CollectionReference   # FieldFilter recommended to avoid Firestore warning
-from models import*
-from shared.auth import get_current_user, require_main_role
+from .models import*
+from shared.auth import get_current_user, require_main_role, evict_user_tokens
+from shared.cache import cache_stats
+from shared.pagination import page_params, paginate, set_next_cursor
 from shared.config import logger
+from shared.datastore import run_io
+from shared.responses import FastJSONResponse, CompressionMiddleware
+from shared.lifecycle import health_router, service_lifespan
+from shared.metrics import MetricsMiddleware, metrics_router
+from shared.logs import LogContextMiddleware
+from shared.repository import child_users_collection, user_document
 from datetime import datetime
-from utils import get_user_ref
-from template import template_router
-from resource_types import resources_type_router
+from .utils import get_user_ref
+from .template import template_router
+from .provisioning import provision_tenant
+from .deletion import create_deletion_job, get_deletion_job, resume_deletion_job, run_deletion_job, unfinished_job_ids, JOB_DONE
+from .resource_types import resources_type_router
 
 load_dotenv()  
 
-app = FastAPI()
+# Deletion jobs interrupted by a restart continue in background
+# (every worker tries them, the job lease lets only one run each job)
+async def resume_deletion_jobs():
+    try:
+        for job_id in await run_io(unfinished_job_ids):
+            logger.info("Resuming deletion job %s", job_id)
+            threading.Thread(target=resume_deletion_job, args=(job_id,), daemon=True).start()
+    except Exception as e:
+        logger.error(f"Error resuming deletion jobs: {str(e)}")
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=service_lifespan("auth_template", resume_deletion_jobs, import_started=IMPORT_STARTED))
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(LogContextMiddleware)
+app.add_middleware(MetricsMiddleware, service="auth_template")
+
+app.include_router(health_router)
+app.include_router(metrics_router)
 
 app.include_router(template_router)
 app.include_router(resources_type_router)
 
+# users, child users and admin endpoints (included at the end of the file, also mounted by the monolith)
+users_router = APIRouter()
+
 # API key header for admin authentication
 admin_api_key = APIKeyHeader(name="X-Admin-API-Key")
 
@@ -33,112 +66,88 @@ def verify_admin_api_key(api_key: str = Depends(admin_api_key)):
         raise HTTPException(status_code=403, detail="Invalid admin API key")
     return api_key
 
-# function delete a collection and its subcollections
-def delete_by_user_id(collection_name: str, user_id: str):
-    try:
-        collection_ref = db.collection(collection_name)
-        query = collection_ref.where("user_id", "==", user_id).stream()
-        deleted = 0
-        for doc in query:
-            doc.reference.delete()
-            deleted += 1
-            logger.info(f"Deleted document {doc.id} in {collection_name} for user {user_id}")
-        return deleted
-    except Exception as e:
-        logger.error(f"Error deleting documents in {collection_name} for user {user_id}: {str(e)}")
-        raise
-    
-
-# Admin endpoint to delete any user and their data
-@app.delete("/admin/delete-user/{user_id}")
-async def admin_delete_user(user_id: str, api_key: str = Depends(verify_admin_api_key)):
+# Admin endpoint to delete any user and their data (runs as a background deletion job)
+@users_router.delete("/admin/delete-user/{user_id}", status_code=202)
+async def admin_delete_user(user_id: str, background_tasks: BackgroundTasks, api_key: str = Depends(verify_admin_api_key)):
     try:
         # Verify user exists in Firebase Authentication
         try:
-            fb_auth.get_user(user_id)
+            await run_io(fb_auth.get_user, user_id)
         except fb_auth.UserNotFoundError:
             logger.error(f"User {user_id} not found in Firebase Authentication")
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Delete user data from Firestore (users collection)
-        user_ref = db.collection('users').document(user_id)
-        if user_ref.get().exists:
-            for subcoll in user_ref.collections():
-                delete_collection(subcoll)
-                logger.info(f"Deleted subcollection {subcoll.id} for user {user_id}")
-            user_ref.delete()
-            logger.info(f"Deleted user document {user_id}")
-
-        # Delete child users from Firebase Authentication and Firestore
-        child_users_ref = user_ref.collection('child_users')
-        child_docs = child_users_ref.stream()
-        for child_doc in child_docs:
-            child_id = child_doc.id
-            try:
-                fb_auth.delete_user(child_id)
-                logger.info(f"Deleted child user {child_id} from Firebase Authentication")
-            except Exception as e:
-                logger.warning(f"Failed to delete child user {child_id} from Firebase Auth: {str(e)}")
-
-        # Delete related data in blocks, phases, and resources collections
-        for collection in ['templates,' 'blocks', 'phases', 'resources']:
-            deleted_count = delete_by_user_id(collection, user_id)
-            logger.info(f"Deleted {deleted_count} documents in {collection} for user {user_id}")
-
-        # Delete the main user from Firebase Authentication
-        fb_auth.delete_user(user_id)
-        logger.info(f"Deleted main user {user_id} from Firebase Authentication")
-
-        return {"message": f"User {user_id} and associated data deleted"}
+        job = await run_io(create_deletion_job, user_id, "admin")
+        background_tasks.add_task(run_deletion_job, job["id"])
+        logger.info("Deletion job %s scheduled by admin", job['id'])
+
+        return {"message": f"Deletion of user {user_id} scheduled", "jobId": job["id"], "status": job["status"]}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting user {user_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error deleting user: {str(e)}")
 
+# Admin status of a deletion job
+@users_router.get("/admin/deletion-jobs/{job_id}")
+async def admin_get_deletion_job(job_id: str, api_key: str = Depends(verify_admin_api_key)):
+    job = await run_io(get_deletion_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
+
+# Resume an interrupted or failed deletion job
+@users_router.post("/admin/deletion-jobs/{job_id}/resume", status_code=202)
+async def admin_resume_deletion_job(job_id: str, background_tasks: BackgroundTasks, api_key: str = Depends(verify_admin_api_key)):
+    job = await run_io(get_deletion_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    if job["status"] == JOB_DONE:
+        return job
+    background_tasks.add_task(run_deletion_job, job_id)
+    return {"message": "Deletion job resumed", "jobId": job_id}
+
+# in-process cache counters (token cache hit rate, evictions) to tune sizes and TTLs
+@users_router.get("/admin/cache-stats")
+async def get_cache_stats(api_key: str = Depends(verify_admin_api_key)):
+    return cache_stats()
+
 # register main user
-@app.post("/register-main")
+@users_router.post("/register-main")
 async def register_main_user(user: UserCreate):
     try:
         # Create a new user in Firebase Authentication with the provided email and password
-        created_user = fb_auth.create_user(email=user.email, password=user.password)
+        created_user = await run_io(fb_auth.create_user, email=user.email, password=user.password)
         # Set custom claims for the user to define their role as 'main' and link them to their own mainUserId
-        fb_auth.set_custom_user_claims(created_user.uid, {'role': 'main', 'mainUserId': created_user.uid})
+        await run_io(fb_auth.set_custom_user_claims, created_user.uid, {'role': 'main', 'mainUserId': created_user.uid})
         
-         # Store user data in Firestore
-        user_ref = db.collection('users').document(created_user.uid)
-        user_ref.set({
-            'name': user.name,
-            'email': user.email,
-            'isMain': True,
-            'createdAt': firestore.SERVER_TIMESTAMP
-        })
-
-        # Initialize resourcesTypes subcollection
-        resources_types_ref = user_ref.collection('resourcesTypes')
-        for type_name in DEFAULT_RESOURCE_TYPES: #default resource types list in models.py
-            resources_types_ref.add({
-                'name': type_name,
-                'isDefault': True,
-                'createdAt': firestore.SERVER_TIMESTAMP
-            })
-            logger.info(f"Added default resource type '{type_name}' for user {created_user.uid}")
-
-        return {"message": "Main user criado", "uid": created_user.uid}
+        # Store user data, default resource types and the optional starter template in one batch
+        try:
+            provisioned = await run_io(provision_tenant, created_user.uid, user.name, user.email, user.seedTemplate)
+        except Exception:
+            # no half-provisioned tenant: remove the Auth user so the signup can be retried
+            await run_io(fb_auth.delete_user, created_user.uid)
+            raise
+        logger.info("Provisioned main user %s: %s", created_user.uid, provisioned)
+
+        return {"message": "Main user criado", "uid": created_user.uid, "templateId": provisioned["templateId"]}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # update  main user
-@app.put("/users/{user_id}")
+@users_router.put("/users/{user_id}")
 async def update_main_user(user_id: str, updates: dict, current_user: dict = Depends(get_current_user)):
 
     if current_user['uid'] != user_id or current_user['role'] != 'main':
         raise HTTPException(status_code=403, detail="Apenas o próprio usuário principal pode atualizar seus dados")
     
-    logger.info(f"Atualizando usuário principal {user_id} com dados: {updates}")
+    # only the field names: the body may carry the email and the password
+    logger.info("Atualizando usuário principal %s, campos: %s", user_id, sorted(updates))
     
     try:
         # Fetch the user document from Firestore
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        user_ref = user_document(db, user_id)
+        user_doc = await run_io(user_ref.get)
         if not user_doc.exists:
             logger.error(f"Usuário {user_id} não encontrado")
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
@@ -160,27 +169,28 @@ async def update_main_user(user_id: str, updates: dict, current_user: dict = Dep
 
         if 'name' in updates:
             firestore_updates['name'] = updates['name']
-            logger.info(f"Atualizando nome para: {updates['name']}")
+            logger.debug("Atualizando nome para: %s", updates['name'])
 
         if 'email' in updates:
             firestore_updates['email'] = updates['email']
-            logger.info(f"Atualizando email para: {updates['email']} via Firebase Auth")
-            fb_auth.update_user(user_id, email=updates['email'])
+            logger.info("Atualizando email via Firebase Auth")
+            await run_io(fb_auth.update_user, user_id, email=updates['email'])
 
         if 'password' in updates:
-            logger.info(f"Atualizando senha via Firebase Auth")         
-            fb_auth.update_user(user_id, password=updates['password'])
+            logger.info("Atualizando senha via Firebase Auth")         
+            await run_io(fb_auth.update_user, user_id, password=updates['password'])
 
         # Apply updates to Firestore if there are any changes
         if firestore_updates:
             firestore_updates['updatedAt'] = firestore.SERVER_TIMESTAMP
-            user_ref.update(firestore_updates)
-            logger.info(f"Usuário principal {user_id} atualizado com sucesso")
+            await run_io(user_ref.update, firestore_updates)
+            logger.info("Usuário principal %s atualizado com sucesso", user_id)
 
         # Revoke refresh tokens if sensitive fields (email or password) are updated
         if 'password' in updates or 'email' in updates:
-            logger.info(f"Revogando tokens de refresh para {user_id}")
-            fb_auth.revoke_refresh_tokens(user_id)
+            logger.info("Revogando tokens de refresh para %s", user_id)
+            await run_io(fb_auth.revoke_refresh_tokens, user_id)
+            evict_user_tokens(user_id)
 
         return {"message": "Usuário principal atualizado"}
     except Exception as e:
@@ -188,18 +198,19 @@ async def update_main_user(user_id: str, updates: dict, current_user: dict = Dep
         raise HTTPException(status_code=400, detail=str(e))
 
 # Create child user 
-@app.post("/child-users")
+@users_router.post("/child-users")
 async def register_child_user(child: ChildCreate, current_user: dict = Depends(require_main_role)):
     main_user_id = current_user['mainUserId']
     try:
         # Create a new child user in Firebase Authentication
-        created_child = fb_auth.create_user(email=child.email, password=child.password)
+        created_child = await run_io(fb_auth.create_user, email=child.email, password=child.password)
 
         # Set custom claims to define the user as a 'child' and link them to the main user
-        fb_auth.set_custom_user_claims(created_child.uid, {'role': 'child', 'mainUserId': main_user_id})
+        await run_io(fb_auth.set_custom_user_claims, created_child.uid, {'role': 'child', 'mainUserId': main_user_id})
       
         # Store child user data in Firestore under the main user's 'child_users' subcollection
-        db.collection('users').document(main_user_id).collection('child_users').document(created_child.uid).set({
+        child_ref = child_users_collection(db, main_user_id).document(created_child.uid)
+        await run_io(child_ref.set, {
             'name': child.name,
             'email': child.email,
             'mainUserId': main_user_id,
@@ -211,8 +222,8 @@ async def register_child_user(child: ChildCreate, current_user: dict = Depends(r
         raise HTTPException(status_code=400, detail=str(e))
 
 # list child users
-@app.get("/child-users")
-async def get_child_users(current_user: dict = Depends(require_main_role)):
+@users_router.get("/child-users")
+async def get_child_users(response: Response, page: dict = Depends(page_params), current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
 
@@ -220,60 +231,62 @@ async def get_child_users(current_user: dict = Depends(require_main_role)):
         #query = db.collection('users').document(main_user_id).collection('child_users').where('mainUserId', '==', main_user_id) 
  
         # using FieldFilter 
-        query = db.collection('users').document(main_user_id).collection('child_users').where(
+        query = child_users_collection(db, main_user_id).where(
             filter=FieldFilter('mainUserId', '==', main_user_id)
         )
 
         # Fetch and convert documents to a list of dictionaries
-        docs = query.stream()
+        docs, next_cursor = await run_io(paginate, query, page)
+        set_next_cursor(response, next_cursor)
         child_users = [doc.to_dict() for doc in docs]        
         return child_users
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # update a child user
-@app.put("/child-users/{child_id}")
+@users_router.put("/child-users/{child_id}")
 async def update_child_user(child_id: str, updates: dict, current_user: dict = Depends(require_main_role)):
     main_user_id = current_user['mainUserId']
 
     # Reference the child user document in Firestore
-    child_ref = db.collection('users').document(main_user_id).collection('child_users').document(child_id)
-    child_doc = child_ref.get()
+    child_ref = child_users_collection(db, main_user_id).document(child_id)
+    child_doc = await run_io(child_ref.get)
 
     if not child_doc.exists:
         raise HTTPException(status_code=404, detail="Child user não encontrado")
 
-    child_ref.update(updates)
+    await run_io(child_ref.update, updates)
     return {"message": "Child user atualizado"}
 
 # get information about the current user
-@app.get("/users")
+@users_router.get("/users")
 async def get_users(current_user: dict = Depends(get_current_user)):
     return {"message": f"Usuário logado: {current_user['role']}", "mainId": current_user.get('mainUserId')}
 
 
 # delete a child user
-@app.delete("/child-users/{child_id}")
+@users_router.delete("/child-users/{child_id}")
 async def delete_child_user(child_id: str, current_user: dict = Depends(require_main_role)):
     main_user_id = current_user['mainUserId']
     try:
         # Reference the child user document in Firestore
-        child_ref = db.collection('users').document(main_user_id).collection('child_users').document(child_id)
-        child_doc = child_ref.get()
+        child_ref = child_users_collection(db, main_user_id).document(child_id)
+        child_doc = await run_io(child_ref.get)
 
         if not child_doc.exists:
             logger.error(f"Child user {child_id} not found for main user {main_user_id}")
             raise HTTPException(status_code=404, detail="Child user não encontrado")
 
-        child_ref.delete()
-        logger.info(f"Child user {child_id} deleted from Firestore for main user {main_user_id}")
+        await run_io(child_ref.delete)
+        logger.info("Child user %s deleted from Firestore for main user %s", child_id, main_user_id)
 
         # Attempt to delete the child user from Firebase Authentication
         try:
-            fb_auth.delete_user(child_id)
-            logger.info(f"Child user {child_id} deleted from Firebase Authentication")
+            await run_io(fb_auth.delete_user, child_id)
+            evict_user_tokens(child_id)
+            logger.info("Child user %s deleted from Firebase Authentication", child_id)
         except Exception as e:
-            logger.warning(f"Failed to delete child user {child_id} from Firebase Authentication: {str(e)}")
+            logger.warning("Failed to delete child user %s from Firebase Authentication: %s", child_id, str(e))
      
         return {"message": "Child user deletado com sucesso"}
     except Exception as e:
@@ -303,7 +316,7 @@ def refresh_user_token(refresh_token: str, web_api_key: str):
     }
 
 # refresh a user's JWT token
-@app.post("/refresh-token")
+@users_router.post("/refresh-token")
 async def refresh_token(request: RefreshTokenRequest):
     try:
         # Load the Firebase WEB_API_KEY from the .env file
@@ -311,9 +324,9 @@ async def refresh_token(request: RefreshTokenRequest):
         if not web_api_key:
             raise HTTPException(status_code=500, detail="WEB_API_KEY não encontrada no .env")
         
-        logger.debug(f"Renovando token com WEB_API_KEY: {web_api_key[:6]}...")
+        logger.debug("Renovando token com WEB_API_KEY: %s...", web_api_key[:6])
        
-        new_tokens = refresh_user_token(request.refresh_token, web_api_key)
+        new_tokens = await run_io(refresh_user_token, request.refresh_token, web_api_key)
     
         return {
             "message": "Token renovado",
@@ -326,18 +339,18 @@ async def refresh_token(request: RefreshTokenRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 # get the role and details of the current user
-@app.get("/user-role")
+@users_router.get("/user-role")
 async def get_user_role(current_user: dict = Depends(get_current_user)):
     try:
         user_id = current_user['uid']
         role = current_user['role']
         main_user_id = current_user['mainUserId']
 
-        logger.info(f"Obtendo papel para usuário {user_id} (role: {role}, mainUserId: {main_user_id})")
+        logger.info("Obtendo papel para usuário %s (role: %s, mainUserId: %s)", user_id, role, main_user_id)
 
         # Fetch user data from Firestore
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        user_ref = user_document(db, user_id)
+        user_doc = await run_io(user_ref.get)
 
         if not user_doc.exists:
             logger.error(f"Usuário {user_id} não encontrado no Firestore")
@@ -350,7 +363,7 @@ async def get_user_role(current_user: dict = Depends(get_current_user)):
             "mainUserId": main_user_id,
             "name": user_data.get('name', '')
         }
-        logger.info(f"Resposta do user-role: {response}")
+        logger.debug("Resposta do user-role: %s", response)
         return response
     except HTTPException as e:
         #  HTTP 404 #TODO
@@ -361,53 +374,30 @@ async def get_user_role(current_user: dict = Depends(get_current_user)):
 
 """ Delete user and all subcollections"""
 
-def delete_collection(coll_ref: CollectionReference, batch_size: int = 100):
-    docs = coll_ref.limit(batch_size).stream()
-    deleted = 0
-    for doc in docs:
-        # Delete subcollections recursively
-        for subcoll in doc.reference.collections():
-            delete_collection(subcoll, batch_size)
-        doc.reference.delete()
-        deleted += 1
-    if deleted >= batch_size:
-        return delete_collection(coll_ref, batch_size)
-
-@app.delete("/users/{user_id}")
-async def delete_main_user(user_id: str, current_user: dict = Depends(require_main_role)):
+@users_router.delete("/users/{user_id}", status_code=202)
+async def delete_main_user(user_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     if current_user['uid'] != user_id:
         logger.error(f"User {current_user['uid']} attempted to delete user {user_id}")
         raise HTTPException(status_code=403, detail="Only the main user can delete their account")
     
     try:
-        # Delete user data from Firestore
-        user_ref = db.collection('users').document(user_id)
-        
-        # Delete all subcollections (resourcesTypes, child_users, resources, blocks, phases, templates)
-        for subcoll in user_ref.collections():
-            delete_collection(subcoll)
-            logger.info(f"Deleted subcollection {subcoll.id} for user {user_id}")
-        
-        # Delete the main user document
-        user_ref.delete()
-        logger.info(f"Deleted user document {user_id}")
-
-        # Delete child users from Firebase Authentication and Firestore
-        child_users_ref = user_ref.collection('child_users')
-        child_docs = child_users_ref.stream()
-        for child_doc in child_docs:
-            child_id = child_doc.id
-            try:
-                fb_auth.delete_user(child_id)
-                logger.info(f"Deleted child user {child_id} from Firebase Authentication")
-            except Exception as e:
-                logger.warning(f"Failed to delete child user {child_id} from Firebase Auth: {str(e)}")
-        
-        # Delete the main user from Firebase Authentication
-        fb_auth.delete_user(user_id)
-        logger.info(f"Deleted main user {user_id} from Firebase Authentication")
+        # Firestore data (every subcollection), child users and the main user are deleted by a background job
+        job = await run_io(create_deletion_job, user_id, user_id)
+        background_tasks.add_task(run_deletion_job, job["id"])
+        logger.info("Deletion job %s scheduled for main user %s", job['id'], user_id)
 
-        return {"message": "Main user and associated data deleted"}
+        return {"message": "Main user deletion scheduled", "jobId": job["id"], "status": job["status"]}
     except Exception as e:
         logger.error(f"Error deleting main user {user_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error deleting user: {str(e)}")
+
+# status of the deletion job of the logged main user
+@users_router.get("/deletion-jobs/{job_id}")
+async def get_main_user_deletion_job(job_id: str, current_user: dict = Depends(require_main_role)):
+    job = await run_io(get_deletion_job, job_id)
+    if job is None or job.get("userId") != current_user['uid']:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
+
+
+app.include_router(users_router)
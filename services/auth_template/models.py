@@ -8,6 +8,7 @@ class UserCreate(BaseModel):
     name: str
     email: str
     password: str
+    seedTemplate: bool = False  # create and select the starter template (DEFAULT_TEMPLATE)
 
 class ChildCreate(BaseModel):
     name: str
@@ -53,6 +54,16 @@ class TemplateModel(BaseModel):
     shifts: List[Shift]
     user_id: Optional[str] = None  # for link main user
 
+# Starter template created on register-main when seedTemplate is true
+DEFAULT_TEMPLATE_ID = "default"
+DEFAULT_TEMPLATE = TemplateModel(
+    name="Padrão",
+    holidays=HolidaysModel(holidays=[]),
+    weekStart=1,
+    weekEnd=5,
+    shifts=[Shift(entry="08:00:00", exit="12:00:00"), Shift(entry="13:00:00", exit="17:00:00")],
+)
+
 
 """ Resources  Types"""
 class ResourceTypeCreate(BaseModel):
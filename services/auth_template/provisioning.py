@@ -0,0 +1,64 @@
+import unicodedata
+from firebase_admin import firestore
+from shared.config import db
+from shared.versions import versioned_batch
+from shared.repository import user_document
+from .models import DEFAULT_RESOURCE_TYPES, DEFAULT_TEMPLATE, DEFAULT_TEMPLATE_ID
+
+# Tenant provisioning for register_main_user: the user document, the default resource types and the
+# optional starter template are written in a single WriteBatch, so a tenant is either fully created or not at all.
+# Document ids are deterministic, running it again for the same uid overwrites instead of duplicating.
+
+def resource_type_id(name: str) -> str:
+    # 'Máquina' -> 'maquina'
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return '-'.join(ascii_name.lower().split())
+
+
+def provision_tenant(uid: str, name: str, email: str, seed_template: bool = False) -> dict:
+    """
+    Creates the Firestore data of a new main user with one commit.
+
+    Args:
+        uid: Firebase Authentication uid of the main user.
+        name: User name.
+        email: User email.
+        seed_template: Also create the starter template (DEFAULT_TEMPLATE) and select it.
+
+    Returns:
+        Ids of the created resource types and of the starter template (None if not seeded).
+    """
+    # the templates/resourcesTypes versions (list ETags) are counted from this first write
+    batch = versioned_batch(db, uid, "templates", "resourcesTypes")
+    user_ref = user_document(db, uid)
+
+    user_data = {
+        'name': name,
+        'email': email,
+        'isMain': True,
+        'createdAt': firestore.SERVER_TIMESTAMP
+    }
+
+    template_id = None
+    if seed_template:
+        template_id = DEFAULT_TEMPLATE_ID
+        template_data = DEFAULT_TEMPLATE.dict(exclude={"id", "user_id"})
+        template_data["user_id"] = uid
+        template_data["createdAt"] = firestore.SERVER_TIMESTAMP
+        batch.set(user_ref.collection('templates').document(template_id), template_data)
+        user_data['selectedTemplate'] = template_id
+
+    batch.set(user_ref, user_data)
+
+    resource_type_ids = []
+    for type_name in DEFAULT_RESOURCE_TYPES: #default resource types list in models.py
+        type_id = resource_type_id(type_name)
+        batch.set(user_ref.collection('resourcesTypes').document(type_id), {
+            'name': type_name,
+            'isDefault': True,
+            'createdAt': firestore.SERVER_TIMESTAMP
+        })
+        resource_type_ids.append(type_id)
+
+    batch.commit()
+    return {"resourceTypes": resource_type_ids, "templateId": template_id}
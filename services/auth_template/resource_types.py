@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from firebase_admin import firestore
 from shared.config import db
 import os
-from models import*
+from .models import*
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
+from shared.datastore import run_io, gather_io, stream_io
+from shared.responses import json_response
+from shared.versions import versioned_batch, list_etag, is_not_modified, not_modified, set_etag
+from shared.repository import resource_types_collection, resources_collection
 
 resources_type_router = APIRouter()
 
@@ -13,22 +17,25 @@ resources_type_router = APIRouter()
 async def add_resource_type(resource_type: ResourceTypeCreate, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
-        resources_types_ref = db.collection('users').document(main_user_id).collection('resourcesTypes')
+        resources_types_ref = resource_types_collection(db, main_user_id)
         
         # Check if type already exists
-        existing_types = resources_types_ref.where('name', '==', resource_type.name).get()
+        existing_types = await run_io(resources_types_ref.where('name', '==', resource_type.name).get)
         if existing_types:
             logger.error(f"Resource type '{resource_type.name}' already exists for user {main_user_id}")
             raise HTTPException(status_code=400, detail="Resource type already exists")
         
         # Add new type (not default)
-        doc_ref = resources_types_ref.add({
+        doc_ref = resources_types_ref.document()
+        batch = versioned_batch(db, main_user_id, "resourcesTypes")
+        batch.set(doc_ref, {
             'name': resource_type.name,
             'isDefault': False,
             'createdAt': firestore.SERVER_TIMESTAMP
         })
-        logger.info(f"Added resource type '{resource_type.name}' for user {main_user_id}")
-        return {"message": "Resource type added", "id": doc_ref[1].id}
+        await run_io(batch.commit)
+        logger.info("Added resource type '%s' for user %s", resource_type.name, main_user_id)
+        return {"message": "Resource type added", "id": doc_ref.id}
     except Exception as e:
         logger.error(f"Error adding resource type: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -38,9 +45,12 @@ async def add_resource_type(resource_type: ResourceTypeCreate, current_user: dic
 async def delete_resource_type(type_id: str, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
-        resources_types_ref = db.collection('users').document(main_user_id).collection('resourcesTypes')
+        resources_types_ref = resource_types_collection(db, main_user_id)
         doc_ref = resources_types_ref.document(type_id)
-        doc = doc_ref.get()
+        # Check if type is in use (optional, if you have a resources collection)
+        resources_ref = resources_collection(db, main_user_id)
+        # the type document and the resources using it are read concurrently
+        doc, resources_using_type = await gather_io(doc_ref.get, resources_ref.where('typeId', '==', type_id).get)
 
         if not doc.exists:
             logger.error(f"Resource type {type_id} not found for user {main_user_id}")
@@ -51,15 +61,14 @@ async def delete_resource_type(type_id: str, current_user: dict = Depends(requir
             logger.error(f"Attempted to delete default resource type {type_id} for user {main_user_id}")
             raise HTTPException(status_code=403, detail="Cannot delete default resource types")
         
-        # Check if type is in use (optional, if you have a resources collection)
-        resources_ref = db.collection('users').document(main_user_id).collection('resources')
-        resources_using_type = resources_ref.where('typeId', '==', type_id).get()
         if resources_using_type:
             logger.error(f"Resource type {type_id} is in use by resources")
             raise HTTPException(status_code=400, detail="Cannot delete resource type in use")
 
-        doc_ref.delete()
-        logger.info(f"Deleted resource type {type_id} for user {main_user_id}")
+        batch = versioned_batch(db, main_user_id, "resourcesTypes")
+        batch.delete(doc_ref)
+        await run_io(batch.commit)
+        logger.info("Deleted resource type %s for user %s", type_id, main_user_id)
         return {"message": "Resource type deleted"}
     except Exception as e:
         logger.error(f"Error deleting resource type: {str(e)}")
@@ -67,16 +76,20 @@ async def delete_resource_type(type_id: str, current_user: dict = Depends(requir
     
 # get resource types
 @resources_type_router.get("/resources-types")
-async def get_resource_types(current_user: dict = Depends(require_main_role)):
+async def get_resource_types(request: Request, response: Response, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
-        resources_types_ref = db.collection('users').document(main_user_id).collection('resourcesTypes')
-        docs = resources_types_ref.stream()
+        etag = await list_etag(request, db, main_user_id, ["resourcesTypes"])
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+        resources_types_ref = resource_types_collection(db, main_user_id)
+        docs = await stream_io(resources_types_ref)
         resource_types = [
             {"id": doc.id, **doc.to_dict()} for doc in docs
         ]
-        logger.info(f"Retrieved {len(resource_types)} resource types for user {main_user_id}")
-        return resource_types
+        logger.info("Retrieved %s resource types for user %s", len(resource_types), main_user_id)
+        return json_response(resource_types, response)
     except Exception as e:
         logger.error(f"Error retrieving resource types: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
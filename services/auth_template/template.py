@@ -1,24 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response, Request
 from firebase_admin import firestore
 from shared.config import db
 import os
-from models import*
+import asyncio
+from .models import*
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
-from utils import get_user_ref
+from shared.datastore import run_io
+from shared.pagination import page_params, paginate, set_next_cursor
+from shared.streaming import wants_ndjson, documents_ndjson
+from shared.responses import json_response
+from .utils import get_user_ref
+from shared.template_cache import invalidate_template
+from shared.calendar_cache import invalidate_working_calendar
+from shared.selected_template import invalidate_selected_template
+from shared.versions import versioned_batch, list_etag, is_not_modified, not_modified, set_etag
+from shared.repository import templates_collection, user_document
 
 template_router = APIRouter()
 
 # list templates for main user 
 @template_router.get("/templates")
-async def get_templates(current_user: dict = Depends(get_current_user)):
+async def get_templates(request: Request, response: Response, page: dict = Depends(page_params), current_user: dict = Depends(get_current_user)):
     try:
         main_user_id = current_user['mainUserId']
 
-        logger.info(f"Looking for templates for mainUserId: {main_user_id} (user: {current_user['uid']}, role: {current_user['role']})")
+        logger.info("Looking for templates for mainUserId: %s (user: %s, role: %s)", main_user_id, current_user['uid'], current_user['role'])
+
+        # unchanged since the client copy: 304 without querying the templates
+        etag = await list_etag(request, db, main_user_id, ["templates"])
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
 
         #templates_ref = db.collection("templates").where("user_id", "==", main_user_id).get()
-        templates_ref = db.collection('users').document(main_user_id).collection("templates").get()
+        templates_query = templates_collection(db, main_user_id)
+        if wants_ndjson(request):
+            streamed = documents_ndjson(templates_query, page["fields"])
+            set_etag(streamed, etag)
+            return streamed
+
+        templates_ref, next_cursor = await run_io(paginate, templates_query, page)
+        set_next_cursor(response, next_cursor)
         templates = []
 
         for doc in templates_ref:         
@@ -27,9 +50,9 @@ async def get_templates(current_user: dict = Depends(get_current_user)):
             #logger.info(f"[list]Template: {template_data}") 
             templates.append(template_data)
 
-        logger.info(f"Return {len(templates)} templates")
+        logger.info("Return %s templates", len(templates))
 
-        return {"templates": templates}
+        return json_response({"templates": templates}, response)
     except Exception as e:
         logger.error(f"Error on templates: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -41,15 +64,16 @@ async def select_template(template_id: str, current_user: dict = Depends(get_cur
         main_user_id = current_user['mainUserId']
         user_id = current_user['uid']
 
-        logger.info(f"Selecting template {template_id} for mainUserId: {main_user_id} (user: {user_id}, role: {current_user['role']})")
+        logger.info("Selecting template %s for mainUserId: %s (user: %s, role: %s)", template_id, main_user_id, user_id, current_user['role'])
         
-        user_ref = get_user_ref(main_user_id)
+        user_ref = user_document(db, main_user_id)
         
         # Fetch the template from Firestore
         # template_ref = db.collection("templates").document(template_id)        
-        logger.info(f"Fetching template {template_id} from users/{main_user_id}/templates") # now /users/{main_user_id}/templates
+        logger.info("Fetching template %s from users/%s/templates", template_id, main_user_id) # now /users/{main_user_id}/templates
         template_ref = user_ref.collection('templates').document(template_id)
-        template_doc = template_ref.get()
+        # user existence and template are independent reads
+        _, template_doc = await asyncio.gather(get_user_ref(main_user_id), run_io(template_ref.get))
         if not template_doc.exists:
             logger.error(f"Template {template_id} not found")
             raise HTTPException(status_code=404, detail="Template not found")
@@ -61,13 +85,17 @@ async def select_template(template_id: str, current_user: dict = Depends(get_cur
 
         template_data["id"] = template_id
         
-        # Update user's selectedTemplate in Firestore
-        user_ref = db.collection('users').document(main_user_id)
-        user_ref.update({"selectedTemplate": template_id})
+        # Update user's selectedTemplate in Firestore, with the "selection" version checked by the readers' caches
+        user_ref = user_document(db, main_user_id)
+        batch = versioned_batch(db, main_user_id, "selection")
+        batch.update(user_ref, {"selectedTemplate": template_id})
+        await run_io(batch.commit)
+        invalidate_selected_template(main_user_id)
         #logger.info(f"Updated selectedTemplate to {template_id} for user {main_user_id}")
 
-        logger.info(f"Template selected: {template_data}")
-        return {"template": template_data}       
+        logger.info("Template %s selected for mainUserId: %s", template_id, main_user_id)
+        logger.debug("Template selected: %s", template_data)
+        return json_response({"template": template_data})
     except Exception as e:
         logger.error(f"Error selecting template {template_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -77,9 +105,9 @@ async def select_template(template_id: str, current_user: dict = Depends(get_cur
 async def create_template(template: TemplateModel, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
-        logger.info(f"Creating template for mainUserId: {main_user_id}")
+        logger.info("Creating template for mainUserId: %s", main_user_id)
 
-        user_ref = get_user_ref(main_user_id)
+        user_ref = await get_user_ref(main_user_id)
             
         template_data = template.dict(exclude={"id", "user_id"})
         #logger.info(f"Template data received: {template_data}") 
@@ -93,8 +121,10 @@ async def create_template(template: TemplateModel, current_user: dict = Depends(
         # doc_ref.set(template_data)
 
         # create template inside main user document 
-        template_ref = user_ref.collection('templates')
-        _, doc_ref = template_ref.add(template_data) 
+        doc_ref = user_ref.collection('templates').document()
+        batch = versioned_batch(db, main_user_id, "templates")
+        batch.set(doc_ref, template_data)
+        await run_io(batch.commit)
 
         return {"id": doc_ref.id, "message": "Template criado"}
 
@@ -109,9 +139,9 @@ async def update_template(template_id: str, template: TemplateModel, current_use
      
     # Reference the template document in Firestore
     # template_ref = db.collection("templates").document(template_id)
-    user_ref = get_user_ref(main_user_id)
+    user_ref = user_document(db, main_user_id)
     template_ref = user_ref.collection('templates').document(template_id)
-    template_doc = template_ref.get()
+    _, template_doc = await asyncio.gather(get_user_ref(main_user_id), run_io(template_ref.get))
 
     # Check if the template exists and belongs to the main user
     if not template_doc.exists or template_doc.to_dict().get("user_id") != main_user_id:
@@ -124,7 +154,11 @@ async def update_template(template_id: str, template: TemplateModel, current_use
         template_data["updatedAt"] = firestore.SERVER_TIMESTAMP       
       
         # Update the template document in Firestore
-        template_ref.update(template_data)
+        batch = versioned_batch(db, main_user_id, "templates")
+        batch.update(template_ref, template_data)
+        await run_io(batch.commit)
+        invalidate_template(main_user_id, template_id)
+        invalidate_working_calendar(main_user_id, template_id)
        
         return {"id": template_id, "message": "Template atualizado", "name": template_data["name"]}
     except Exception as e:
@@ -136,18 +170,22 @@ async def update_template(template_id: str, template: TemplateModel, current_use
 async def delete_template(template_id: str, current_user: dict = Depends(require_main_role)):
     main_user_id = current_user['mainUserId']
 
-    user_ref = get_user_ref(main_user_id)
+    user_ref = user_document(db, main_user_id)
    
     # template_ref = db.collection("templates").document(template_id)
     template_ref = user_ref.collection("templates").document(template_id)
-    template_doc = template_ref.get()
+    _, template_doc = await asyncio.gather(get_user_ref(main_user_id), run_io(template_ref.get))
    
    # Check if the template exists and belongs to the main user
     if not template_doc.exists or template_doc.to_dict().get("user_id") != main_user_id:
         raise HTTPException(status_code=404, detail="Template não encontrado ou não pertence ao usuário")
     try:
         # Delete the template document from Firestore
-        template_ref.delete()
+        batch = versioned_batch(db, main_user_id, "templates")
+        batch.delete(template_ref)
+        await run_io(batch.commit)
+        invalidate_template(main_user_id, template_id)
+        invalidate_working_calendar(main_user_id, template_id)
         return {"message": "Template deletado"}
     except Exception as e:
         logger.error(f"Erro ao deletar template: {str(e)}")
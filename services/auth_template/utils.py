@@ -1,10 +1,13 @@
 from shared.config import logger
 from shared.config import db
 from fastapi import HTTPException
+from shared.datastore import run_io
+from shared.repository import user_document
 
-def get_user_ref(user_id: str):
-    user_ref = db.collection('users').document(user_id)
-    if not user_ref.get().exists:
+async def get_user_ref(user_id: str):
+    user_ref = user_document(db, user_id)
+    user_doc = await run_io(user_ref.get)
+    if not user_doc.exists:
         logger.error(f"User {user_id} not found")
         raise HTTPException(status_code=404, detail="User {user_id} not found")
     return user_ref
@@ -1,14 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response, Request
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import FieldFilter
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from shared.config import db
-from models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
+from .models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
-
-from utils import validate_template
+from shared.datastore import run_io
+from shared.selected_template import get_selected_template
+from shared.pagination import page_params, paginate, set_next_cursor
+from shared.streaming import wants_ndjson, ndjson_response
+from shared.responses import json_response
+from shared.versions import versioned_batch, list_etag, is_not_modified, not_modified, read_versions, set_etag
+
+from .utils import validate_template, reestimate_ops_task
+from shared.events import publish
+from shared.block_trees import catalog_blocks, tree_ref, write_tree_block
+from shared.repository import blocks_collection
+from .estimates import attach_block_totals, iter_blocks_with_totals
 
 blocks_router = APIRouter()
 
@@ -25,7 +35,7 @@ async def create_block(block: BlockCreate, current_user: dict = Depends(require_
             raise HTTPException(status_code=400, detail="No templateId provided")
 
         # Validate template existence and ownership
-        validate_template(block.templateId, main_user_id)
+        await validate_template(block.templateId, main_user_id)
 
         # Map durationType to string (optional, depending on your needs)
         duration_types = {0: "min", 1: "hours", 2: "days"}
@@ -44,11 +54,15 @@ async def create_block(block: BlockCreate, current_user: dict = Depends(require_
         
         #doc_ref = db.collection("blocks").add(block_data)
 
-        block_ref = db.collection("users").document(main_user_id).collection("blocks")
-        doc_ref = block_ref.add(block_data)
+        # block and its (empty) block tree written together
+        block_ref = blocks_collection(db, main_user_id).document()
+        block_id = block_ref.id
+        batch = versioned_batch(db, main_user_id, "blocks")
+        batch.set(block_ref, block_data)
+        write_tree_block(batch, db, main_user_id, block_id, block_data, create=True)
+        await run_io(batch.commit)
 
-        block_id = doc_ref[1].id
-        logger.info(f"Block created: {block_id}")
+        logger.info("Block created: %s", block_id)
         return {"message": "Block created", "id": block_id}
     except Exception as e:
         logger.error(f"Error creating block: {str(e)}")
@@ -56,61 +70,55 @@ async def create_block(block: BlockCreate, current_user: dict = Depends(require_
     
 # list full block
 @blocks_router.get("/blocks/full")
-async def get_blocks_full(current_user: dict = Depends(get_current_user)):
+async def get_blocks_full(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     try:
         main_user_id = current_user['mainUserId']
-        blocks_ref = db.collection('users').document(main_user_id).collection("blocks").get()
-        blocks = []
-        
-        for block_doc in blocks_ref:
-            block_data = block_doc.to_dict()
-            block_data["id"] = block_doc.id
-            
-            # all phases + resources
-            phases_ref = block_doc.reference.collection("phases").get()
-            phases = []
-            for phase_doc in phases_ref:
-                phase_data = phase_doc.to_dict()
-                phase_data["id"] = phase_doc.id
-                
-                if phase_data.get("resources") and len(phase_data["resources"]) > 0:
-                    resource_id = phase_data["resources"][0]  
-                    resource_doc = db.collection('users').document(main_user_id).collection("resources").document(resource_id).get()
-                    if resource_doc.exists:
-                        resource_data = resource_doc.to_dict()
-                        resource_data["id"] = resource_id
-                        phase_data["resource"] = resource_data 
-                
-                phases.append(phase_data)
-            
-            block_data["phases"] = phases
-            blocks.append(block_data)
+
+        # phases count as "blocks", the tree embeds the resources and totalDuration uses the templates' dayMinutes
+        versions = await run_io(read_versions, db, main_user_id)
+        templates_version = versions.get("templates", 0)
+        etag = await list_etag(request, db, main_user_id, ["blocks", "resources", "templates"], versions=versions)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
+        # Accept: application/x-ndjson streams one hydrated block per line
+        if wants_ndjson(request):
+            streamed = ndjson_response(iter_blocks_with_totals(db, main_user_id, templates_version=templates_version))
+            set_etag(streamed, etag)
+            return streamed
+
+        # blocks, phases and resources resolved in batch (no reads per block/phase), or the block trees
+        blocks = await run_io(catalog_blocks, db, main_user_id)
+        # totalDuration: minutes of one unit of the block, from the phases already loaded
+        blocks = await run_io(attach_block_totals, db, main_user_id, blocks, templates_version)
+        logger.info("Full blocks found: %s", len(blocks))
         
-        return {"blocks": blocks}
+        return json_response({"blocks": blocks}, response)
     except Exception as e:
         logger.error(f"Error listing full blocks: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
     
 # List blocks
 @blocks_router.get("/blocks")
-async def get_blocks(current_user: dict = Depends(get_current_user)):
+async def get_blocks(request: Request, response: Response, page: dict = Depends(page_params), current_user: dict = Depends(get_current_user)):
     try:
         main_user_id = current_user['mainUserId']
 
-        user_ref = db.collection('users').document(current_user['uid'])                
-        user_doc = user_ref.get()
-
-        if not user_doc.exists:
-            logger.error(f"User {current_user['uid']} not found")
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        selected_template = user_doc.to_dict().get('selectedTemplate')
+        # one read of the versions document for the selection cache and the ETag
+        versions = await run_io(read_versions, db, main_user_id)
+        selected_template = await get_selected_template(current_user, versions)
         
         if not selected_template:
-            logger.info(f"User {current_user['uid']} has no selected template")
+            logger.info("User %s has no selected template", current_user['uid'])
             return {"blocks": []}
 
-        logger.info(f"Listing blocks for mainUserId: {main_user_id}, template: {selected_template}")
+        etag = await list_etag(request, db, main_user_id, ["blocks"], selected_template, versions=versions)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
+        logger.info("Listing blocks for mainUserId: %s, template: %s", main_user_id, selected_template)
       
         # blocks_ref = db.collection('blocks').where(
         #     filter=FieldFilter('mainUserId', '==', main_user_id)
@@ -118,7 +126,7 @@ async def get_blocks(current_user: dict = Depends(get_current_user)):
         #     filter=FieldFilter('templateId', '==', selected_template)  
         # )
         # blocks inside users      
-        blocks_ref = db.collection('users').document(main_user_id).collection("blocks").where(
+        blocks_ref = blocks_collection(db, main_user_id).where(
             filter=FieldFilter('mainUserId', '==', main_user_id)
         ).where(
             filter=FieldFilter('templateId', '==', selected_template)  
@@ -126,7 +134,8 @@ async def get_blocks(current_user: dict = Depends(get_current_user)):
 
         #blocks = [doc.to_dict() | {"id": doc.id} for doc in blocks_ref]
         #or
-        blocks = blocks_ref.get()
+        blocks, next_cursor = await run_io(paginate, blocks_ref, page)
+        set_next_cursor(response, next_cursor)
         blocks_list = []
         for block in blocks:
             block_data = block.to_dict()
@@ -134,21 +143,21 @@ async def get_blocks(current_user: dict = Depends(get_current_user)):
             blocks_list.append(block_data)
             #logger.info(f"Blocks {block_data}") 
         
-        logger.info(f"Blocks found: {len(blocks_list)}")
-        return {"blocks": blocks_list}
+        logger.info("Blocks found: %s", len(blocks_list))
+        return json_response({"blocks": blocks_list}, response)
     except Exception as e:
         logger.error(f"Error listing blocks: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
 # update block
 @blocks_router.put("/blocks/{block_id}")
-async def update_block(block_id: str, block: BlockCreate, current_user: dict = Depends(require_main_role)):
+async def update_block(block_id: str, block: BlockCreate, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     main_user_id = current_user['mainUserId']
 
     # Reference the block document in Firestore
     #block_ref = db.collection("blocks").document(block_id)
-    block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-    block_doc = block_ref.get()
+    block_ref = blocks_collection(db, main_user_id).document(block_id)
+    block_doc = await run_io(block_ref.get)
 
     # Check block exists and belongs to the main user
     if not block_doc.exists or block_doc.to_dict().get("mainUserId") != main_user_id:
@@ -159,11 +168,18 @@ async def update_block(block_id: str, block: BlockCreate, current_user: dict = D
         block_data = block.dict(exclude={"id", "block_id"})    
         block_data["durationType"] = int(block.durationType)
         # block_data = block.dict(exclude_unset=True)  # Exclude unset fields to avoid overwriting with null, also excluds id
-        logger.info(f"block data to update: {block.dict()}") 
+        logger.debug("block data to update: %s", block_data)
         block_data["updatedAt"] = firestore.SERVER_TIMESTAMP
              
         # Update block document in Firestore
-        block_ref.update(block_data)
+        batch = versioned_batch(db, main_user_id, "blocks")
+        batch.update(block_ref, block_data)
+        write_tree_block(batch, db, main_user_id, block_id, block_data)
+        await run_io(batch.commit)
+        # the unit of the phase durations changed, the estimates of the ops follow
+        if block_data["durationType"] != block_doc.to_dict().get("durationType"):
+            background_tasks.add_task(reestimate_ops_task, main_user_id)
+            background_tasks.add_task(publish, {"type": "block.changed", "mainUserId": main_user_id, "blockId": block_id})
        
         return {"id": block_id, "message": "Bloco atualizado", "name": block_data["name"]}
     except Exception as e:
@@ -172,14 +188,14 @@ async def update_block(block_id: str, block: BlockCreate, current_user: dict = D
        
 # delete a block
 @blocks_router.delete("/blocks/{block_id}")
-async def delete_block(block_id: str, current_user: dict = Depends(require_main_role)):
+async def delete_block(block_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     try:        
         main_user_id = current_user['mainUserId']
 
         # Reference the block document
         # block_ref = db.collection("blocks").document(block_id)
-        block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-        block_doc = block_ref.get()
+        block_ref = blocks_collection(db, main_user_id).document(block_id)
+        block_doc = await run_io(block_ref.get)
 
         if not block_doc.exists:
             logger.error(f"Block {block_id} not found for main user {main_user_id}")
@@ -193,29 +209,27 @@ async def delete_block(block_id: str, current_user: dict = Depends(require_main_
             logger.error(f"No templateId found for block {block_id}")
             raise HTTPException(status_code=400, detail="No templateId found")
 
-        # Validate template existence and ownership
-        validate_template(block["templateId"], main_user_id)
+        # Delete associated phases (top-level collection)
+        phases_query = db.collection("phases").where("blockId", "==", block_id)
+
+        # Validate template existence and ownership while the phases are fetched
+        _, phases_docs = await asyncio.gather(
+            validate_template(block["templateId"], main_user_id),
+            run_io(phases_query.get),
+        )
 
         # Firebase batch (lote) operation to delete a block and its associate phases 
-        batch = db.batch()
+        batch = versioned_batch(db, main_user_id, "blocks")
         batch.delete(block_ref)
-
-        # Delete associated phases (top-level collection)
-        phases_query = db.collection("phases").where("blockId", "==", block_id)
-        phases_docs = phases_query.get()
+        batch.delete(tree_ref(db, main_user_id, block_id))
         for phase_doc in phases_docs:
             batch.delete(phase_doc.reference)
 
         # Commit batch (deletes block and phases, preserves resources)
-        batch.commit()
-        logger.info(f"Block {block_id} and associated phases deleted for main user {main_user_id}")
-
-        ## or sync commit
-        # Run synchronous commit in a separate thread
-        # loop = asyncio.get_event_loop()
-        # with ThreadPoolExecutor() as pool:
-        #     await loop.run_in_executor(pool, batch.commit)
+        await run_io(batch.commit)
+        logger.info("Block %s and associated phases deleted for main user %s", block_id, main_user_id)
 
+        background_tasks.add_task(publish, {"type": "block.changed", "mainUserId": main_user_id, "blockId": block_id})
         return {"message": "Block deleted"}
     except Exception as e:
         logger.error(f"Error deleting block {block_id}: {str(e)}")
@@ -0,0 +1,217 @@
+import csv
+import json
+import math
+from collections import deque
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from shared.datastore import run_io
+from shared.versions import versioned_batch
+from shared.repository import ops_collection
+from .models import OpModel
+from .estimates import load_phase_index, op_block_id
+
+# Bulk import of production orders (POST /ops/bulk).
+# The body (NDJSON or CSV) is read as a stream, rows are validated in chunks, every distinct templateId
+# is checked once and each chunk is written with one WriteBatch commit (Firestore limit: 500 writes,
+# one of them is the ops version counter).
+# estimatedDuration is computed for each chunk in one vectorized pass over the tenant phase index.
+BULK_CHUNK_SIZE = 499
+
+CSV_MEDIA_TYPES = ("text/csv", "application/csv")
+NESTED_FIELDS = ("block", "phase", "resource")  # JSON encoded inside a CSV cell
+
+
+async def iter_body_lines(request: Request):
+    # decoded lines of the request body, without loading the whole body
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+async def iter_body_rows(request: Request):
+    """
+    Yields (row_number, row) for each non empty NDJSON line or CSV record of the body.
+    row is a dict, or the exception raised while parsing it.
+    """
+    if request.headers.get("content-type", "").split(";")[0].strip() in CSV_MEDIA_TYPES:
+        async for item in iter_csv_rows(iter_body_lines(request)):
+            yield item
+        return
+    row_number = 0
+    async for line in iter_body_lines(request):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, e
+
+
+class _PendingLines:
+    # line iterator of the csv.reader, fed by iter_csv_rows with the lines of one record at a time
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def iter_csv_rows(lines):
+    """
+    Yields (row_number, row) for each CSV record of an async iterable of lines (first record is the header).
+    One csv.reader reads every record, so quoted cells can span lines (JSON cells, descriptions); a record
+    is handed to it once its quotes are balanced.
+    """
+    pending = _PendingLines()
+    reader = csv.reader(pending)
+    header = None
+    row_number = 0
+    quotes = 0
+    async for line in lines:
+        if not quotes and not line.strip():
+            continue
+        pending.lines.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue  # inside a quoted cell, the record goes on in the next line
+        quotes = 0
+        if header is None:
+            header = next(reader)
+            continue
+        row_number += 1
+        yield row_number, _read_csv_row(reader, header)
+    if pending.lines and header is not None:
+        # unbalanced quote: the rest of the body is one record
+        row_number += 1
+        yield row_number, _read_csv_row(reader, header)
+
+
+def _read_csv_row(reader, header: list):
+    try:
+        return parse_csv_row(header, next(reader))
+    except (ValueError, csv.Error) as e:
+        return e
+
+
+def parse_csv_row(header: list, values: list) -> dict:
+    row = {}
+    for name, value in zip(header, values):
+        # empty cells are treated as not sent (same as a missing key in NDJSON)
+        if value == "":
+            continue
+        row[name] = json.loads(value) if name in NESTED_FIELDS else value
+    return row
+
+
+async def import_ops(db, main_user_id: str, rows, validate_template) -> dict:
+    """
+    Validates and writes ops in chunks of BULK_CHUNK_SIZE.
+
+    Args:
+        db: Firestore client.
+        main_user_id: The main user ID that owns the ops.
+        rows: Async iterable of (row_number, row) as produced by iter_body_rows.
+        validate_template: Coroutine (template_id, main_user_id) raising HTTPException when invalid.
+
+    Returns:
+        Report with the created/failed counts and one result per row.
+    """
+    ops_ref = ops_collection(db, main_user_id)
+    template_errors = {}  # templateId -> error detail, None when valid
+    report = {"created": 0, "failed": 0, "results": []}
+
+    index = await run_io(load_phase_index, db, main_user_id)
+
+    chunk = []
+    async for row_number, row in rows:
+        chunk.append((row_number, row))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await _import_chunk(db, ops_ref, main_user_id, chunk, template_errors, validate_template, index, report)
+            chunk = []
+    if chunk:
+        await _import_chunk(db, ops_ref, main_user_id, chunk, template_errors, validate_template, index, report)
+
+    report["results"].sort(key=lambda result: result["row"])
+    return report
+
+
+async def _import_chunk(db, ops_ref, main_user_id, chunk, template_errors, validate_template, index, report):
+    valid = []  # (row_number, op)
+    for row_number, row in chunk:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            op = OpModel(**row)
+            if not op.templateId:
+                raise ValueError("No templateId provided")
+        except (ValueError, TypeError, csv.Error) as e:
+            # pydantic ValidationError is a ValueError
+            _add_result(report, row_number, error=_error_message(e))
+            continue
+        valid.append((row_number, op))
+
+    # each distinct template is validated once for the whole import
+    for template_id in {op.templateId for _, op in valid} - template_errors.keys():
+        try:
+            await validate_template(template_id, main_user_id)
+            template_errors[template_id] = None
+        except HTTPException as e:
+            template_errors[template_id] = e.detail
+
+    accepted = []  # (row_number, op_data)
+    for row_number, op in valid:
+        if template_errors[op.templateId]:
+            _add_result(report, row_number, error=template_errors[op.templateId])
+            continue
+        accepted.append((row_number, op.model_dump(by_alias=True, exclude_unset=True)))
+
+    estimates = index.estimate([op_block_id(op_data) for _, op_data in accepted], [op_data.get("quantity") for _, op_data in accepted])
+
+    batch = versioned_batch(db, main_user_id, "ops")
+    pending = []  # (row_number, op_id)
+    for (row_number, op_data), estimate in zip(accepted, estimates.tolist()):
+        if not math.isnan(estimate):  # NaN when the block is unknown, the value sent is kept
+            op_data["estimatedDuration"] = estimate
+        op_data["mainUserId"] = main_user_id
+        op_data["createdAt"] = SERVER_TIMESTAMP
+        doc_ref = ops_ref.document()
+        batch.set(doc_ref, op_data)
+        pending.append((row_number, doc_ref.id))
+
+    if not pending:
+        return
+    try:
+        await run_io(batch.commit)
+    except Exception as e:
+        for row_number, _ in pending:
+            _add_result(report, row_number, error=f"Commit failed: {str(e)}")
+        return
+    for row_number, op_id in pending:
+        _add_result(report, row_number, op_id=op_id)
+
+
+def _add_result(report: dict, row_number: int, op_id: str = None, error: str = None) -> None:
+    if error is None:
+        report["created"] += 1
+        report["results"].append({"row": row_number, "status": "created", "id": op_id})
+    else:
+        report["failed"] += 1
+        report["results"].append({"row": row_number, "status": "error", "error": error})
+
+
+def _error_message(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+    return str(e)
@@ -0,0 +1,189 @@
+import numpy as np
+from shared.datastore import run_io, gather_io
+from shared.hydration import iter_blocks
+from shared.block_trees import iter_catalog
+from shared.versions import versioned_batch
+from shared.template_cache import get_template_ownership, set_template_ownership, templates_version
+from shared.working_calendar import working_day_minutes
+from shared.repository import blocks_collection, ops_collection, templates_collection
+
+# Estimated duration of OPs (estimatedDuration, in minutes) computed from the phases of their block.
+# The phase durations of a tenant are kept in one contiguous array with a block -> phase offset index,
+# so the totals of every block and the estimates of every OP are computed in a few vectorized operations:
+#   durations[offsets[i]:offsets[i + 1]]  phases of block_ids[i], in minutes
+#   block_totals[i]                       sum of those phases (one OP unit)
+#   estimate = block_totals[block of the OP] * quantity
+MINUTES_PER_UNIT = {0: 1.0, 1: 60.0}  # DurationType.min, DurationType.hours
+DURATION_DAYS = 2  # DurationType.days, converted with the working minutes of a day of the block template
+REESTIMATE_BATCH_SIZE = 499  # + the ops version counter
+
+
+class PhaseIndex:
+    def __init__(self, blocks: list, day_minutes: dict = None):
+        """
+        Args:
+            blocks: Block dicts with "id", "durationType", "templateId" and "phases" (with "duration").
+            day_minutes: templateId -> working minutes of a day, for blocks measured in days.
+        """
+        day_minutes = day_minutes or {}
+        self.block_ids = [block["id"] for block in blocks]
+        self.positions = {block_id: i for i, block_id in enumerate(self.block_ids)}
+
+        counts = np.fromiter((len(block.get("phases") or []) for block in blocks), dtype=np.int64, count=len(blocks))
+        self.offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+        units = np.fromiter((_unit_minutes(block, day_minutes) for block in blocks), dtype=np.float64, count=len(blocks))
+        raw = np.fromiter(
+            (_duration(phase) for block in blocks for phase in block.get("phases") or []),
+            dtype=np.float64,
+            count=int(self.offsets[-1]),
+        )
+        self.durations = raw * np.repeat(units, counts)
+
+        cumulative = np.concatenate(([0.0], np.cumsum(self.durations)))
+        self.block_totals = cumulative[self.offsets[1:]] - cumulative[self.offsets[:-1]]
+
+    def block_total(self, block_id: str):
+        i = self.positions.get(block_id)
+        return None if i is None else float(self.block_totals[i])
+
+    def estimate(self, block_ids: list, quantities: list) -> np.ndarray:
+        """
+        Estimated minutes of each OP (block_ids[k] x quantities[k]), NaN when the block is unknown.
+        A missing quantity counts as 1 (the OpModel default); the models reject quantities <= 0.
+        """
+        positions = np.fromiter((self.positions.get(block_id, -1) for block_id in block_ids), dtype=np.int64, count=len(block_ids))
+        quantity = np.asarray([1 if q is None else q for q in quantities], dtype=np.float64)
+        if not len(self.block_totals):
+            return np.full(len(block_ids), np.nan)
+        totals = np.where(positions >= 0, self.block_totals[np.maximum(positions, 0)], np.nan)
+        return np.round(totals * quantity, 2)
+
+
+def _duration(phase: dict) -> float:
+    try:
+        return float(phase.get("duration") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _unit_minutes(block: dict, day_minutes: dict) -> float:
+    duration_type = int(block.get("durationType") or 0)
+    if duration_type == DURATION_DAYS:
+        return float(day_minutes.get(block.get("templateId")) or 0)
+    return MINUTES_PER_UNIT.get(duration_type, 1.0)
+
+
+def op_block_id(op: dict):
+    block = op.get("block") or {}
+    return block.get("id") if isinstance(block, dict) else None
+
+
+def template_day_minutes(db, main_user_id: str, blocks: list, version: int = None) -> dict:
+    """
+    Working minutes of a day for the templates of the blocks measured in days.
+    Read from the template cache, the missing templates with one multi-get.
+
+    Args:
+        version: The tenant's templates version when the caller already read it (read here otherwise).
+    """
+    template_ids = {
+        block.get("templateId") for block in blocks
+        if int(block.get("durationType") or 0) == DURATION_DAYS and block.get("templateId")
+    }
+    if not template_ids:
+        return {}
+    if version is None:
+        version = templates_version(db, main_user_id)
+    result = {}
+    missing = []
+    for template_id in template_ids:
+        ownership = get_template_ownership(main_user_id, template_id, version)
+        if ownership is not None and ownership.get("dayMinutes") is not None:
+            result[template_id] = ownership["dayMinutes"]
+        else:
+            missing.append(template_id)
+
+    if missing:
+        templates_ref = templates_collection(db, main_user_id)
+        for template_doc in db.get_all([templates_ref.document(template_id) for template_id in missing]):
+            template = template_doc.to_dict() if template_doc.exists else {}
+            entry = set_template_ownership(
+                main_user_id, template_doc.id, version, template_doc.exists, template.get('user_id'), working_day_minutes(template)
+            )
+            result[template_doc.id] = entry["dayMinutes"]
+    return result
+
+
+def attach_block_totals(db, main_user_id: str, blocks: list, templates_version: int = None) -> list:
+    # "totalDuration" (minutes of one OP unit) on each hydrated block, for GET /blocks/full
+    index = PhaseIndex(blocks, template_day_minutes(db, main_user_id, blocks, templates_version))
+    for block, total in zip(blocks, index.block_totals.tolist()):
+        block["totalDuration"] = round(total, 2)
+    return blocks
+
+
+def iter_blocks_with_totals(db, main_user_id: str, chunk_size: int = 100, templates_version: int = None):
+    # NDJSON mode of GET /blocks/full: totals computed per chunk of hydrated blocks
+    chunk = []
+    for block in iter_catalog(db, main_user_id, chunk_size=chunk_size):
+        chunk.append(block)
+        if len(chunk) >= chunk_size:
+            yield from attach_block_totals(db, main_user_id, chunk, templates_version)
+            chunk = []
+    if chunk:
+        yield from attach_block_totals(db, main_user_id, chunk, templates_version)
+
+
+def load_phase_index(db, main_user_id: str) -> PhaseIndex:
+    blocks = list(iter_blocks(db, main_user_id, chunk_size=0, with_resources=False))
+    return PhaseIndex(blocks, template_day_minutes(db, main_user_id, blocks))
+
+
+async def estimate_op(db, main_user_id: str, block_id: str, quantity: int):
+    """
+    Estimated minutes of one OP, or None when the block does not exist.
+    """
+    if not block_id:
+        return None
+    block_ref = blocks_collection(db, main_user_id).document(block_id)
+    block_doc, phase_docs = await gather_io(block_ref.get, block_ref.collection("phases").get)
+    if not block_doc.exists:
+        return None
+
+    block = block_doc.to_dict()
+    block["id"] = block_id
+    block["phases"] = [phase_doc.to_dict() for phase_doc in phase_docs]
+    day_minutes = await run_io(template_day_minutes, db, main_user_id, [block])
+    return float(PhaseIndex([block], day_minutes).estimate([block_id], [quantity])[0])
+
+
+def reestimate_ops(db, main_user_id: str) -> int:
+    """
+    Recomputes estimatedDuration of every OP of the tenant in one vectorized pass (after a phase or block
+    edit) and writes only the OPs whose estimate changed. Blocking, meant for BackgroundTasks.
+
+    Returns:
+        Number of OPs updated.
+    """
+    index = load_phase_index(db, main_user_id)
+    ops_ref = ops_collection(db, main_user_id)
+    op_docs = list(ops_ref.select(["block.id", "quantity", "estimatedDuration"]).stream())
+    if not op_docs:
+        return 0
+
+    ops = [op_doc.to_dict() for op_doc in op_docs]
+    estimates = index.estimate([op_block_id(op) for op in ops], [op.get("quantity") for op in ops])
+    current = np.array([op.get("estimatedDuration") or 0.0 for op in ops], dtype=np.float64)
+    changed = np.flatnonzero(~np.isnan(estimates) & ~np.isclose(estimates, current))
+
+    batch = versioned_batch(db, main_user_id, "ops")
+    for count, i in enumerate(changed.tolist(), start=1):
+        batch.update(op_docs[i].reference, {"estimatedDuration": float(estimates[i])})
+        if count % REESTIMATE_BATCH_SIZE == 0:
+            batch.commit()
+            batch = versioned_batch(db, main_user_id, "ops")
+    if len(changed) % REESTIMATE_BATCH_SIZE:
+        batch.commit()
+    return len(changed)
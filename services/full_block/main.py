@@ -1,21 +1,33 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # before any other import, reported as importSeconds (shared/lifecycle.py)
+
 from fastapi import FastAPI, Depends, HTTPException, status
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import FieldFilter
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from shared.config import db
-from models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
+from .models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
-from utils import validate_template
+from .utils import validate_template
+from shared.responses import FastJSONResponse, CompressionMiddleware
+from shared.lifecycle import health_router, service_lifespan
+from shared.metrics import MetricsMiddleware, metrics_router
+from shared.logs import LogContextMiddleware
 
-from blocks import blocks_router
-from phases import phases_router
-from resources import resources_router
-from ops import op_router
+from .blocks import blocks_router
+from .phases import phases_router
+from .resources import resources_router
+from .ops import op_router
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=service_lifespan("full_block", import_started=IMPORT_STARTED))
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(LogContextMiddleware)
+app.add_middleware(MetricsMiddleware, service="full_block")
 
+app.include_router(health_router)
+app.include_router(metrics_router)
 app.include_router(blocks_router)
 app.include_router(phases_router)
 app.include_router(resources_router)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from typing import List, Optional
 from enum import IntEnum, Enum
 from datetime import datetime
@@ -77,5 +77,12 @@ class OpModel(BaseModel):
     customColumn: Optional[str] = ""
     operatorName: Optional[str] = None
 
+    @validator('quantity')
+    def check_quantity(cls, value):
+        # the estimate is block total x quantity, an OP of nothing is a client error
+        if value is not None and value <= 0:
+            raise ValueError("quantity must be greater than 0")
+        return value
+
     class Config:
         orm_mode = True # Ensure this is imported or defined in models.py
\ No newline at end of file
@@ -1,20 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response, Request
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import FieldFilter
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from shared.config import db
-from models import BlockCreate, PhaseCreate, ResourceCreate, OpModel
+from .models import BlockCreate, PhaseCreate, ResourceCreate, OpModel
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
+from shared.datastore import run_io
+from shared.events import publish, op_event
+from shared.selected_template import get_selected_template
+from shared.pagination import page_params, paginate, set_next_cursor
+from shared.streaming import wants_ndjson, documents_ndjson
+from shared.responses import json_response
+from shared.versions import versioned_batch, list_etag, is_not_modified, not_modified, read_versions, set_etag
+from shared.repository import ops_collection
 from typing import List
-from utils import validate_template
+from .utils import validate_template
+from .bulk import import_ops, iter_body_rows
+from .estimates import estimate_op, op_block_id
 
 op_router = APIRouter()
 
 # Create a op (main users only)
 @op_router.post("/op")
-async def create_op(op: OpModel, current_user: dict = Depends(require_main_role)):
+async def create_op(op: OpModel, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     try:
         #print("Received data from frontend:", op.model_dump())
 
@@ -27,7 +37,7 @@ async def create_op(op: OpModel, current_user: dict = Depends(require_main_role)
             raise HTTPException(status_code=400, detail="No templateId provided")
 
         # Validate template existence and ownership
-        validate_template(op.templateId, main_user_id)
+        await validate_template(op.templateId, main_user_id)
 
         op_data = op.model_dump(by_alias=True, exclude_unset=True)
               
@@ -56,14 +66,22 @@ async def create_op(op: OpModel, current_user: dict = Depends(require_main_role)
         #     "createdAt": firestore.SERVER_TIMESTAMP
         # }
 
+        # estimatedDuration is computed from the block phases (minutes), the value sent is kept when there is no block
+        estimate = await estimate_op(db, main_user_id, op_block_id(op_data), op.quantity)
+        if estimate is not None:
+            op_data["estimatedDuration"] = estimate
+
         op_data["mainUserId"] = main_user_id 
         op_data["createdAt"] = firestore.SERVER_TIMESTAMP
         
-        op_ref = db.collection("users").document(main_user_id).collection("ops")
-        doc_ref = op_ref.add(op_data)
-
-        op_id = doc_ref[1].id
-        logger.info(f"Op created: {op_id}")
+        op_ref = ops_collection(db, main_user_id).document()
+        batch = versioned_batch(db, main_user_id, "ops")
+        batch.set(op_ref, op_data)
+        await run_io(batch.commit)
+
+        op_id = op_ref.id
+        logger.info("Op created: %s", op_id)
+        background_tasks.add_task(publish, op_event(main_user_id, op_id, op_data))
         return {"message": "Op created", "id": op_id}
     except ValueError as ve:
         logger.error(f"Value error creating op: {str(ve)}")
@@ -72,45 +90,67 @@ async def create_op(op: OpModel, current_user: dict = Depends(require_main_role)
         logger.error(f"Unexpected error creating op: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
+# Bulk import ops (main users only), body NDJSON (one OpModel per line) or CSV (Content-Type: text/csv)
+@op_router.post("/ops/bulk")
+async def bulk_create_ops(request: Request, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
+    try:
+        main_user_id = current_user['mainUserId']
+        report = await import_ops(db, main_user_id, iter_body_rows(request), validate_template)
+        logger.info("Bulk ops for %s: %s created, %s failed", main_user_id, report['created'], report['failed'])
+        if report["created"]:
+            background_tasks.add_task(publish, {"type": "ops.imported", "mainUserId": main_user_id})
+        return report
+    except Exception as e:
+        logger.error(f"Error on bulk ops import: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 # List ops
 @op_router.get("/ops")
-async def list_ops(current_user: dict = Depends(require_main_role)):
+async def list_ops(request: Request, response: Response, page: dict = Depends(page_params), current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
         user_id = current_user['uid']
 
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
-
-        if not user_doc.exists:
-            logger.error(f"User {user_id} not found")
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        selected_template = user_doc.to_dict().get('selectedTemplate')
+        # one read of the versions document for the selection cache and the ETag
+        versions = await run_io(read_versions, db, main_user_id)
+        selected_template = await get_selected_template(current_user, versions)
         
         if not selected_template:
-            logger.info(f"User {user_id} has no selected template")
+            logger.info("User %s has no selected template", user_id)
             return {"ops": []}
 
-        logger.info(f"Listing ops for mainUserId: {main_user_id}, template: {selected_template}")
+        # unchanged since the client copy: 304 without querying the ops
+        etag = await list_etag(request, db, main_user_id, ["ops"], selected_template, versions=versions)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
+        logger.info("Listing ops for mainUserId: %s, template: %s", main_user_id, selected_template)
 
-        op_ref = db.collection("users").document(main_user_id).collection("ops").where(
+        op_ref = ops_collection(db, main_user_id).where(
             filter=FieldFilter('mainUserId', '==', main_user_id)
         ).where(
             filter=FieldFilter('templateId', '==', selected_template)
         )
 
-        ops = op_ref.get()
+        # Accept: application/x-ndjson streams every op of the template, one per line
+        if wants_ndjson(request):
+            streamed = documents_ndjson(op_ref, page["fields"])
+            set_etag(streamed, etag)
+            return streamed
+
+        ops, next_cursor = await run_io(paginate, op_ref, page)
+        set_next_cursor(response, next_cursor)
         op_list = []
         for op in ops:
             op_data = op.to_dict()
             op_data['id'] = op.id
             #logger.info(f"Op {op.id} block: {op_data.get('block')}")  
             op_list.append(op_data)
-            logger.debug(f"Op found: {op_data}")  
+            logger.debug("Op found: %s", op_data)  
                 
-        logger.info(f"Ops found: {len(op_list)}")
-        return {"ops": op_list}
+        logger.info("Ops found: %s", len(op_list))
+        return json_response({"ops": op_list}, response)
     except Exception as e:
         logger.error(f"Error listing ops: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -122,7 +162,7 @@ async def list_ops(current_user: dict = Depends(require_main_role)):
 #         main_user_id = current_user['mainUserId']
         
 #         op_ref = db.collection("users").document(main_user_id).collection("ops").document(op_id)
-#         op_doc = op_ref.get()
+#         op_doc = await run_io(op_ref.get)
         
 #         if not op_doc.exists:
 #             logger.error(f"Op {op_id} not found for user {main_user_id}")
@@ -138,31 +178,36 @@ async def list_ops(current_user: dict = Depends(require_main_role)):
 
 # Delete op
 @op_router.delete("/op/{op_id}")
-async def delete_op(op_id: str, current_user: dict = Depends(require_main_role)):
+async def delete_op(op_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
         
-        op_ref = db.collection("users").document(main_user_id).collection("ops").document(op_id)
-        op_doc = op_ref.get()
+        op_ref = ops_collection(db, main_user_id).document(op_id)
+        op_doc = await run_io(op_ref.get)
         
         if not op_doc.exists:
             logger.error(f"Op {op_id} not found for user {main_user_id}")
             raise HTTPException(status_code=404, detail="Op not found")
         
-        op_ref.delete()
-        logger.info(f"Op {op_id} deleted for user {main_user_id}")
+        batch = versioned_batch(db, main_user_id, "ops")
+        batch.delete(op_ref)
+        await run_io(batch.commit)
+        logger.info("Op %s deleted for user %s", op_id, main_user_id)
+        background_tasks.add_task(publish, {"type": "op.deleted", "mainUserId": main_user_id, "opId": op_id})
         return {"message": "Op deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting op {op_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # update op
 @op_router.put("/ops/{op_id}")
-async def update_op(op_id: str, op: OpModel, current_user: dict = Depends(require_main_role)):
+async def update_op(op_id: str, op: OpModel, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     main_user_id = current_user['mainUserId']
         
-    op_ref = db.collection("users").document(main_user_id).collection("ops").document(op_id)
-    op_doc = op_ref.get()
+    op_ref = ops_collection(db, main_user_id).document(op_id)
+    op_doc = await run_io(op_ref.get)
     
     if not op_doc.exists:
         logger.error(f"Op {op_id} not found for user {main_user_id}")
@@ -174,10 +219,19 @@ async def update_op(op_id: str, op: OpModel, current_user: dict = Depends(requir
         # logger.info(f"Updating op {op_id} with fields: {list(op_data.keys())}")
         # logger.info(f"op data received to update: {op.dict()}") 
         op_data["updatedAt"] = firestore.SERVER_TIMESTAMP
+
+        # block or quantity may have changed, the estimate uses the merged op
+        current = {**op_doc.to_dict(), **op_data}
+        estimate = await estimate_op(db, main_user_id, op_block_id(current), current.get("quantity"))
+        if estimate is not None:
+            op_data["estimatedDuration"] = estimate
              
         # Update op document in Firestore
-        op_ref.update(op_data)
-       
+        batch = versioned_batch(db, main_user_id, "ops")
+        batch.update(op_ref, op_data)
+        await run_io(batch.commit)
+
+        background_tasks.add_task(publish, op_event(main_user_id, op_id, {**current, **op_data}))
         return {"id": op_id, "message": "Op updated", "code": op_data["code"]}
     except Exception as e:
         logger.error(f"Error on update op: {str(e)}")
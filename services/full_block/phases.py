@@ -1,31 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import FieldFilter
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from shared.config import db
-from models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
+from .models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
-from utils import validate_template
+from shared.datastore import run_io, gather_io
+from shared.responses import json_response
+from shared.events import publish
+from shared.versions import versioned_batch
+from .utils import validate_template, reestimate_ops_task
+from shared.hydration import get_resources_by_id
+from shared.block_trees import BLOCK_TREES_READ, tree_ref, is_complete, block_from_tree, write_tree_phase, delete_tree_phase
+from shared.repository import blocks_collection
 
 phases_router = APIRouter()
 
 # Create a phase inside block route
 @phases_router.post("/blocks/{block_id}/phases")
-async def create_phase(block_id: str, phase: PhaseCreate, current_user: dict = Depends(require_main_role)):
+async def create_phase(block_id: str, phase: PhaseCreate, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
-        logger.info(f"Request create phase, block_id: '{block_id}', user_id: '{main_user_id}'")
+        logger.info("Request create phase, block_id: '%s', user_id: '%s'", block_id, main_user_id)
        
         # Check if block exists and belongs to mainUserId
-        block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-        block_doc = block_ref.get()
+        block_ref = blocks_collection(db, main_user_id).document(block_id)
+        block_doc = await run_io(block_ref.get)
         #logger.info(f"block_doc exists: {block_doc.exists}")
         
         if block_doc.exists:
             block_data = block_doc.to_dict()
-            logger.info(f"Block data: {block_data}")
+            logger.debug("Block data: %s", block_data)
         
         if not block_doc.exists:
             logger.error(f"Block '{block_id}' not found")
@@ -42,10 +49,17 @@ async def create_phase(block_id: str, phase: PhaseCreate, current_user: dict = D
             "createdAt": firestore.SERVER_TIMESTAMP
         }
         
-        doc_ref = block_ref.collection('phases').add(phase_data)
-        phase_id = doc_ref[1].id
+        # phase and block tree written together
+        phase_ref = block_ref.collection('phases').document()
+        phase_id = phase_ref.id
+        batch = versioned_batch(db, main_user_id, "blocks")
+        batch.set(phase_ref, phase_data)
+        write_tree_phase(batch, db, main_user_id, block_id, phase_id, phase_data)
+        await run_io(batch.commit)
+        background_tasks.add_task(reestimate_ops_task, main_user_id)
 
-        logger.info(f"Phase created: {phase_id}")
+        logger.info("Phase created: %s", phase_id)
+        background_tasks.add_task(publish, {"type": "block.changed", "mainUserId": main_user_id, "blockId": block_id})
         return {"message": "Phase created", "id": phase_id}
     except Exception as e:
         logger.error(f"Error creating phase: {str(e)}")
@@ -56,10 +70,27 @@ async def create_phase(block_id: str, phase: PhaseCreate, current_user: dict = D
 async def get_phases(block_id: str, current_user: dict = Depends(get_current_user)):
     try:
         main_user_id = current_user['mainUserId']
-        logger.info(f"Fetching phases for block {block_id}, mainUserId: {main_user_id}")
-        
-        block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-        block_doc = block_ref.get()
+        logger.info("Fetching phases for block %s, mainUserId: %s", block_id, main_user_id)
+
+        # materialized tree: block, phases and resources in one read
+        if BLOCK_TREES_READ:
+            tree_doc = await run_io(tree_ref(db, main_user_id, block_id).get)
+            tree = tree_doc.to_dict() if tree_doc.exists else None
+            if is_complete(tree):
+                if tree["block"].get("mainUserId") != main_user_id:
+                    logger.error(f"Block {block_id} does not belong to mainUserId {main_user_id}")
+                    raise HTTPException(status_code=403, detail="Access denied: Block does not belong to the main user")
+                phases = block_from_tree(block_id, tree)["phases"]
+                for phase_data in phases:
+                    resource = phase_data.pop("resource", None)
+                    if phase_data.get("resources"):
+                        phase_data["resource_details"] = [resource] if resource else []
+                logger.info("Phases returned from block tree: %s phases", len(phases))
+                return json_response({"phases": phases})
+        
+        block_ref = blocks_collection(db, main_user_id).document(block_id)
+        # block and its phases are read concurrently
+        block_doc, phases_ref = await gather_io(block_ref.get, block_ref.collection("phases").get)
         
         if not block_doc.exists:
             logger.error(f"Block {block_id} not found")
@@ -68,24 +99,24 @@ async def get_phases(block_id: str, current_user: dict = Depends(get_current_use
             logger.error(f"Block {block_id} does not belong to mainUserId {main_user_id}")
             raise HTTPException(status_code=403, detail="Access denied: Block does not belong to the main user")
 
-        phases_ref = block_ref.collection("phases").get()
         phases = []
+        resource_ids = set()
         for doc in phases_ref:
             phase_data = doc.to_dict()
             phase_data["id"] = doc.id
+            resource_ids.update(phase_data.get("resources") or [])
+            phases.append(phase_data)
 
+        # resolve all resources of the block with one multi-get
+        resources = await run_io(get_resources_by_id, db, main_user_id, resource_ids)
+        for phase_data in phases:
             if phase_data.get("resources"):  
-                phase_data["resource_details"] = []
-                for resource_id in phase_data["resources"]:
-                    resource_doc = db.collection('users').document(main_user_id).collection("resources").document(resource_id).get()
-                    if resource_doc.exists:
-                        resource_data = resource_doc.to_dict()
-                        resource_data["id"] = resource_id
-                        phase_data["resource_details"].append(resource_data)
-            phases.append(phase_data)
+                phase_data["resource_details"] = [
+                    dict(resources[resource_id]) for resource_id in phase_data["resources"] if resource_id in resources
+                ]
         
-        logger.info(f"Phases returned: {len(phases)} phases")
-        return {"phases": phases}
+        logger.info("Phases returned: %s phases", len(phases))
+        return json_response({"phases": phases})
     except Exception as e:
         logger.error(f"Error listing phases: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -93,14 +124,15 @@ async def get_phases(block_id: str, current_user: dict = Depends(get_current_use
 
 # Delete a phase from block (main users only)
 @phases_router.delete("/blocks/{block_id}/phases/{phase_id}")
-async def delete_phase(block_id: str, phase_id: str, current_user: dict = Depends(require_main_role)):
+async def delete_phase(block_id: str, phase_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(require_main_role)):
     try:
         main_user_id = current_user['mainUserId']
-        logger.info(f"Request delete phase: block_id='{block_id}', phase_id='{phase_id}', user_id='{main_user_id}'")
+        logger.info("Request delete phase: block_id='%s', phase_id='%s', user_id='%s'", block_id, phase_id, main_user_id)
         
         # Check if block exists and belongs to mainUserId
-        block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-        block_doc = block_ref.get()
+        block_ref = blocks_collection(db, main_user_id).document(block_id)
+        phase_ref = block_ref.collection('phases').document(phase_id)
+        block_doc, phase_doc = await gather_io(block_ref.get, phase_ref.get)
         
         if not block_doc.exists:
             logger.error(f"Block '{block_id}' not found")
@@ -110,17 +142,20 @@ async def delete_phase(block_id: str, phase_id: str, current_user: dict = Depend
             raise HTTPException(status_code=403, detail="Access denied")
         
         # Check if phase exists
-        phase_ref = block_ref.collection('phases').document(phase_id)
-        phase_doc = phase_ref.get()
         
         if not phase_doc.exists:
             logger.error(f"Phase '{phase_id}' not found in block '{block_id}'")
             raise HTTPException(status_code=404, detail="Phase not found")
         
-        # Delete phase
-        phase_ref.delete()
+        # Delete phase (and its entry in the block tree)
+        batch = versioned_batch(db, main_user_id, "blocks")
+        batch.delete(phase_ref)
+        delete_tree_phase(batch, db, main_user_id, block_id, phase_id)
+        await run_io(batch.commit)
+        background_tasks.add_task(reestimate_ops_task, main_user_id)
         
-        logger.info(f"✅ Phase '{phase_id}' deleted from block '{block_id}'")
+        logger.info("✅ Phase '%s' deleted from block '%s'", phase_id, block_id)
+        background_tasks.add_task(publish, {"type": "block.changed", "mainUserId": main_user_id, "blockId": block_id})
         return {"message": "Phase deleted successfully", "id": phase_id}
         
     except HTTPException:
@@ -136,21 +171,21 @@ async def update_phase(
     block_id: str, 
     phase_id: str, 
     phase: PhaseCreate,  
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(require_main_role)
 ):
     try:
         main_user_id = current_user['mainUserId']
-        logger.info(f"Request update phase: block_id='{block_id}', phase_id='{phase_id}', user_id='{main_user_id}'")
+        logger.info("Request update phase: block_id='%s', phase_id='%s', user_id='%s'", block_id, phase_id, main_user_id)
         
         #  Check block
-        block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-        block_doc = block_ref.get()
+        block_ref = blocks_collection(db, main_user_id).document(block_id)
+        phase_ref = block_ref.collection('phases').document(phase_id)
+        block_doc, phase_doc = await gather_io(block_ref.get, phase_ref.get)
         if not block_doc.exists or block_doc.to_dict().get('mainUserId') != main_user_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
         # Check phase exists
-        phase_ref = block_ref.collection('phases').document(phase_id)
-        phase_doc = phase_ref.get()
         if not phase_doc.exists:
             raise HTTPException(status_code=404, detail="Phase not found")
         
@@ -161,9 +196,16 @@ async def update_phase(
             "duration": phase.duration,
             "updatedAt": firestore.SERVER_TIMESTAMP
         }
-        phase_ref.update(phase_update_data)
-        
-        logger.info(f"Phase '{phase_id}' updated in block '{block_id}'")
+        batch = versioned_batch(db, main_user_id, "blocks")
+        batch.update(phase_ref, phase_update_data)
+        write_tree_phase(batch, db, main_user_id, block_id, phase_id, phase_update_data)
+        await run_io(batch.commit)
+        # durations of the ops that use this block change with the phase
+        if phase.duration != phase_doc.to_dict().get("duration"):
+            background_tasks.add_task(reestimate_ops_task, main_user_id)
+            background_tasks.add_task(publish, {"type": "block.changed", "mainUserId": main_user_id, "blockId": block_id})
+        
+        logger.info("Phase '%s' updated in block '%s'", phase_id, block_id)
         return {"message": "Phase updated", "id": phase_id}
         
     except HTTPException:
@@ -1,15 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response, Request
 from firebase_admin import firestore
 from google.cloud.firestore_v1 import FieldFilter
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from shared.config import db
-from models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
+from .models import BlockCreate, PhaseCreate, ResourceCreate, PhaseUpdateResource
 from shared.auth import get_current_user, require_main_role
 from shared.config import logger
-from utils import validate_template
+from shared.datastore import run_io, gather_io
+from shared.events import publish
+from shared.block_trees import write_tree_phase_resource, update_resource_in_trees
+from shared.selected_template import get_selected_template
+from shared.pagination import page_params, paginate, set_next_cursor
+from shared.streaming import wants_ndjson, documents_ndjson
+from shared.responses import json_response
+from shared.versions import bump_versions, versioned_batch, list_etag, is_not_modified, not_modified, read_versions, set_etag
+from shared.repository import blocks_collection, resources_collection
+from .utils import validate_template
 
 resources_router = APIRouter()
+
+
+# resource document and the block trees embedding it change in one transaction (resource None = deleted)
+@firestore.transactional
+def _write_resource(transaction, main_user_id: str, doc_ref, update_data):
+    resource_doc = doc_ref.get(transaction=transaction)
+    if update_data is None:
+        trees = update_resource_in_trees(transaction, db, main_user_id, doc_ref.id, None)
+        transaction.delete(doc_ref)
+    else:
+        resource = {**(resource_doc.to_dict() or {}), **update_data, "id": doc_ref.id}
+        trees = update_resource_in_trees(transaction, db, main_user_id, doc_ref.id, resource)
+        transaction.update(doc_ref, update_data)
+    # writes only after every read of the transaction; GET /blocks/full's ETag includes the resources version
+    bump_versions(transaction, db, main_user_id, "resources")
+    return trees
     
 # create resource
 @resources_router.post("/resources")
@@ -24,7 +49,7 @@ async def create_resource(resource: ResourceCreate, current_user: dict = Depends
             raise HTTPException(status_code=400, detail="No templateId provided")
 
         # Validate template existence and ownership
-        validate_template(resource.templateId, main_user_id)
+        await validate_template(resource.templateId, main_user_id)
 
         resource_data = {
             "name": resource.name,
@@ -37,11 +62,14 @@ async def create_resource(resource: ResourceCreate, current_user: dict = Depends
             "createdAt": firestore.SERVER_TIMESTAMP
         }
         
-        resources_ref = db.collection("users").document(main_user_id).collection("resources")
-        doc_ref = resources_ref.add(resource_data)           
-        resource_id = doc_ref[1].id
+        doc_ref = resources_collection(db, main_user_id).document()
+        batch = versioned_batch(db, main_user_id, "resources")
+        batch.set(doc_ref, resource_data)
+        await run_io(batch.commit)
+        resource_id = doc_ref.id
         
-        logger.info(f"Resource created: {resource_data}, ID: {resource_id}")
+        logger.info("Resource created: %s", resource_id)
+        logger.debug("Resource %s data: %s", resource_id, resource_data)
         return {"message": "Resource created", "id": resource_id}
     except Exception as e:
         logger.error(f"Error creating resource: {str(e)}")
@@ -50,29 +78,35 @@ async def create_resource(resource: ResourceCreate, current_user: dict = Depends
 
 # List resources (main and child users)
 @resources_router.get("/resources")
-async def get_resources(current_user: dict = Depends(get_current_user)):
+async def get_resources(request: Request, response: Response, page: dict = Depends(page_params), current_user: dict = Depends(get_current_user)):
     try:
         main_user_id = current_user['mainUserId']
         #logger.info(f"Fetching resources for mainUserId: {main_user_id} (user: {current_user['uid']}, role: {current_user['role']})")
         
-        # firebase doc inside users
-        user_ref = db.collection('users').document(current_user['uid'])                
-        user_doc = user_ref.get()
-
-        if not user_doc.exists:
-            logger.error(f"User {current_user['uid']} not found")
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        selected_template = user_doc.to_dict().get('selectedTemplate')
+        # one read of the versions document for the selection cache and the ETag
+        versions = await run_io(read_versions, db, main_user_id)
+        selected_template = await get_selected_template(current_user, versions)
         
         if not selected_template:
             return {"resources": []}
 
+        etag = await list_etag(request, db, main_user_id, ["resources"], selected_template, versions=versions)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
         #logger.info(f"Fetching resources for mainUserId: {main_user_id}, template: {selected_template}")
         
-        resources_ref = db.collection("users").document(main_user_id).collection("resources").where(
+        resources_query = resources_collection(db, main_user_id).where(
             filter=FieldFilter('templateId', '==', selected_template)  
-        ).get() 
+        )
+        if wants_ndjson(request):
+            streamed = documents_ndjson(resources_query, page["fields"])
+            set_etag(streamed, etag)
+            return streamed
+
+        resources_ref, next_cursor = await run_io(paginate, resources_query, page)
+        set_next_cursor(response, next_cursor)
         
         resources = []
         for doc in resources_ref: 
@@ -80,8 +114,8 @@ async def get_resources(current_user: dict = Depends(get_current_user)):
             resource_data["id"] = doc.id
             resources.append(resource_data)
         
-        logger.info(f"Resources: {len(resources)}")
-        return {"resources": resources}
+        logger.info("Resources: %s", len(resources))
+        return json_response({"resources": resources}, response)
     
     except Exception as e:
         logger.error(f"Error listing resources: {str(e)}")
@@ -93,9 +127,9 @@ async def update_resource(resource_id: str,  resource: ResourceCreate,  current_
     try:
         main_user_id = current_user['mainUserId']
         
-        resources_ref = db.collection("users").document(main_user_id).collection("resources")
+        resources_ref = resources_collection(db, main_user_id)
         doc_ref = resources_ref.document(resource_id)
-        doc = doc_ref.get()
+        doc = await run_io(doc_ref.get)
         
         if not doc.exists:
             logger.error(f"Resource {resource_id} not found")
@@ -116,9 +150,10 @@ async def update_resource(resource_id: str,  resource: ResourceCreate,  current_
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
         
-        doc_ref.update(update_data)
+        trees = await run_io(_write_resource, db.transaction(), main_user_id, doc_ref, update_data)
         
-        logger.info(f"Resource {resource_id} updated: {update_data}")
+        logger.info("Resource %s updated (%s block trees)", resource_id, trees)
+        logger.debug("Resource %s update: %s", resource_id, update_data)
         return {"message": "Resource updated", "id": resource_id}
         
     except HTTPException:
@@ -136,17 +171,17 @@ async def delete_resource(
     try:
         main_user_id = current_user['mainUserId']
         
-        resources_ref = db.collection("users").document(main_user_id).collection("resources")
+        resources_ref = resources_collection(db, main_user_id)
         doc_ref = resources_ref.document(resource_id)
-        doc = doc_ref.get()
+        doc = await run_io(doc_ref.get)
         
         if not doc.exists:
             logger.error(f"Resource {resource_id} not found")
             raise HTTPException(status_code=404, detail="Resource not found")
         
-        doc_ref.delete()
+        trees = await run_io(_write_resource, db.transaction(), main_user_id, doc_ref, None)
         
-        logger.info(f"Resource {resource_id} deleted successfully")
+        logger.info("Resource %s deleted successfully (%s block trees)", resource_id, trees)
         return {"message": "Resource deleted", "id": resource_id}
         
     except HTTPException:
@@ -161,15 +196,21 @@ async def assign_resource_to_phase(
     block_id: str,
     phase_id: str,
     resource_id: str,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(require_main_role)
 ):
     try:
         main_user_id = current_user['mainUserId']
-        logger.info(f"Assign resource '{resource_id}' to phase '{phase_id}' in block '{block_id}' for user '{main_user_id}'")
+        logger.info("Assign resource '%s' to phase '%s' in block '%s' for user '%s'", resource_id, phase_id, block_id, main_user_id)
         
+        block_ref = blocks_collection(db, main_user_id).document(block_id)
+        phase_ref = block_ref.collection('phases').document(phase_id)
+        resource_ref = resources_collection(db, main_user_id).document(resource_id)
+
+        # block, phase and resource existence checks are independent reads, run them concurrently
+        block_doc, phase_doc, resource_doc = await gather_io(block_ref.get, phase_ref.get, resource_ref.get)
+
         # Validate block
-        block_ref = db.collection('users').document(main_user_id).collection("blocks").document(block_id)
-        block_doc = block_ref.get()
         if not block_doc.exists:
             logger.error(f"Block {block_id} not found for user {main_user_id}")
             raise HTTPException(status_code=404, detail="Block not found")
@@ -178,26 +219,26 @@ async def assign_resource_to_phase(
             raise HTTPException(status_code=403, detail="Access denied")
         
         # Validate phase
-        phase_ref = block_ref.collection('phases').document(phase_id)
-        phase_doc = phase_ref.get()
         if not phase_doc.exists:
             logger.error(f"Phase {phase_id} not found in block {block_id}")
             raise HTTPException(status_code=404, detail="Phase not found")
         
         # Validate resource
-        resource_ref = db.collection('users').document(main_user_id).collection("resources").document(resource_id)
-        resource_doc = resource_ref.get()
         if not resource_doc.exists:
             logger.error(f"Resource {resource_id} not found for user {main_user_id}")
             raise HTTPException(status_code=404, detail="Resource not found")
         
-        # Update phase
-        phase_ref.update({
+        # Update phase, the block tree embeds the resource
+        batch = versioned_batch(db, main_user_id, "blocks")
+        batch.update(phase_ref, {
             'resources': [resource_id],  
             'updatedAt': firestore.SERVER_TIMESTAMP
         })
+        write_tree_phase_resource(batch, db, main_user_id, block_id, phase_id, {**resource_doc.to_dict(), "id": resource_id})
+        await run_io(batch.commit)
         
-        logger.info(f"Phase '{phase_id}' resource ASSIGNED to '{resource_id}' (overwritten)")
+        logger.info("Phase '%s' resource ASSIGNED to '%s' (overwritten)", phase_id, resource_id)
+        background_tasks.add_task(publish, {"type": "block.changed", "mainUserId": main_user_id, "blockId": block_id})
         return {"message": "Resource assigned", "phase_id": phase_id, "resource_id": resource_id}
     
     except HTTPException:
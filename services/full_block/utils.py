@@ -1,11 +1,18 @@
 from fastapi import HTTPException
+from shared.datastore import run_io
 from shared.config import db
 from shared.config import logger
+from shared.template_cache import get_template_ownership, set_template_ownership
+from shared.working_calendar import working_day_minutes
+from shared.repository import templates_collection
+from .estimates import reestimate_ops
 
 # Reusable function to validate template existence and ownership
-def validate_template(template_id: str, main_user_id: str) -> None:
+async def validate_template(template_id: str, main_user_id: str) -> None:
     """
     Validates that a template exists and belongs to the main user.
+    The result is cached per (mainUserId, templateId) for TEMPLATE_CACHE_TTL: a hit makes no read, a miss
+    reads the template (shared/template_cache.py).
     
     Args:
         template_id: The ID of the template to validate.
@@ -14,13 +21,29 @@ def validate_template(template_id: str, main_user_id: str) -> None:
     Raises:
         HTTPException: If the template doesn't exist (404) or doesn't belong to the main user (403).
     """
-    #template_ref = db.collection('templates').document(template_id)
-    template_ref = (db.collection('users').document(main_user_id).collection('templates').document(template_id))
+    ownership = get_template_ownership(main_user_id, template_id)
+    if ownership is None:
+        #template_ref = db.collection('templates').document(template_id)
+        template_ref = templates_collection(db, main_user_id).document(template_id)
 
-    template_doc = template_ref.get()
-    if not template_doc.exists:
+        template_doc = await run_io(template_ref.get)
+        template = template_doc.to_dict() if template_doc.exists else {}
+        ownership = set_template_ownership(
+            main_user_id, template_id, None, template_doc.exists, template.get('user_id'), working_day_minutes(template)
+        )
+
+    if not ownership["exists"]:
         logger.error(f"Template {template_id} not found")
         raise HTTPException(status_code=404, detail="Template not found")
-    if template_doc.to_dict().get('user_id') != main_user_id:
+    if ownership["owner"] != main_user_id:
         logger.error(f"Template {template_id} does not belong to mainUserId {main_user_id}")
         raise HTTPException(status_code=403, detail="Access denied: Template does not belong to the main user")
+
+
+# Background task after a phase/block edit: re-estimates the duration of every op of the tenant
+def reestimate_ops_task(main_user_id: str) -> None:
+    try:
+        updated = reestimate_ops(db, main_user_id)
+        logger.info("Ops re-estimated for %s: %s updated", main_user_id, updated)
+    except Exception as e:
+        logger.error(f"Error re-estimating ops for {main_user_id}: {str(e)}")
@@ -0,0 +1,167 @@
+import csv
+import heapq
+import io
+import zipfile
+from itertools import islice
+from operator import itemgetter
+from xml.sax.saxutils import escape
+
+from shared.streaming import ndjson_lines
+
+# Export of the current plan, one row per scheduled phase, ordered by start.
+# The booking lists of the planner are copied once (Planner.booking_snapshot, O(n) references, ~8 MB for 200k
+# bookings). Rows are produced lazily from that copy: the bookings of every resource (already ordered by
+# start) are merged with heapq.merge and converted in chunks (datetimes in one batch per chunk), each chunk is
+# serialized and handed to the StreamingResponse before the next one is read, so the rows, datetimes and
+# serialized output are never held for the whole plan.
+EXPORT_COLUMNS = ["opCode", "blockId", "phaseId", "resourceId", "start", "end", "priority"]
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx-lite": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+def iter_row_chunks(planner, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yields lists of at most chunk_size rows (dicts with EXPORT_COLUMNS).
+    """
+    timelines = planner.booking_snapshot()
+    bookings = heapq.merge(
+        *(zip(starts, ends, entries, [resource_id] * len(starts)) for resource_id, (starts, ends, entries) in timelines.items()),
+        key=itemgetter(0),
+    )
+    calendar = planner.calendar
+    while True:
+        chunk = list(islice(bookings, chunk_size))
+        if not chunk:
+            return
+        starts = calendar.to_datetimes(start for start, _, _, _ in chunk)
+        ends = calendar.to_datetimes((end for _, end, _, _ in chunk), end=True)
+        rows = []
+        for start, end, (op_id, step), resource_id in chunk:
+            job = planner.jobs.get(op_id)
+            phases = planner.placements.get(op_id)
+            if job is None or phases is None or step >= len(phases):
+                continue  # removed by an edit after the snapshot
+            op = job[0]
+            rows.append({
+                "opCode": op.get("code"),
+                "blockId": (op.get("block") or {}).get("id"),
+                "phaseId": phases[step][0],
+                "resourceId": resource_id,
+                "start": starts[start],
+                "end": ends[end],
+                "priority": op.get("priority"),
+            })
+        yield rows
+
+
+def csv_chunks(row_chunks):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for rows in row_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(row_chunks):
+    for rows in row_chunks:
+        yield b"".join(ndjson_lines(rows))
+
+
+# xlsx-lite: a minimal valid .xlsx (one sheet, inline strings, no styles) written through zipfile into a
+# write-only sink that is drained after every chunk.
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Plano" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+class _Sink:
+    # unseekable file object, zipfile then writes data descriptors instead of seeking back
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+    return f'<c t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+
+
+def _xml_row(values) -> str:
+    return "<row>" + "".join(_cell(value) for value in values) + "</row>"
+
+
+def xlsx_chunks(row_chunks):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xml_row(EXPORT_COLUMNS).encode())
+            for rows in row_chunks:
+                sheet.write("".join(_xml_row(row[column] for column in EXPORT_COLUMNS) for row in rows).encode())
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+EXPORT_WRITERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "xlsx-lite": xlsx_chunks}
+
+
+def export_plan(planner, export_format: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Body generator of GET /schedule/export (str chunks for csv/ndjson, bytes for xlsx-lite).
+    """
+    return EXPORT_WRITERS[export_format](iter_row_chunks(planner, chunk_size))
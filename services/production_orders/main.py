@@ -1,3 +1,20 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # before any other import, reported as importSeconds (shared/lifecycle.py)
+
 from fastapi import FastAPI
 
-app = FastAPI()
\ No newline at end of file
+from shared.responses import FastJSONResponse, CompressionMiddleware
+from shared.lifecycle import health_router, service_lifespan
+from shared.metrics import MetricsMiddleware, metrics_router
+from shared.logs import LogContextMiddleware
+
+from .schedule import schedule_router
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=service_lifespan("production_orders", import_started=IMPORT_STARTED))
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(LogContextMiddleware)
+app.add_middleware(MetricsMiddleware, service="production_orders")
+
+app.include_router(health_router)
+app.include_router(metrics_router)
+app.include_router(schedule_router)
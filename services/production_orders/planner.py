@@ -0,0 +1,282 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from datetime import datetime
+
+from .scheduler import build_jobs, render_plan, schedule
+
+# Incremental rescheduling.
+# A Planner keeps the placed plan of one tenant/template in memory:
+#   timelines[resource]   bookings of the resource ordered by start: parallel lists starts, ends, (op_id, step)
+#   placements[op_id]     (phase_id, resource_id, start, end) of each phase of the OP
+#   op_resources[op_id]   resources touched by the OP (dependency index)
+# The full plan is built once with the heap dispatch (scheduler.schedule). Edits then repair it locally:
+#   - a changed OP leaves its timelines and is placed again in its previous slots; when it grows, the
+#     bookings after it on the same resource are shifted right, and a shifted phase shifts the next phases
+#     of its OP on the other resources (right-shift repair), stopping as soon as a gap absorbs the delay;
+#   - a new OP, or a phase without a previous slot, takes the first gap that fits on its resource;
+#   - a removed OP leaves its gaps, nobody is pulled earlier (POST /schedule rebuilds a compact plan).
+# The cost of an edit is proportional to the bookings that actually move.
+INFINITY = float("inf")
+
+
+def _block_id(op: dict):
+    block = op.get("block") or {}
+    return block.get("id") if isinstance(block, dict) else None
+
+
+class Planner:
+    def __init__(self, template_id: str, calendar, start: datetime, blocks: dict, ops: list):
+        """
+        Args:
+            template_id: Template planned (OPs of other templates are ignored).
+            calendar: WorkingCalendar of the template.
+            start: Planning start.
+            blocks: block_id -> block dict with its phases.
+            ops: OP documents of the template.
+        """
+        self.template_id = template_id
+        self.calendar = calendar
+        self.start = start
+        self.release = calendar.to_working(start)
+        self.blocks = blocks
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.version = 0  # incremented by every edit
+        self._rendered = None  # (version, plan)
+
+        self.jobs = {}  # op_id -> (op, tasks)
+        self.unscheduled = {}  # op_id -> (op, reason)
+        self.block_ops = {}  # block_id -> op ids
+        self.placements = {}
+        self.timelines = {}
+        self.op_resources = {}
+
+        for op in ops:
+            self._set_job(op)
+
+        op_ids = list(self.jobs)
+        placed = schedule([self.jobs[op_id] for op_id in op_ids], self.release)
+        bookings = []
+        for op_id, phases in zip(op_ids, placed):
+            self.placements[op_id] = phases
+            self.op_resources[op_id] = {resource_id for _, resource_id, _, _ in phases if resource_id is not None}
+            for step, (_, resource_id, phase_start, phase_end) in enumerate(phases):
+                if resource_id is not None:
+                    bookings.append((phase_start, resource_id, phase_end, op_id, step))
+        # the dispatch books each resource in start order
+        for phase_start, resource_id, phase_end, op_id, step in sorted(bookings, key=lambda booking: booking[0]):
+            starts, ends, entries = self.timelines.setdefault(resource_id, ([], [], []))
+            starts.append(phase_start)
+            ends.append(phase_end)
+            entries.append((op_id, step))
+
+    def _set_job(self, op: dict) -> None:
+        op_id = op["id"]
+        self._drop_job(op_id)
+        if op.get("templateId", self.template_id) != self.template_id:
+            return
+        jobs, unscheduled = build_jobs([op], self.blocks, self.calendar.day_minutes)
+        for item in unscheduled:
+            self.unscheduled[op_id] = (op, item["reason"])
+        for job_op, tasks in jobs:
+            self.jobs[op_id] = (job_op, tasks)
+            self.block_ops.setdefault(_block_id(job_op), set()).add(op_id)
+
+    def _drop_job(self, op_id: str) -> None:
+        self.unscheduled.pop(op_id, None)
+        job = self.jobs.pop(op_id, None)
+        if job is not None:
+            self.block_ops.get(_block_id(job[0]), set()).discard(op_id)
+
+    def _unbook(self, op_id: str, step: int) -> None:
+        _, resource_id, start, _ = self.placements[op_id][step]
+        if resource_id is None:
+            return
+        starts, ends, entries = self.timelines[resource_id]
+        i = bisect_left(starts, start)
+        while entries[i] != (op_id, step):
+            i += 1
+        del starts[i], ends[i], entries[i]
+
+    def _first_fit(self, resource_id, ready: int, minutes: int, op_id: str, step: int) -> int:
+        # books the phase in the earliest gap >= ready that holds `minutes`
+        starts, ends, entries = self.timelines.setdefault(resource_id, ([], [], []))
+        i = bisect_right(starts, ready)
+        start = max(ready, ends[i - 1]) if i else ready
+        while i < len(starts) and starts[i] < start + minutes:
+            start = max(start, ends[i])
+            i += 1
+        starts.insert(i, start)
+        ends.insert(i, start + minutes)
+        entries.insert(i, (op_id, step))
+        return start
+
+    def _insert_push(self, resource_id, ready: int, minutes: int, op_id: str, step: int, shifted: deque) -> int:
+        """
+        Books the phase at ready (or right after the booking running at ready) and shifts the next
+        bookings of the resource right while they overlap. Shifted bookings are queued for the
+        precedence check of their OP.
+
+        Returns:
+            Start of the booked phase.
+        """
+        starts, ends, entries = self.timelines.setdefault(resource_id, ([], [], []))
+        i = bisect_right(starts, ready)
+        start = max(ready, ends[i - 1]) if i else ready
+        end = start + minutes
+        starts.insert(i, start)
+        ends.insert(i, end)
+        entries.insert(i, (op_id, step))
+
+        j = i + 1
+        while j < len(starts) and starts[j] < end:
+            starts[j], ends[j] = end, end + ends[j] - starts[j]
+            other_op, other_step = entries[j]
+            phase_id = self.placements[other_op][other_step][0]
+            self.placements[other_op][other_step] = (phase_id, resource_id, starts[j], ends[j])
+            shifted.append(entries[j])
+            end = ends[j]
+            j += 1
+        return start
+
+    def _repair(self, shifted: deque) -> set:
+        # right-shift repair: a shifted phase may now end after the next phase of its OP starts
+        moved = set()
+        while shifted:
+            op_id, step = shifted.popleft()
+            moved.add(op_id)
+            phases = self.placements[op_id]
+            if step + 1 >= len(phases) or phases[step + 1][2] >= phases[step][3]:
+                continue
+            phase_id, resource_id, _, _ = phases[step + 1]
+            minutes = self.jobs[op_id][1][step + 1][2]
+            ready = phases[step][3]
+            self._unbook(op_id, step + 1)
+            if resource_id is not None:
+                ready = self._insert_push(resource_id, ready, minutes, op_id, step + 1, shifted)
+            phases[step + 1] = (phase_id, resource_id, ready, ready + minutes)
+            shifted.append((op_id, step + 1))
+        return moved
+
+    def _replace_ops(self, ops: list, removed: list = ()) -> dict:
+        """
+        Takes the changed/removed OPs off the timelines and places the changed ones again.
+
+        Returns:
+            {"moved": number of OPs whose placement changed}
+        """
+        before = {}
+        for op_id in [op["id"] for op in ops] + list(removed):
+            old = self.placements.get(op_id)
+            if old is None or op_id in before:
+                continue
+            before[op_id] = old
+            for step in range(len(old)):
+                self._unbook(op_id, step)
+            del self.placements[op_id]
+            self.op_resources.pop(op_id, None)
+        for op_id in removed:
+            self._drop_job(op_id)
+
+        # changed OPs go back in the order they started, each phase in its previous slot when it had one,
+        # never before now (the plan may have been built hours ago)
+        release = max(self.release, self.calendar.to_working(datetime.now().replace(second=0, microsecond=0)))
+        shifted = deque()
+        for op in sorted(ops, key=lambda op: before[op["id"]][0][2] if before.get(op["id"]) else INFINITY):
+            op_id = op["id"]
+            self._set_job(op)
+            if op_id not in self.jobs:
+                continue
+            slots = {(phase_id, resource_id): start for phase_id, resource_id, start, _ in before.get(op_id, [])}
+            phases = []
+            self.placements[op_id] = phases
+            ready = release
+            for step, (phase_id, resource_id, minutes) in enumerate(self.jobs[op_id][1]):
+                slot = slots.get((phase_id, resource_id))
+                if resource_id is None:
+                    start = ready
+                elif slot is not None:
+                    start = self._insert_push(resource_id, max(ready, slot), minutes, op_id, step, shifted)
+                else:
+                    start = self._first_fit(resource_id, ready, minutes, op_id, step)
+                phases.append((phase_id, resource_id, start, start + minutes))
+                ready = start + minutes
+            self.op_resources[op_id] = {resource_id for _, resource_id, _, _ in phases if resource_id is not None}
+
+        moved = self._repair(shifted)
+        moved.update(op_id for op_id, old in before.items() if self.placements.get(op_id) != old)
+        moved.update(op["id"] for op in ops if op["id"] not in before and op["id"] in self.placements)
+        self.version += 1
+        return {"moved": len(moved)}
+
+    def upsert_op(self, op: dict) -> dict:
+        """
+        OP created or updated (full document with "id"). Inactive/finished OPs and OPs of other
+        templates leave the plan.
+        """
+        with self.lock:
+            return self._replace_ops([op])
+
+    def remove_op(self, op_id: str) -> dict:
+        with self.lock:
+            return self._replace_ops([], removed=[op_id])
+
+    def has_op(self, op_id: str) -> bool:
+        return op_id in self.jobs or op_id in self.unscheduled
+
+    def update_block(self, block_id: str, block: dict = None) -> dict:
+        """
+        Block or its phases changed (block dict with its "phases", None when deleted): its OPs are placed again.
+        """
+        with self.lock:
+            if block is None:
+                self.blocks.pop(block_id, None)
+            else:
+                self.blocks[block_id] = block
+            ops = [self.jobs[op_id][0] for op_id in self.block_ops.get(block_id, set())]
+            # OPs left out because the block was missing or had no phases may fit now
+            ops += [op for op, _ in self.unscheduled.values() if _block_id(op) == block_id]
+            return self._replace_ops(ops)
+
+    def resource_timelines(self) -> dict:
+        # copy of the bookings of each resource: resource_id -> (starts, ends), working minutes ordered by start
+        with self.lock:
+            return {resource_id: (list(starts), list(ends)) for resource_id, (starts, ends, _) in self.timelines.items()}
+
+    def booking_snapshot(self) -> dict:
+        """
+        Copy of the bookings of each resource, resource_id -> (starts, ends, entries) ordered by start, taken
+        under the lock so an export sees one version of the plan. The lists are copied (O(n) memory, three
+        references per booking, the (op_id, step) tuples are shared) and the phases without a resource, listed
+        under None, are collected and sorted; no rows or datetimes are built here.
+        """
+        with self.lock:
+            snapshot = {
+                resource_id: (list(starts), list(ends), list(entries))
+                for resource_id, (starts, ends, entries) in self.timelines.items()
+            }
+            free = sorted(
+                (start, end, (op_id, step))
+                for op_id, phases in self.placements.items()
+                for step, (_, resource_id, start, end) in enumerate(phases)
+                if resource_id is None
+            )
+        if free:
+            snapshot[None] = tuple(list(column) for column in zip(*free))
+        return snapshot
+
+    def plan(self) -> dict:
+        # rendered once per version, reads between edits reuse it
+        rendered = self._rendered
+        if rendered is not None and rendered[0] == self.version:
+            return rendered[1]
+        with self.lock:
+            version = self.version
+            jobs = [(op, list(self.placements.get(op_id, []))) for op_id, (op, _) in self.jobs.items()]
+            unscheduled = [{"opId": op_id, "reason": reason} for op_id, (_, reason) in self.unscheduled.items()]
+        plan = render_plan(jobs, self.calendar, self.start, unscheduled)
+        plan["templateId"] = self.template_id
+        self._rendered = (version, plan)
+        return plan
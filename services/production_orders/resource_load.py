@@ -0,0 +1,70 @@
+import numpy as np
+from datetime import datetime
+
+from shared.working_calendar import DAY, from_epoch_minutes, to_epoch_minutes
+
+# Load of the resources over time: booked vs available minutes per bucket (hour or day).
+# Everything is counted in working minutes of the template calendar, so a bucket edge e becomes
+# W(e) = working minutes before e, and:
+#   available[k]   = W(edge[k + 1]) - W(edge[k])              same for every resource (template calendar)
+#   booked[r][k]   = B_r(W(edge[k + 1])) - B_r(W(edge[k]))
+# where B_r(x) is the booked minutes of resource r before working minute x. The bookings of a resource are
+# disjoint and sorted by start, so B_r is a prefix sum of their lengths plus one searchsorted per edge.
+BUCKET_MINUTES = {"hour": 60, "day": DAY}
+
+
+def bucket_edges(start: datetime, end: datetime, bucket: str) -> list:
+    """
+    Edges (minutes since EPOCH) of the buckets covering [start, end): start floored and end rounded up
+    to the bucket size, days aligned to midnight.
+    """
+    size = BUCKET_MINUTES[bucket]
+    first = to_epoch_minutes(start) // size * size
+    last = -(-to_epoch_minutes(end) // size) * size
+    return list(range(first, max(last, first + size) + 1, size))
+
+
+def booked_before(starts: np.ndarray, ends: np.ndarray, points: np.ndarray) -> np.ndarray:
+    # B(x) for every x in points: lengths of the bookings before x, minus the part of the booking running at x
+    prefix = np.concatenate(([0], np.cumsum(ends - starts)))
+    j = np.searchsorted(starts, points, side="right")
+    running = np.where(j > 0, np.maximum(ends[np.maximum(j - 1, 0)] - points, 0), 0) if len(starts) else 0
+    return prefix[j] - running
+
+
+def resource_load(timelines: dict, calendar, start: datetime, end: datetime, bucket: str, resource_ids: list = None) -> dict:
+    """
+    Columnar load of the resources, one row per resource and one column per bucket.
+
+    Args:
+        timelines: resource_id -> (starts, ends) bookings in working minutes (Planner.resource_timelines).
+        calendar: WorkingCalendar of the plan.
+        start, end: Period of the report.
+        bucket: "hour" or "day".
+        resource_ids: Rows of the report, default the resources with bookings.
+
+    Returns:
+        {"bucket", "buckets": [bucket starts], "available": [minutes], "resources": [ids],
+         "booked": [[minutes per bucket] per resource], "utilization": [booked / available per resource]}
+    """
+    edges = bucket_edges(start, end, bucket)
+    points = np.asarray(calendar.to_workings(edges), dtype=np.int64)
+    available = np.diff(points)
+
+    resource_ids = list(resource_ids if resource_ids is not None else timelines)
+    booked = np.zeros((len(resource_ids), len(edges) - 1), dtype=np.int64)
+    for row, resource_id in enumerate(resource_ids):
+        starts, ends = timelines.get(resource_id, ((), ()))
+        if starts:
+            booked[row] = np.diff(booked_before(np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64), points))
+
+    total_available = int(available.sum())
+    utilization = booked.sum(axis=1) / total_available if total_available else np.zeros(len(resource_ids))
+    return {
+        "bucket": bucket,
+        "buckets": [from_epoch_minutes(edge) for edge in edges[:-1]],
+        "available": available.tolist(),
+        "resources": resource_ids,
+        "booked": booked.tolist(),
+        "utilization": np.round(utilization, 4).tolist(),
+    }
@@ -0,0 +1,337 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from google.cloud.firestore_v1 import FieldFilter
+from shared.config import db
+from shared.config import logger
+from shared.auth import get_current_user, require_main_role
+from shared.cache import TTLCache
+from shared.datastore import run_io
+from shared.hydration import iter_blocks
+from shared.selected_template import get_selected_template
+from shared.calendar_cache import get_working_calendar
+from shared.events import subscribe, verify_internal_api_key
+from shared.responses import json_response
+from shared.repository import blocks_collection, resources_collection, user_document
+
+from .scheduler import build_plan
+from .planner import Planner
+from .resource_load import BUCKET_MINUTES, resource_load
+from .export import EXPORT_FORMATS, export_plan
+
+schedule_router = APIRouter()
+
+# The current plan ("now") of each tenant/template lives in a Planner, built once and then repaired by the
+# change events of the write endpoints (POST /schedule/events or in-process). It is rebuilt from Firestore
+# after PLANNER_MAX_AGE seconds, or on POST /schedule, which also compacts the gaps left by the edits.
+# Plans for an explicit start are computed on demand and kept for SCHEDULE_CACHE_TTL seconds.
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", "1000"))
+SCHEDULE_CACHE_TTL = int(os.getenv("SCHEDULE_CACHE_TTL", "60"))
+PLANNER_MAX_AGE = int(os.getenv("PLANNER_MAX_AGE", "900"))
+PLANNER_MAX_TENANTS = int(os.getenv("PLANNER_MAX_TENANTS", "200"))
+LOAD_MAX_BUCKETS = int(os.getenv("LOAD_MAX_BUCKETS", "5000"))
+LOAD_DEFAULT_DAYS = {"hour": 7, "day": 90}
+
+schedule_cache = TTLCache("schedule_plans", maxsize=SCHEDULE_CACHE_SIZE, ttl=SCHEDULE_CACHE_TTL)
+
+_planners = {}  # mainUserId -> {templateId: Planner}
+_planners_lock = threading.Lock()
+
+
+def load_schedule_input(main_user_id: str, template_id: str):
+    """
+    Reads what the scheduler needs: the template, the ops of the template and the blocks with their phases.
+
+    Returns:
+        (template, ops, blocks) or (None, None, None) when the template does not exist.
+    """
+    user_ref = user_document(db, main_user_id)
+    template_doc = user_ref.collection('templates').document(template_id).get()
+    if not template_doc.exists:
+        return None, None, None
+
+    ops = []
+    ops_query = user_ref.collection('ops').where(filter=FieldFilter('templateId', '==', template_id))
+    for op_doc in ops_query.stream():
+        op_data = op_doc.to_dict()
+        op_data["id"] = op_doc.id
+        ops.append(op_data)
+
+    # phases only need the resource ids, the resource documents are not read
+    blocks = {block["id"]: block for block in iter_blocks(db, main_user_id, with_resources=False)}
+    return template_doc.to_dict(), ops, blocks
+
+
+def compute_plan(main_user_id: str, template_id: str, start: datetime) -> Optional[dict]:
+    template, ops, blocks = load_schedule_input(main_user_id, template_id)
+    if template is None:
+        return None
+    calendar = get_working_calendar(main_user_id, template_id, template, start)
+    plan = build_plan(ops, blocks, calendar, start)
+    plan["templateId"] = template_id
+    return plan
+
+
+async def resolve_template_id(template_id: Optional[str], current_user: dict) -> str:
+    if not template_id:
+        template_id = await get_selected_template(current_user)
+    if not template_id:
+        logger.error(f"User {current_user['uid']} has no template selected")
+        raise HTTPException(status_code=400, detail="No templateId provided")
+    return template_id
+
+
+def build_planner(main_user_id: str, template_id: str) -> Optional[Planner]:
+    template, ops, blocks = load_schedule_input(main_user_id, template_id)
+    if template is None:
+        return None
+    start = datetime.now().replace(second=0, microsecond=0)
+    calendar = get_working_calendar(main_user_id, template_id, template, start)
+    planner = Planner(template_id, calendar, start, blocks, ops)
+
+    with _planners_lock:
+        _planners.setdefault(main_user_id, {})[template_id] = planner
+        if len(_planners) > PLANNER_MAX_TENANTS:
+            # the tenant with the oldest plans is dropped, it is rebuilt on its next read
+            oldest = min(_planners, key=lambda user_id: max(p.built_at for p in _planners[user_id].values()))
+            _planners.pop(oldest, None)
+    logger.info("Planner built for %s/%s: %s ops", main_user_id, template_id, len(planner.jobs))
+    return planner
+
+
+def tenant_planners(main_user_id: str) -> list:
+    with _planners_lock:
+        return list(_planners.get(main_user_id, {}).values())
+
+
+def drop_planners(main_user_id: str) -> int:
+    # the plans of the tenant are rebuilt from Firestore on their next read
+    with _planners_lock:
+        return len(_planners.pop(main_user_id, {}))
+
+
+async def get_planner(main_user_id: str, template_id: str, rebuild: bool = False) -> Planner:
+    with _planners_lock:
+        planner = _planners.get(main_user_id, {}).get(template_id)
+    if rebuild or planner is None or time.monotonic() - planner.built_at > PLANNER_MAX_AGE:
+        planner = await run_io(build_planner, main_user_id, template_id)
+    if planner is None:
+        logger.error(f"Template {template_id} not found")
+        raise HTTPException(status_code=404, detail="Template not found")
+    return planner
+
+
+async def get_plan(main_user_id: str, template_id: str, start: Optional[datetime], refresh: bool = False) -> dict:
+    if start is None:
+        planner = await get_planner(main_user_id, template_id, rebuild=refresh)
+        return await run_io(planner.plan)
+
+    key = (main_user_id, template_id, start.isoformat())
+    plan = None if refresh else schedule_cache.get(key)
+    if plan is not None:
+        return plan
+
+    plan = await run_io(compute_plan, main_user_id, template_id, start)
+    if plan is None:
+        logger.error(f"Template {template_id} not found")
+        raise HTTPException(status_code=404, detail="Template not found")
+    schedule_cache.set(key, plan, tag=main_user_id)
+    logger.info("Schedule computed for %s/%s: %s ops", main_user_id, template_id, len(plan['ops']))
+    return plan
+
+
+def invalidate_schedule(main_user_id: str) -> None:
+    schedule_cache.invalidate_tag(main_user_id)
+
+
+def template_resource_ids(main_user_id: str, template_id: str) -> list:
+    # active resources of the template, ids only (rows of the load report, idle ones included)
+    resources_query = resources_collection(db, main_user_id).where(
+        filter=FieldFilter('templateId', '==', template_id)
+    ).select(["active"])
+    return sorted(doc.id for doc in resources_query.stream() if (doc.to_dict() or {}).get("active", True))
+
+
+def compute_load(main_user_id: str, planner: Planner, start: datetime, end: datetime, bucket: str) -> dict:
+    timelines = planner.resource_timelines()
+    resource_ids = template_resource_ids(main_user_id, planner.template_id)
+    known = set(resource_ids)
+    resource_ids += sorted(resource_id for resource_id in timelines if resource_id not in known)
+    load = resource_load(timelines, planner.calendar, start, end, bucket, resource_ids)
+    load.update({"templateId": planner.template_id, "from": start, "to": end})
+    return load
+
+
+def load_block(main_user_id: str, block_id: str):
+    # block with its phases (ids and resources), None when it was deleted
+    block_ref = blocks_collection(db, main_user_id).document(block_id)
+    block_doc = block_ref.get()
+    if not block_doc.exists:
+        return None
+    block = block_doc.to_dict()
+    block["id"] = block_id
+    block["phases"] = []
+    for phase_doc in block_ref.collection('phases').stream():
+        phase_data = phase_doc.to_dict()
+        phase_data["id"] = phase_doc.id
+        block["phases"].append(phase_data)
+    return block
+
+
+def handle_event(event: dict) -> dict:
+    """
+    Applies a change event (see shared/events.py) to the planners of the tenant.
+
+    Returns:
+        {"moved": number of OPs whose placement changed}
+    """
+    main_user_id = event["mainUserId"]
+    planners = tenant_planners(main_user_id)
+    invalidate_schedule(main_user_id)
+    moved = 0
+    if event["type"] == "op.upserted":
+        op = event["op"]
+        for planner in planners:
+            # the OP may also have left another template
+            if planner.template_id == op.get("templateId") or planner.has_op(op["id"]):
+                moved += planner.upsert_op(op)["moved"]
+    elif event["type"] == "op.deleted":
+        for planner in planners:
+            if planner.has_op(event["opId"]):
+                moved += planner.remove_op(event["opId"])["moved"]
+    elif event["type"] == "ops.imported":
+        # a bulk import can add thousands of OPs: one rebuild is cheaper than placing them one by one
+        dropped = drop_planners(main_user_id)
+        logger.info("Planners dropped for %s after a bulk import: %s", main_user_id, dropped)
+    elif event["type"] == "block.changed" and planners:
+        block = load_block(main_user_id, event["blockId"])
+        for planner in planners:
+            moved += planner.update_block(event["blockId"], block)["moved"]
+    else:
+        logger.debug("Event %s ignored for %s", event['type'], main_user_id)
+    return {"moved": moved}
+
+
+subscribe(handle_event)
+
+
+# Schedule of the active OPs of a template (selected template by default)
+@schedule_router.get("/schedule")
+async def get_schedule(
+    templateId: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Planning start, default now"),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        template_id = await resolve_template_id(templateId, current_user)
+        return json_response(await get_plan(current_user['mainUserId'], template_id, start))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Error computing schedule: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing schedule: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Streams the current plan, one row per scheduled phase ordered by start (csv, ndjson or a minimal xlsx)
+@schedule_router.get("/schedule/export")
+async def export_schedule(
+    templateId: Optional[str] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson|xlsx-lite)$"),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        main_user_id = current_user['mainUserId']
+        template_id = await resolve_template_id(templateId, current_user)
+        planner = await get_planner(main_user_id, template_id)
+        media_type, extension = EXPORT_FORMATS[format]
+        logger.info("Exporting schedule of %s/%s as %s", main_user_id, template_id, format)
+        return StreamingResponse(
+            export_plan(planner, format),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="schedule-{template_id}.{extension}"'},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting schedule: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Recomputes the schedule, ignoring the cached plan (main users only)
+@schedule_router.post("/schedule")
+async def run_schedule(
+    templateId: Optional[str] = None,
+    start: Optional[datetime] = Query(None, description="Planning start, default now"),
+    current_user: dict = Depends(require_main_role),
+):
+    try:
+        main_user_id = current_user['mainUserId']
+        template_id = await resolve_template_id(templateId, current_user)
+        invalidate_schedule(main_user_id)
+        return json_response(await get_plan(main_user_id, template_id, start, refresh=True))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Error computing schedule: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing schedule: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Change events of the write endpoints (internal, X-Internal-API-Key)
+@schedule_router.post("/schedule/events")
+async def schedule_event(event: dict = Body(...), api_key: str = Depends(verify_internal_api_key)):
+    try:
+        result = await run_io(handle_event, event)
+        logger.info("Event %s for %s: %s ops moved", event.get('type'), event.get('mainUserId'), result['moved'])
+        return result
+    except KeyError as e:
+        logger.error(f"Invalid event: missing {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid event: missing {str(e)}")
+    except Exception as e:
+        logger.error(f"Error applying event: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Booked vs available minutes of each resource per hour/day bucket, from the current plan (columnar payload)
+@schedule_router.get("/resources/load")
+async def get_resources_load(
+    templateId: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from", description="Period start, default plan start"),
+    end: Optional[datetime] = Query(None, alias="to", description="Period end, default 7 days (hour) or 90 days (day)"),
+    bucket: str = Query("day", pattern="^(hour|day)$"),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        main_user_id = current_user['mainUserId']
+        template_id = await resolve_template_id(templateId, current_user)
+        planner = await get_planner(main_user_id, template_id)
+
+        start = (start or planner.start).replace(tzinfo=None)
+        end = (end or start + timedelta(days=LOAD_DEFAULT_DAYS[bucket])).replace(tzinfo=None)
+        if end <= start:
+            logger.error(f"Invalid load period {start} - {end}")
+            raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+        if (end - start).total_seconds() / 60 / BUCKET_MINUTES[bucket] > LOAD_MAX_BUCKETS:
+            logger.error(f"Load period {start} - {end} has more than {LOAD_MAX_BUCKETS} {bucket}s")
+            raise HTTPException(status_code=400, detail=f"Too many buckets (max {LOAD_MAX_BUCKETS})")
+
+        load = await run_io(compute_load, main_user_id, planner, start, end, bucket)
+        logger.info("Resource load for %s/%s: %s resources x %s %ss", main_user_id, template_id, len(load['resources']), len(load['buckets']), bucket)
+        return json_response(load)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        logger.error(f"Error computing resource load: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing resource load: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,201 @@
+import heapq
+import math
+from datetime import datetime
+
+# Finite-capacity list scheduling of production orders (OPs).
+# Every OP is expanded into the phases of its block; each phase runs on its assigned resource and
+# starts after the previous phase of the same OP. Time is measured in working minutes of the template
+# calendar (WorkingCalendar), so shifts, weekends and holidays are skipped by construction and only
+# converted back to datetimes for the response.
+#
+# Dispatch: a heap of ready phases ordered by (ready time, priority desc, dateLimit, OP order). The phase
+# popped is placed at max(ready time, resource free time); then the next phase of its OP becomes ready.
+# Cost is O(P log P) for P phases.
+
+MINUTES_PER_UNIT = {0: 1, 1: 60}  # DurationType.min, DurationType.hours; days use the calendar day length
+DURATION_DAYS = 2
+
+STATUS_END = 3  # StatusTypeOP.end
+NO_DATE = float("inf")
+
+
+def phase_minutes(duration: float, duration_type: int, quantity: int, day_minutes: int) -> int:
+    """
+    Working minutes of a phase for an OP: duration in the block unit x quantity, rounded up.
+    """
+    unit = day_minutes if duration_type == DURATION_DAYS else MINUTES_PER_UNIT.get(duration_type, 1)
+    return int(math.ceil((duration or 0) * unit * max(quantity or 1, 1)))
+
+
+def is_schedulable(op: dict) -> bool:
+    return op.get("active", True) is not False and op.get("status", 0) != STATUS_END
+
+
+def _date_key(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp() if value.tzinfo else (value - datetime(1970, 1, 1)).total_seconds()
+    if isinstance(value, str) and value:
+        return _date_key(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    return NO_DATE
+
+
+def _block_id(op: dict):
+    block = op.get("block") or {}
+    return block.get("id") if isinstance(block, dict) else None
+
+
+def phase_order(phases: list) -> list:
+    # phases have no explicit sequence field, they run in the order they were created
+    return sorted(phases, key=lambda phase: (_date_key(phase.get("createdAt")), phase.get("id") or ""))
+
+
+def build_jobs(ops: list, blocks: dict, day_minutes: int):
+    """
+    Expands OPs into the phase sequences to schedule.
+
+    Args:
+        ops: OP documents (dicts with id, priority, dateLimit, quantity, block).
+        blocks: block_id -> block dict with "durationType" and its "phases" (with "resources"); phases run in
+            creation order (createdAt, id).
+        day_minutes: Working minutes of one working day (unit of DurationType.days).
+
+    Returns:
+        (jobs, unscheduled): jobs is a list of (op, [(phase_id, resource_id, minutes), ...]),
+        unscheduled a list of {"opId", "reason"}.
+    """
+    jobs = []
+    unscheduled = []
+    tasks_by_block = {}
+    for op in ops:
+        if not is_schedulable(op):
+            continue
+        block_id = _block_id(op)
+        block = blocks.get(block_id)
+        if block is None:
+            unscheduled.append({"opId": op.get("id"), "reason": "block not found"})
+            continue
+        if not block.get("phases"):
+            unscheduled.append({"opId": op.get("id"), "reason": "block without phases"})
+            continue
+
+        quantity = op.get("quantity") or 1
+        key = (block_id, quantity)
+        tasks = tasks_by_block.get(key)
+        if tasks is None:
+            duration_type = int(block.get("durationType", 0))
+            tasks = [
+                (
+                    phase["id"],
+                    (phase.get("resources") or [None])[0],
+                    phase_minutes(phase.get("duration"), duration_type, quantity, day_minutes),
+                )
+                for phase in phase_order(block["phases"])
+            ]
+            tasks_by_block[key] = tasks
+        jobs.append((op, tasks))
+    return jobs, unscheduled
+
+
+def schedule(jobs: list, release: int = 0, resource_free: dict = None, resume: list = None) -> list:
+    """
+    Places every phase of every job.
+
+    Args:
+        jobs: Output of build_jobs.
+        release: Working minute from which the phases can start.
+        resource_free: resource_id -> first free working minute (resources already busy), optional.
+        resume: Optional (step, ready) per job: the phases before `step` are already placed and the
+            phase `step` can start at `ready` (incremental rescheduling).
+
+    Returns:
+        One list per job with (phase_id, resource_id, start, end) in working minutes, from its first step.
+    """
+    free = dict(resource_free or {})
+    tasks = [job_tasks for _, job_tasks in jobs]
+    placed = [[] for _ in jobs]
+    resume = resume or [(0, release)] * len(jobs)
+
+    heap = [
+        (ready, -(op.get("priority") or 0), _date_key(op.get("dateLimit")), index, step)
+        for index, ((op, job_tasks), (step, ready)) in enumerate(zip(jobs, resume))
+        if step < len(job_tasks)
+    ]
+    heapq.heapify(heap)
+    pop, push = heapq.heappop, heapq.heappush
+
+    while heap:
+        ready, priority, due, index, step = pop(heap)
+        job_tasks = tasks[index]
+        phase_id, resource_id, minutes = job_tasks[step]
+        if resource_id is None:
+            start = ready  # phase without resource: no capacity limit
+        else:
+            start = max(ready, free.get(resource_id, release))
+            free[resource_id] = start + minutes
+        end = start + minutes
+        placed[index].append((phase_id, resource_id, start, end))
+        if step + 1 < len(job_tasks):
+            push(heap, (end, priority, due, index, step + 1))
+
+    return placed
+
+
+def render_plan(jobs, calendar, start: datetime, unscheduled: list) -> dict:
+    """
+    Converts placements to the plan response (datetimes, late flag).
+
+    Args:
+        jobs: Iterable of (op, placements) with placements as returned by schedule.
+        calendar: WorkingCalendar used to place the phases.
+        start: Planning start.
+        unscheduled: OPs that could not be scheduled ({"opId", "reason"}).
+    """
+    jobs = [(op, phases) for op, phases in jobs if phases]
+    starts = calendar.to_datetimes(start for _, phases in jobs for _, _, start, _ in phases)
+    ends = calendar.to_datetimes((end for _, phases in jobs for _, _, _, end in phases), end=True)
+
+    plan_ops = []
+    for op, phases in jobs:
+        op_end = ends[phases[-1][3]]
+        date_limit = op.get("dateLimit")
+        plan_ops.append({
+            "opId": op.get("id"),
+            "code": op.get("code"),
+            "blockId": _block_id(op),
+            "priority": op.get("priority"),
+            "dateLimit": date_limit,
+            "start": starts[phases[0][2]],
+            "end": op_end,
+            "late": _date_key(date_limit) < _date_key(op_end),
+            "phases": [
+                {
+                    "phaseId": phase_id,
+                    "resourceId": resource_id,
+                    "start": starts[phase_start],
+                    "end": ends[phase_end],
+                }
+                for phase_id, resource_id, phase_start, phase_end in phases
+            ],
+        })
+
+    return {"start": start, "ops": plan_ops, "unscheduled": unscheduled}
+
+
+def build_plan(ops: list, blocks: dict, calendar, start: datetime) -> dict:
+    """
+    Schedules the OPs on the calendar and returns the plan with datetimes.
+
+    Args:
+        ops: OP documents.
+        blocks: block_id -> block dict with its phases.
+        calendar: WorkingCalendar compiled from the template, starting at or before `start`.
+        start: Planning start.
+
+    Returns:
+        {"start", "ops": [...], "unscheduled": [...]} where each op has start/end/late and its phases.
+    """
+    jobs, unscheduled = build_jobs(ops, blocks, calendar.day_minutes)
+    release = calendar.to_working(start)
+    placed = schedule(jobs, release)
+
+    return render_plan(((op, phases) for (op, _), phases in zip(jobs, placed)), calendar, start, unscheduled)
@@ -1,21 +1,76 @@
 # shared/auth.py
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from firebase_admin import auth as fb_auth
 import jwt
 import requests
-from .config import logger
+import hashlib
+import os
+import time
+from firebase_admin.auth import InvalidIdTokenError, ExpiredIdTokenError, RevokedIdTokenError
+from .config import STORAGE_BACKEND, fb_auth, logger
+from .cache import TTLCache
+from .logs import bind_log_context
+from .metrics import timed
 from datetime import datetime
 
 # login auth
 
+# Verified tokens are cached so check_revoked (one user record fetch per call) does not run on every request.
+# An entry lives until the token expires or until TOKEN_REVOCATION_CHECK_SECONDS, whichever comes first,
+# so a revoked token is accepted for at most that interval in a process that did not revoke it.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_REVOCATION_CHECK_SECONDS = int(os.getenv("TOKEN_REVOCATION_CHECK_SECONDS", "300"))
+
+token_cache = TTLCache("id_tokens", maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_REVOCATION_CHECK_SECONDS)
+
+# AUTH_VERIFIER=stub accepts unsigned JWTs with the uid/role/mainUserId claims, for load tests against the
+# in-memory storage (benchmarks/loadtest). Refused with the Firestore backend so it can't reach real data.
+AUTH_VERIFIER = os.getenv("AUTH_VERIFIER", "firebase").lower()
+if AUTH_VERIFIER == "stub" and STORAGE_BACKEND != "memory":
+    raise RuntimeError("AUTH_VERIFIER=stub requires STORAGE_BACKEND=memory")
+
+def _token_key(token: str) -> str:
+    # never keep the raw token as key
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def evict_user_tokens(uid: str) -> int:
+    # call after revoke_refresh_tokens / delete_user so the next request verifies again
+    return token_cache.invalidate_tag(uid)
+
+def verify_token(token: str) -> dict:
+    key = _token_key(token)
+    decoded_token = token_cache.get(key)
+    if decoded_token is not None:
+        return decoded_token
+
+    if AUTH_VERIFIER == "stub":
+        decoded_token = verify_stub_token(token)
+    else:
+        decoded_token = fb_auth.verify_id_token(token, clock_skew_seconds=60, check_revoked=True)
+
+    ttl = min(decoded_token.get('exp', 0) - time.time(), TOKEN_REVOCATION_CHECK_SECONDS)
+    token_cache.set(key, decoded_token, ttl=ttl, tag=decoded_token['uid'])
+    return decoded_token
+
+def verify_stub_token(token: str) -> dict:
+    try:
+        decoded_token = jwt.decode(token, options={"verify_signature": False, "verify_exp": True})
+    except jwt.ExpiredSignatureError as e:
+        raise ExpiredIdTokenError(str(e), e)
+    except jwt.InvalidTokenError as e:
+        raise InvalidIdTokenError(str(e), e)
+    if not decoded_token.get('uid'):
+        raise InvalidIdTokenError("Stub token without uid")
+    return decoded_token
+
 security = HTTPBearer()
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        logger.info(f"[{datetime.now()}] Verifying token")
+        logger.debug("Verifying token")
 
         #decoded_token = fb_auth.verify_id_token(credentials.credentials, check_revoked=True)
-        decoded_token = fb_auth.verify_id_token(credentials.credentials, clock_skew_seconds=60, check_revoked=True)
+        with timed("auth"):
+            decoded_token = verify_token(credentials.credentials)
         
         # Get token timestamps for debug
         # temp_decode = jwt.decode(credentials.credentials, options={"verify_signature": False})
@@ -23,10 +78,12 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         # now = int(datetime.now().timestamp())
         # skew = abs(now - iat)        
      
-        logger.info(f"Token decoded: {decoded_token}")
+        # the decoded token (claims, email) is never logged
         user_id = decoded_token['uid']
         role = decoded_token.get('role', 'child')
         main_user_id = decoded_token.get('mainUserId', user_id)
+        bind_log_context(tenant=main_user_id, uid=user_id)
+        logger.debug("Token verified for uid %s (role: %s)", user_id, role)
         
         return {'uid': user_id, 'role': role, 'mainUserId': main_user_id}
 
@@ -54,13 +111,13 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         # }
 
         
-    except fb_auth.InvalidIdTokenError as e:
+    except InvalidIdTokenError as e:
         logger.error(f"Invalid token: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid token")
-    except fb_auth.ExpiredIdTokenError as e:
+    except ExpiredIdTokenError as e:
         logger.error(f"Expired token: {str(e)}")
         raise HTTPException(status_code=401, detail="Token expired")
-    except fb_auth.RevokedIdTokenError as e:
+    except RevokedIdTokenError as e:
         logger.error(f"Revoked token: {str(e)}")
         raise HTTPException(status_code=401, detail="Token revoked")
     except Exception as e:
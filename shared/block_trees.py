@@ -0,0 +1,245 @@
+# shared/block_trees.py
+import argparse
+import os
+from firebase_admin import firestore
+from google.cloud.firestore_v1 import FieldFilter
+
+from .hydration import iter_blocks
+from .repository import user_document
+from .versions import versioned_batch
+
+# Materialized block trees: one denormalized document per block, users/{main}/blockTrees/{block_id}:
+#   {"block": {block fields}, "phases": {phase_id: {phase fields, "resource": {first resource}}},
+#    "resourceIds": [resources embedded], "updatedAt"}
+# Every write that changes a block, a phase or a resource updates the tree in the same batch or
+# transaction, so with BLOCK_TREES_READ=true the catalog reads (GET /blocks/full, GET /blocks/{id}/phases)
+# are one query or one document read instead of the block -> phases -> resources hydration.
+# Trees of existing data are created with the rebuild command, run it before enabling the reads:
+#   python -m shared.block_trees check <mainUserId>...    (or --all)
+#   python -m shared.block_trees rebuild <mainUserId>...
+BLOCK_TREES_READ = os.getenv("BLOCK_TREES_READ", "false").lower() == "true"
+REBUILD_BATCH_SIZE = 400
+IGNORED_FIELDS = ("createdAt", "updatedAt")  # write timestamps, not compared by the consistency check
+
+
+def tree_ref(db, main_user_id: str, block_id: str):
+    return user_document(db, main_user_id).collection('blockTrees').document(block_id)
+
+
+def tree_document(block: dict) -> dict:
+    # tree of a hydrated block (iter_blocks shape)
+    phases = {}
+    resource_ids = set()
+    for phase in block.get("phases") or []:
+        phase_data = {key: value for key, value in phase.items() if key != "id"}
+        phases[phase["id"]] = phase_data
+        if phase_data.get("resource"):
+            resource_ids.add(phase_data["resource"]["id"])
+    return {
+        "block": {key: value for key, value in block.items() if key not in ("id", "phases", "totalDuration")},
+        "phases": phases,
+        "resourceIds": sorted(resource_ids),
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def is_complete(tree: dict) -> bool:
+    # a phase write on a block without a tree yet creates a partial tree (no "block"), rebuild fixes it
+    return bool(tree) and "block" in tree
+
+
+def block_from_tree(block_id: str, tree: dict) -> dict:
+    """
+    Hydrated block (same shape as iter_blocks) from a tree document, phases in id order.
+    """
+    block = dict(tree.get("block") or {})
+    block["id"] = block_id
+    block["phases"] = [
+        {**phase, "id": phase_id} for phase_id, phase in sorted((tree.get("phases") or {}).items())
+    ]
+    return block
+
+
+def iter_block_trees(db, main_user_id: str):
+    # every block of the main user with one query
+    trees = user_document(db, main_user_id).collection('blockTrees').stream()
+    for tree_doc in trees:
+        tree = tree_doc.to_dict()
+        if is_complete(tree):
+            yield block_from_tree(tree_doc.id, tree)
+
+
+def iter_catalog(db, main_user_id: str, chunk_size: int = 100):
+    # blocks of GET /blocks/full, from the trees when enabled
+    if BLOCK_TREES_READ:
+        return iter_block_trees(db, main_user_id)
+    return iter_blocks(db, main_user_id, chunk_size=chunk_size)
+
+
+def catalog_blocks(db, main_user_id: str) -> list:
+    return list(iter_catalog(db, main_user_id, chunk_size=0))
+
+
+# Writes. `writer` is a WriteBatch or a Transaction of the endpoint, so the tree changes with the documents.
+# Phase writes use set(merge=...) because the tree may not exist yet for data created before the trees.
+
+def write_tree_block(writer, db, main_user_id: str, block_id: str, block_data: dict, create: bool = False) -> None:
+    ref = tree_ref(db, main_user_id, block_id)
+    if create:
+        writer.set(ref, {"block": block_data, "phases": {}, "resourceIds": [], "updatedAt": firestore.SERVER_TIMESTAMP})
+    else:
+        writer.set(ref, {"block": block_data, "updatedAt": firestore.SERVER_TIMESTAMP}, merge=True)
+
+
+def write_tree_phase(writer, db, main_user_id: str, block_id: str, phase_id: str, phase_data: dict) -> None:
+    # phase fields merged into the tree (create and update)
+    writer.set(
+        tree_ref(db, main_user_id, block_id),
+        {"phases": {phase_id: phase_data}, "updatedAt": firestore.SERVER_TIMESTAMP},
+        merge=True,
+    )
+
+
+def write_tree_phase_resource(writer, db, main_user_id: str, block_id: str, phase_id: str, resource: dict) -> None:
+    # the resource of the phase is replaced as a whole
+    writer.set(
+        tree_ref(db, main_user_id, block_id),
+        {
+            "phases": {phase_id: {"resources": [resource["id"]], "resource": resource, "updatedAt": firestore.SERVER_TIMESTAMP}},
+            "resourceIds": firestore.ArrayUnion([resource["id"]]),
+            "updatedAt": firestore.SERVER_TIMESTAMP,
+        },
+        merge=[
+            f"phases.{phase_id}.resources",
+            f"phases.{phase_id}.resource",
+            f"phases.{phase_id}.updatedAt",
+            "resourceIds",
+            "updatedAt",
+        ],
+    )
+
+
+def delete_tree_phase(writer, db, main_user_id: str, block_id: str, phase_id: str) -> None:
+    writer.set(
+        tree_ref(db, main_user_id, block_id),
+        {"phases": {phase_id: firestore.DELETE_FIELD}, "updatedAt": firestore.SERVER_TIMESTAMP},
+        merge=True,
+    )
+
+
+def update_resource_in_trees(transaction, db, main_user_id: str, resource_id: str, resource) -> int:
+    """
+    Replaces (resource dict) or removes (None) the embedded resource in every tree that uses it.
+    Reads the trees inside the transaction, call it before the transaction writes.
+
+    Returns:
+        Number of trees updated.
+    """
+    query = user_document(db, main_user_id).collection('blockTrees').where(
+        filter=FieldFilter('resourceIds', 'array_contains', resource_id)
+    )
+    tree_docs = list(transaction.get(query))
+    for tree_doc in tree_docs:
+        update = {"updatedAt": firestore.SERVER_TIMESTAMP}
+        for phase_id, phase in (tree_doc.to_dict().get("phases") or {}).items():
+            if (phase.get("resource") or {}).get("id") == resource_id:
+                update[f"phases.{phase_id}.resource"] = resource if resource is not None else firestore.DELETE_FIELD
+        if resource is None:
+            update["resourceIds"] = firestore.ArrayRemove([resource_id])
+        transaction.update(tree_doc.reference, update)
+    return len(tree_docs)
+
+
+# Consistency check and rebuild
+
+def _comparable(value):
+    if isinstance(value, dict):
+        return {key: _comparable(item) for key, item in value.items() if key not in IGNORED_FIELDS}
+    if isinstance(value, list):
+        return [_comparable(item) for item in value]
+    return value
+
+
+def check_block_trees(db, main_user_id: str) -> dict:
+    """
+    Compares the trees with the hydrated blocks.
+
+    Returns:
+        {"blocks": n, "missing": [block ids], "stale": [block ids], "orphan": [tree ids]}
+    """
+    blocks = {block["id"]: block for block in iter_blocks(db, main_user_id, chunk_size=0)}
+    trees = {
+        tree_doc.id: tree_doc.to_dict()
+        for tree_doc in user_document(db, main_user_id).collection('blockTrees').stream()
+    }
+    report = {"blocks": len(blocks), "missing": [], "stale": [], "orphan": sorted(set(trees) - set(blocks))}
+    for block_id, block in blocks.items():
+        tree = trees.get(block_id)
+        if not is_complete(tree):
+            report["missing"].append(block_id)
+        elif _comparable(block_from_tree(block_id, tree)) != _comparable(block):
+            report["stale"].append(block_id)
+    return report
+
+
+def rebuild_block_trees(db, main_user_id: str, only_invalid: bool = True) -> dict:
+    """
+    Writes the trees of the main user from the hydrated blocks and deletes the orphan trees.
+
+    Args:
+        only_invalid: Rewrites only the missing/stale trees found by the check, False rewrites all.
+    """
+    report = check_block_trees(db, main_user_id)
+    rewrite = set(report["missing"] + report["stale"]) if only_invalid else None
+
+    # GET /blocks/full reads the trees, the clients copies are invalidated
+    batch = versioned_batch(db, main_user_id, "blocks")
+    count = 0
+    for block in iter_blocks(db, main_user_id, chunk_size=0):
+        if rewrite is not None and block["id"] not in rewrite:
+            continue
+        batch.set(tree_ref(db, main_user_id, block["id"]), tree_document(block))
+        count += 1
+        if count % REBUILD_BATCH_SIZE == 0:
+            batch.commit()
+            batch = versioned_batch(db, main_user_id, "blocks")
+    for block_id in report["orphan"]:
+        batch.delete(tree_ref(db, main_user_id, block_id))
+        count += 1
+        if count % REBUILD_BATCH_SIZE == 0:
+            batch.commit()
+            batch = versioned_batch(db, main_user_id, "blocks")
+    if count % REBUILD_BATCH_SIZE or not count:
+        batch.commit()
+    report["written"] = count - len(report["orphan"])
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the materialized block trees")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("users", nargs="*", help="mainUserId of the tenants")
+    parser.add_argument("--all", action="store_true", help="every user document")
+    parser.add_argument("--full", action="store_true", help="rebuild every tree, not only the invalid ones")
+    args = parser.parse_args()
+
+    from .config import db
+
+    users = [user_ref.id for user_ref in db.collection('users').list_documents()] if args.all else args.users
+    failed = False
+    for user_id in users:
+        if args.command == "check":
+            report = check_block_trees(db, user_id)
+            failed = failed or bool(report["missing"] or report["stale"] or report["orphan"])
+        else:
+            report = rebuild_block_trees(db, user_id, only_invalid=not args.full)
+        print(
+            f"{user_id}: blocks={report['blocks']} missing={len(report['missing'])} "
+            f"stale={len(report['stale'])} orphan={len(report['orphan'])}"
+            + (f" written={report['written']}" if "written" in report else "")
+        )
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# shared/calendar_cache.py
+import os
+from datetime import datetime, timedelta
+from .cache import TTLCache
+from .working_calendar import WorkingCalendar, calendar_fingerprint
+
+# Compiled WorkingCalendar per template, (mainUserId, templateId) -> {"version", "calendar"}.
+# The version is the template's calendar fingerprint (shifts, week, holidays): a cached calendar is
+# reused only while the template document read by the caller still compiles to the same thing, so
+# other processes see an update_template right away. The calendar starts CALENDAR_PAST_DAYS before
+# today and is rebuilt when the day rolls over (rolling horizon); later days are compiled on demand.
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", "1000"))
+CALENDAR_CACHE_TTL = int(os.getenv("CALENDAR_CACHE_TTL", "3600"))
+CALENDAR_PAST_DAYS = int(os.getenv("CALENDAR_PAST_DAYS", "30"))
+CALENDAR_HORIZON_DAYS = int(os.getenv("CALENDAR_HORIZON_DAYS", "400"))
+
+calendar_cache = TTLCache("working_calendars", maxsize=CALENDAR_CACHE_SIZE, ttl=CALENDAR_CACHE_TTL)
+
+
+def get_working_calendar(main_user_id: str, template_id: str, template: dict, start: datetime = None) -> WorkingCalendar:
+    """
+    Returns the compiled calendar of a template, from the cache when the template did not change.
+
+    Args:
+        main_user_id: The main user ID that owns the template.
+        template_id: The template ID.
+        template: Current template document (shifts, weekStart, weekEnd, holidays).
+        start: Earliest instant the caller needs; a calendar starting before it is compiled when it is
+            older than the cached window (not cached).
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    origin = today - timedelta(days=CALENDAR_PAST_DAYS)
+    if start is not None and start.replace(tzinfo=None) < origin:
+        return WorkingCalendar(template, start)
+
+    key = (main_user_id, template_id)
+    version = (calendar_fingerprint(template), origin)
+    entry = calendar_cache.get(key)
+    if entry is not None and entry["version"] == version:
+        return entry["calendar"]
+
+    calendar = WorkingCalendar(template, origin, days=CALENDAR_PAST_DAYS + CALENDAR_HORIZON_DAYS)
+    calendar_cache.set(key, {"version": version, "calendar": calendar}, tag=main_user_id)
+    return calendar
+
+
+def invalidate_working_calendar(main_user_id: str, template_id: str) -> None:
+    calendar_cache.invalidate((main_user_id, template_id))
@@ -4,24 +4,125 @@ from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
 import logging
+import threading
+import time
+
+from .logs import configure_logging
+from .metrics import instrument_client
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Firebase Initialization
-cred = credentials.Certificate(os.getenv("FIREBASE_CREDENTIALS_PATH"))
-firebase_admin.initialize_app(cred)
+# The app and the Firestore client are created per process on first use, not at import: importing the routers
+# opens no gRPC channel, so uvicorn/gunicorn can fork workers safely and the import is fast. The service
+# lifespan (shared/lifecycle.py) initializes them and warms the channel with one read before the service is ready.
+# A process forked after the initialization creates its own app and client (the parent's gRPC channel is not
+# usable in the child).
+FIREBASE_WARMUP = os.getenv("FIREBASE_WARMUP", "true").lower() == "true"
+FIREBASE_WARMUP_TIMEOUT = float(os.getenv("FIREBASE_WARMUP_TIMEOUT", "10"))
+
+# Storage backend of `db`: "firestore", or "memory" for profiling and load tests without credentials
+# (shared/memory_store.py, data lost at exit, one store per process). MEMORY_LATENCY adds seconds per RPC,
+# MEMORY_SEED_FILE loads a JSON {document path: data} at startup. Firebase Auth stays the real one.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+MEMORY_LATENCY = float(os.getenv("MEMORY_LATENCY", "0"))
+MEMORY_SEED_FILE = os.getenv("MEMORY_SEED_FILE")
+
+
+class FirebaseProvider:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._app = None
+        self._db = None
+        self.timings = {}
+
+    def _initialize_app(self):
+        cred = credentials.Certificate(os.getenv("FIREBASE_CREDENTIALS_PATH"))
+        self._app = firebase_admin.initialize_app(cred)
+
+    def _ensure(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            started = time.perf_counter()
+            if self._app is not None:
+                # forked child: drop the app inherited from the parent
+                firebase_admin.delete_app(self._app)
+                self._app = None
+            if STORAGE_BACKEND == "memory":
+                self._db = self._memory_store()
+            else:
+                self._initialize_app()
+                self._db = firestore.client(self._app)
+                instrument_client(self._db)
+            self._pid = pid
+            self.timings["initSeconds"] = round(time.perf_counter() - started, 4)
+            logger.info("%s storage initialized in process %s in %ss", STORAGE_BACKEND, pid, self.timings['initSeconds'])
+
+    def _memory_store(self):
+        from .memory_store import MemoryFirestore
+
+        if self._db is not None:
+            # forked child: keeps a copy of the parent's data with a new lock
+            self._db._lock = threading.RLock()
+            return self._db
+        store = MemoryFirestore(latency=MEMORY_LATENCY)
+        if MEMORY_SEED_FILE:
+            logger.info("Memory store seeded with %s documents", store.load_file(MEMORY_SEED_FILE))
+        return store
+
+    def client(self):
+        self._ensure()
+        return self._db
+
+    def auth(self):
+        # firebase_admin.auth functions use the default app
+        self._ensure()
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._initialize_app()
+        return auth
+
+    def warm_up(self) -> None:
+        """
+        Opens the gRPC channel with a single document read (the document does not need to exist).
+        """
+        started = time.perf_counter()
+        self.client().collection('meta').document('warmup').get(timeout=FIREBASE_WARMUP_TIMEOUT)
+        self.timings["warmupSeconds"] = round(time.perf_counter() - started, 4)
+        logger.info("Firestore channel warmed up in %ss", self.timings['warmupSeconds'])
+
+
+class _Lazy:
+    # module level name (db, fb_auth) resolved on every attribute access
+    def __init__(self, resolve):
+        object.__setattr__(self, "_resolve", resolve)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __repr__(self):
+        return f"<lazy {self._resolve.__name__}>"
+
+
+firebase = FirebaseProvider()
 #client for firestore
-db = firestore.client()
+db = _Lazy(firebase.client)
 # Firebase Authentication
-fb_auth = auth
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+fb_auth = _Lazy(firebase.auth)
 
 # Run this locally to delete a user and all their data
 
 def delete_user_and_data(user_id: str):
     try:
         # Delete user from Firebase Authentication
-        auth.delete_user(user_id)
+        fb_auth.delete_user(user_id)
         print(f"Deleted user {user_id} from Firebase Authentication")
 
         # Delete Firestore data
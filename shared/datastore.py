@@ -0,0 +1,46 @@
+# shared/datastore.py
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import timed
+
+# Non-blocking access to Firestore and Firebase Auth for async handlers.
+# The firebase_admin clients are synchronous, every call is sent to a bounded thread pool
+# so the uvicorn event loop keeps serving other requests while the RPC is in flight.
+
+DATASTORE_MAX_WORKERS = int(os.getenv("DATASTORE_MAX_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=DATASTORE_MAX_WORKERS, thread_name_prefix="datastore")
+
+
+async def run_io(fn, *args, **kwargs):
+    """
+    Runs a blocking call (Firestore .get(), .set(), .add(), batch.commit(), fb_auth.*) in the datastore pool.
+
+    Example:
+        block_doc = await run_io(block_ref.get)
+    """
+    loop = asyncio.get_running_loop()
+    # the call runs in the request context so the client records its RPCs in the request metrics
+    context = contextvars.copy_context()
+    with timed("datastore"):
+        return await loop.run_in_executor(_executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def gather_io(*calls):
+    """
+    Runs independent blocking calls concurrently and returns their results in order.
+    Each call is a callable without arguments (use functools.partial or a lambda to bind them).
+
+    Example:
+        block_doc, phase_doc = await gather_io(block_ref.get, phase_ref.get)
+    """
+    return await asyncio.gather(*(run_io(call) for call in calls))
+
+
+async def stream_io(query) -> list:
+    # .stream() is a blocking generator, consume it entirely inside the pool
+    return await run_io(lambda: list(query.stream()))
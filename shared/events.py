@@ -0,0 +1,75 @@
+# shared/events.py
+import os
+import requests
+from typing import Optional
+from fastapi import Depends, HTTPException
+from fastapi.security import APIKeyHeader
+from .config import logger
+from .datastore import run_io
+from .responses import dumps
+
+# Change events sent by the write endpoints to the planner (production_orders), so the schedule is
+# repaired incrementally instead of recomputed:
+#   {"type": "op.upserted", "mainUserId", "op": {...}}      OP created or updated (document with "id")
+#   {"type": "op.deleted", "mainUserId", "opId"}
+#   {"type": "block.changed", "mainUserId", "blockId"}     block or one of its phases changed / deleted
+#   {"type": "ops.imported", "mainUserId"}                 POST /ops/bulk created OPs, the plans are rebuilt
+# When the planner runs in the same process its handlers are called directly, otherwise the event is
+# posted to PLANNER_EVENTS_URL. The write endpoints publish from BackgroundTasks, after the response is sent,
+# so a slow or unreachable planner never delays a write.
+PLANNER_EVENTS_URL = os.getenv("PLANNER_EVENTS_URL")  # ex: http://production_orders:8003/schedule/events
+INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
+EVENTS_TIMEOUT = float(os.getenv("EVENTS_TIMEOUT", "2"))
+
+_subscribers = []
+
+internal_api_key = APIKeyHeader(name="X-Internal-API-Key")
+
+
+def subscribe(handler) -> None:
+    """
+    Registers a handler (blocking function event -> dict) for the events published in this process.
+    """
+    _subscribers.append(handler)
+
+
+async def publish(event: dict) -> Optional[dict]:
+    """
+    Delivers an event to the planner.
+
+    Returns:
+        The planner answer (ex: {"moved": 3}), or None when there is no planner or it could not be reached.
+    """
+    try:
+        if _subscribers:
+            results = [await run_io(handler, event) for handler in _subscribers]
+            return results[0]
+        if not PLANNER_EVENTS_URL:
+            return None
+        response = await run_io(
+            requests.post,
+            PLANNER_EVENTS_URL,
+            data=dumps(event),
+            headers={"Content-Type": "application/json", "X-Internal-API-Key": INTERNAL_API_KEY or ""},
+            timeout=EVENTS_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        # the write already happened, the planner catches up on its next rebuild
+        logger.warning("Event %s not delivered to the planner: %s", event.get('type'), str(e))
+        return None
+
+
+def op_event(main_user_id: str, op_id: str, op_data: dict) -> dict:
+    # op.upserted event of a written OP (server timestamps are write sentinels, not values)
+    op = {key: value for key, value in op_data.items() if key not in ("createdAt", "updatedAt")}
+    op["id"] = op_id
+    return {"type": "op.upserted", "mainUserId": main_user_id, "op": op}
+
+
+def verify_internal_api_key(api_key: str = Depends(internal_api_key)):
+    if not INTERNAL_API_KEY or api_key != INTERNAL_API_KEY:
+        logger.error("Invalid or missing internal API key")
+        raise HTTPException(status_code=403, detail="Invalid internal API key")
+    return api_key
@@ -0,0 +1,113 @@
+# shared/hydration.py
+from google.cloud.firestore_v1 import FieldFilter
+from .repository import resources_collection, user_document
+
+# Hydration of the block -> phases -> resource tree used by GET /blocks/full.
+# The tree is built with a fixed number of round-trips regardless of the tenant size:
+#   1. one query for the blocks of the main user
+#   2. one collection group query for every phase of the main user
+#   3. one multi-get (db.get_all) for the distinct resources referenced by the phases (per chunk when streaming)
+# Both queries return documents ordered by path, so phases arrive grouped by block in the same
+# order as the blocks and the two streams are merged without holding all phases in memory.
+
+def hydrate_blocks(db, main_user_id: str) -> list:
+    """
+    Builds the full block list (blocks with their phases and the first resource of each phase).
+
+    Args:
+        db: Firestore client.
+        main_user_id: The main user ID (tenant) that owns the blocks.
+
+    Returns:
+        A list of block dicts with the same shape returned by GET /blocks/full.
+    """
+    return list(iter_blocks(db, main_user_id, chunk_size=0))
+
+
+def iter_blocks(db, main_user_id: str, chunk_size: int = 100, with_resources: bool = True):
+    """
+    Yields the hydrated blocks one by one (used by the NDJSON mode of GET /blocks/full).
+
+    Args:
+        db: Firestore client.
+        main_user_id: The main user ID (tenant) that owns the blocks.
+        chunk_size: Blocks resolved per resource multi-get, 0 resolves every block at once.
+        with_resources: False skips the resource multi-get (phases keep only their "resources" ids).
+    """
+    user_ref = user_document(db, main_user_id)
+    block_docs = user_ref.collection("blocks").stream()
+
+    # all phases of the main user, phases live in users/{main}/blocks/{block}/phases
+    phase_docs = db.collection_group("phases").where(
+        filter=FieldFilter('mainUserId', '==', main_user_id)
+    ).stream()
+    phase_doc = next(phase_docs, None)
+
+    chunk = []
+    for block_doc in block_docs:
+        block_data = block_doc.to_dict()
+        block_data["id"] = block_doc.id
+        block_data["phases"] = []
+
+        while phase_doc is not None:
+            block_ref = phase_doc.reference.parent.parent
+            # legacy top-level phases and phases of deleted blocks are skipped
+            if block_ref is None or block_ref.id < block_doc.id:
+                phase_doc = next(phase_docs, None)
+                continue
+            if block_ref.id > block_doc.id:
+                break
+            phase_data = phase_doc.to_dict()
+            phase_data["id"] = phase_doc.id
+            block_data["phases"].append(phase_data)
+            phase_doc = next(phase_docs, None)
+
+        if not with_resources:
+            yield block_data
+            continue
+        chunk.append(block_data)
+        if chunk_size and len(chunk) >= chunk_size:
+            yield from _attach_resources(db, main_user_id, chunk)
+            chunk = []
+
+    if chunk:
+        yield from _attach_resources(db, main_user_id, chunk)
+
+
+def _attach_resources(db, main_user_id: str, blocks: list) -> list:
+    # first resource of each phase, resolved with one multi-get for the whole chunk
+    resource_ids = {
+        phase_data["resources"][0]
+        for block_data in blocks
+        for phase_data in block_data["phases"]
+        if phase_data.get("resources") and len(phase_data["resources"]) > 0
+    }
+    resources = get_resources_by_id(db, main_user_id, resource_ids)
+
+    for block_data in blocks:
+        for phase_data in block_data["phases"]:
+            if phase_data.get("resources") and phase_data["resources"][0] in resources:
+                phase_data["resource"] = dict(resources[phase_data["resources"][0]])
+    return blocks
+
+
+def get_resources_by_id(db, main_user_id: str, resource_ids) -> dict:
+    """
+    Resolves resource documents with a single multi-get.
+
+    Returns:
+        A dict resource_id -> resource data (with "id"), only for resources that exist.
+    """
+    if not resource_ids:
+        return {}
+
+    resources_ref = resources_collection(db, main_user_id)
+    refs = [resources_ref.document(resource_id) for resource_id in resource_ids]
+
+    resources = {}
+    for resource_doc in db.get_all(refs):
+        if resource_doc.exists:
+            resource_data = resource_doc.to_dict()
+            resource_data["id"] = resource_doc.id
+            resources[resource_doc.id] = resource_data
+    return resources
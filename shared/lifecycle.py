@@ -0,0 +1,80 @@
+# shared/lifecycle.py
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Response
+
+from .config import FIREBASE_WARMUP, firebase, logger
+from .datastore import run_io
+from .logs import set_log_service
+
+# Startup of a service process: the lifespan initializes Firebase for this process, warms the Firestore
+# channel and runs the service startup hooks; GET /ready answers 503 until then (use it as the readiness
+# probe), GET /health only tells the process is up. Both report the measured startup times.
+health_router = APIRouter(tags=["health"])
+
+_status = {"ready": False, "started": False}
+
+
+def startup_status() -> dict:
+    return {**_status, "pid": os.getpid(), **firebase.timings}
+
+
+async def _warm_up(service: str) -> bool:
+    try:
+        await run_io(firebase.client)
+        if FIREBASE_WARMUP:
+            await run_io(firebase.warm_up)
+        return True
+    except Exception as e:
+        # the service starts anyway, GET /ready tries again
+        logger.error(f"Error initializing Firebase for {service}: {str(e)}")
+        return False
+
+
+def service_lifespan(service: str, *startup_hooks, import_started: float = None):
+    """
+    Lifespan of a service app.
+
+    Args:
+        service: Name used in the logs.
+        startup_hooks: Async functions without arguments run after Firebase is ready (ex: resume jobs).
+        import_started: time.perf_counter() taken on the first line of the entrypoint main.py, before any
+            third-party import; importSeconds is measured from it.
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        started = time.perf_counter()
+        _status["service"] = service
+        set_log_service(service)
+        if import_started is not None:
+            _status["importSeconds"] = round(started - import_started, 4)
+        firebase_ready = await _warm_up(service)
+        for hook in startup_hooks:
+            await hook()
+        _status["startupSeconds"] = round(time.perf_counter() - started, 4)
+        _status["started"] = True
+        _status["ready"] = firebase_ready
+        logger.info(
+            f"{service} started in process {os.getpid()}: import {_status['importSeconds']}s, "
+            f"startup {_status['startupSeconds']}s, ready={firebase_ready}"
+        )
+        yield
+        _status["ready"] = False
+        _status["started"] = False
+
+    return lifespan
+
+
+@health_router.get("/health")
+async def health():
+    return startup_status()
+
+
+@health_router.get("/ready")
+async def ready(response: Response):
+    if _status["started"] and not _status["ready"]:
+        _status["ready"] = await _warm_up(_status["service"])
+    if not _status["ready"]:
+        response.status_code = 503
+    return startup_status()
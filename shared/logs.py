@@ -0,0 +1,193 @@
+# shared/logs.py
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging of the services. The handlers only put the records in a queue: formatting and the write to stderr
+# happen in a background thread (QueueListener), so the event loop and the datastore threads do not wait on
+# stdout. Records are JSON lines with the request fields (method, route, tenant, uid) bound by
+# LogContextMiddleware and get_current_user. Use %-style args (logger.info("Ops found: %s", len(ops))): the
+# message is rendered when the record is queued, after the level and sampling filters, and not at all when the
+# record is filtered or sampled out. The JSON formatting and the write stay in the listener thread.
+#   LOG_LEVEL          minimum level (INFO)
+#   LOG_FORMAT         json | text
+#   LOG_SAMPLE_RATES   fraction of the records kept per level, ex: "DEBUG=0.01,INFO=0.25" (others are all kept)
+#   LOG_MAX_MESSAGE    INFO and DEBUG messages longer than this are truncated (large payloads go to DEBUG)
+#   LOG_QUEUE_SIZE     records waiting to be written; when full new records are dropped and counted
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_MAX_MESSAGE = int(os.getenv("LOG_MAX_MESSAGE", "2000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_context = ContextVar("log_context", default=None)
+_state = {"service": None, "listener": None, "handler": None, "dropped": 0}
+
+CONTEXT_FIELDS = ("method", "route", "tenant", "uid")
+
+
+def parse_sample_rates(value: str) -> dict:
+    # "DEBUG=0.01,INFO=0.25" -> {10: 0.01, 20: 0.25}
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        level, _, rate = item.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+def set_log_service(service: str) -> None:
+    _state["service"] = service
+
+
+def bind_log_context(**fields) -> None:
+    """
+    Adds fields (ex: tenant, uid) to the records of the current request. Works from the threads of the
+    sync dependencies too, the context dict is shared with the request.
+    """
+    context = _context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def dropped_records() -> int:
+    return _state["dropped"]
+
+
+class SamplingFilter(logging.Filter):
+    # runs in the calling thread, before the record is queued: dropped records cost almost nothing
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record) -> bool:
+        rate = self.rates.get(record.levelno)
+        if rate is None or record.exc_info:
+            return True
+        return random.random() < rate
+
+
+class AsyncQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # called after the filters: the message is rendered now, in the calling thread, so args the request keeps
+        # mutating are not read later by the listener; the exception stays for the formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        context = _context.get()
+        if context is not None:
+            scope = context.get("scope")
+            route = scope.get("route") if scope is not None else None
+            record.route = getattr(route, "path", None) or context.get("path")
+            for field in ("method", "tenant", "uid"):
+                setattr(record, field, context.get(field))
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _state["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        message = record.getMessage()
+        if record.levelno <= logging.INFO and len(message) > LOG_MAX_MESSAGE:
+            message = f"{message[:LOG_MAX_MESSAGE]}... ({len(message)} chars)"
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+            "service": _state["service"],
+            "pid": record.process,
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def formatMessage(self, record) -> str:
+        if record.levelno <= logging.INFO and len(record.message) > LOG_MAX_MESSAGE:
+            record.message = f"{record.message[:LOG_MAX_MESSAGE]}... ({len(record.message)} chars)"
+        return super().formatMessage(record)
+
+
+def _start_listener() -> None:
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    listener = QueueListener(_state["handler"].queue, output, respect_handler_level=False)
+    listener.start()
+    _state["listener"] = listener
+
+
+def _stop_listener() -> None:
+    listener = _state["listener"]
+    if listener is not None:
+        _state["listener"] = None
+        listener.stop()  # writes the records still in the queue
+
+
+def _after_fork() -> None:
+    # the listener thread does not exist in a forked child: new queue and thread
+    if _state["handler"] is not None:
+        _state["handler"].queue = queue.Queue(LOG_QUEUE_SIZE)
+        _state["listener"] = None
+        _start_listener()
+
+
+def configure_logging() -> None:
+    """
+    Installs the queue handler on the root logger (once per process).
+    """
+    if _state["handler"] is not None:
+        return
+    handler = AsyncQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    rates = parse_sample_rates(LOG_SAMPLE_RATES)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    _state["handler"] = handler
+    _start_listener()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class LogContextMiddleware:
+    """
+    ASGI middleware: binds the request fields (method, path, matched route) to the records logged while
+    the request runs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _context.set({"scope": scope, "method": scope["method"], "path": scope["path"]})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _context.reset(token)
@@ -0,0 +1,690 @@
+# shared/memory_store.py
+import json
+import random
+import string
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from .metrics import record_rpc
+
+# In-memory stand-in of the Firestore client (STORAGE_BACKEND=memory, benchmarks, load tests).
+# It implements the subset of the google-cloud-firestore API used by the services: references, get/set/update/
+# delete/add, set(merge=True | [field paths]), where (positional or FieldFilter), order_by, limit, start_after,
+# select, collection_group, get_all, batches, BulkWriter, transactions (@firestore.transactional works on them)
+# and the write transforms (SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion, ArrayRemove).
+# Every RPC is counted in `stats` and sleeps `latency` seconds to mimic the network round-trip of the real client.
+# Documents are kept per collection path; reads return copies, like the real client.
+
+DOCUMENT_ID = FieldPath.document_id()  # "__name__"
+_ID_CHARS = string.ascii_letters + string.digits
+
+
+class Stats:
+    def __init__(self):
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+
+    def reset(self):
+        self.rpcs = self.reads = self.writes = 0
+
+    def as_dict(self) -> dict:
+        return {"rpcs": self.rpcs, "reads": self.reads, "writes": self.writes}
+
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _split(field_path: str) -> list:
+    return field_path.split(".")
+
+
+def _get_path(data: dict, field_path: str, default=None):
+    value = data
+    for part in _split(field_path):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+_MISSING = object()
+
+
+def _now():
+    now = datetime.now(timezone.utc)
+    return DatetimeWithNanoseconds(
+        now.year, now.month, now.day, now.hour, now.minute, now.second, now.microsecond, tzinfo=timezone.utc
+    )
+
+
+def _transform(value, current):
+    # value written at a field, with the transforms resolved against the current value
+    if value is transforms.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if item not in result:
+                result.append(_copy(item))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        return [item for item in current if item not in value.values] if isinstance(current, list) else []
+    if isinstance(value, dict):
+        current = current if isinstance(current, dict) else {}
+        return {
+            key: _transform(item, current.get(key))
+            for key, item in value.items() if item is not transforms.DELETE_FIELD
+        }
+    return _copy(value)
+
+
+def _write_field(data: dict, parts, value) -> None:
+    for part in parts[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    if value is transforms.DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = _transform(value, data.get(parts[-1]))
+
+
+def _leaves(data: dict, prefix=()):
+    # (field path parts, value) of a set(merge=True), maps are merged field by field
+    for key, value in data.items():
+        if isinstance(value, dict) and value:
+            yield from _leaves(value, prefix + (key,))
+        else:
+            yield prefix + (key,), value
+
+
+def _project(data: dict, field_paths) -> dict:
+    projected = {}
+    for field_path in field_paths:
+        value = _get_path(data, field_path, _MISSING)
+        if value is not _MISSING:
+            _write_field(projected, _split(field_path), value)
+    return projected
+
+
+# Firestore ordering between value types
+def _type_rank(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 7
+    return 8
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank in (7, 8):
+        return rank, repr(value)
+    return rank, value
+
+
+def _compare(left, right) -> int:
+    left, right = _sort_key(left), _sort_key(right)
+    return (left > right) - (left < right)
+
+
+def _matches(value, op: str, expected) -> bool:
+    if op == "==":
+        return value is not _MISSING and value == expected
+    if op == "!=":
+        return value is not _MISSING and value is not None and value != expected
+    if op == "in":
+        return value is not _MISSING and value in expected
+    if op == "not-in":
+        return value is not _MISSING and value is not None and value not in expected
+    if op == "array_contains":
+        return isinstance(value, list) and expected in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(item in value for item in expected)
+    if value is _MISSING or _type_rank(value) != _type_rank(expected):
+        return False
+    comparison = _compare(value, expected)
+    return {"<": comparison < 0, "<=": comparison <= 0, ">": comparison > 0, ">=": comparison >= 0}[op]
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.create_time = None
+        self.update_time = None
+        self.read_time = None
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        value = _get_path(self._data or {}, field_path, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<MemoryDocumentReference {self.path}>"
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str):
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def collections(self, page_size=None, timeout=None, retry=None):
+        self._client._rpc()
+        return [self.collection(name) for name in sorted(self._client._subcollections.get(self.path, ()))]
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        if transaction is not None:
+            return transaction.get(self)
+        self._client._rpc(reads=1)
+        return self._client._snapshot(self, field_paths)
+
+    def set(self, document_data: dict, merge=False, retry=None, timeout=None):
+        self._client._commit([("set", self, document_data, merge)])
+
+    def create(self, document_data: dict, retry=None, timeout=None):
+        self._client._commit([("create", self, document_data, None)])
+
+    def update(self, field_updates: dict, option=None, retry=None, timeout=None):
+        self._client._commit([("update", self, field_updates, None)])
+
+    def delete(self, option=None, retry=None, timeout=None):
+        self._client._commit([("delete", self, None, None)])
+
+
+class MemoryQuery:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, collection_path: str = None, collection_id: str = None, filters=(), orders=(),
+                 limit=None, offset=0, cursor=None, projection=None):
+        self._client = client
+        self._collection_path = collection_path  # documents of one collection
+        self._collection_id = collection_id  # collection group
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy_with(self, **changes):
+        values = {
+            "collection_path": self._collection_path, "collection_id": self._collection_id,
+            "filters": self._filters, "orders": self._orders, "limit": self._limit, "offset": self._offset,
+            "cursor": self._cursor, "projection": self._projection,
+        }
+        values.update(changes)
+        return MemoryQuery(self._client, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy_with(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING):
+        return self._copy_with(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._copy_with(limit=count)
+
+    def offset(self, num_to_skip: int):
+        return self._copy_with(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy_with(projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy_with(cursor=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy_with(cursor=(document_fields_or_snapshot, True))
+
+    def _order_fields(self):
+        orders = list(self._orders)
+        if not any(field == DOCUMENT_ID for field, _ in orders):
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else self.ASCENDING))
+        return orders
+
+    def _value(self, path: str, data: dict, field: str):
+        if field == DOCUMENT_ID:
+            return path.rsplit("/", 1)[-1] if self._collection_path is not None else path.split("/")
+        return _get_path(data, field, _MISSING)
+
+    def _after_cursor(self, values, orders) -> bool:
+        cursor, inclusive = self._cursor
+        if isinstance(cursor, MemorySnapshot):
+            cursor_values = [
+                self._value(cursor.reference.path, cursor._data or {}, field) for field, _ in orders
+            ]
+        else:
+            cursor_values = []
+            for field, _ in orders:
+                key = field if field in cursor else None
+                if key is None:
+                    break
+                value = cursor[key]
+                if field == DOCUMENT_ID and self._collection_path is None and isinstance(value, str):
+                    value = value.split("/")
+                cursor_values.append(value)
+        for value, cursor_value, (_, direction) in zip(values, cursor_values, orders):
+            comparison = _compare(value, cursor_value)
+            if direction == self.DESCENDING:
+                comparison = -comparison
+            if comparison:
+                return comparison > 0
+        return inclusive
+
+    def _run(self):
+        client = self._client
+        with client._lock:
+            if self._collection_path is not None:
+                items = [
+                    (f"{self._collection_path}/{doc_id}", data)
+                    for doc_id, data in client._collections.get(self._collection_path, {}).items()
+                ]
+            else:
+                items = [
+                    (f"{collection_path}/{doc_id}", data)
+                    for collection_path in client._groups.get(self._collection_id, ())
+                    for doc_id, data in client._collections.get(collection_path, {}).items()
+                ]
+            items = [
+                (path, data) for path, data in items
+                if all(_matches(self._value(path, data, field), op, value) for field, op, value in self._filters)
+            ]
+
+            orders = self._order_fields()
+            rows = []
+            for path, data in items:
+                values = [self._value(path, data, field) for field, _ in orders]
+                if _MISSING in values:
+                    continue  # order_by excludes the documents without the field
+                rows.append((values, path, data))
+            for index in range(len(orders) - 1, -1, -1):
+                rows.sort(key=lambda row: _sort_key(row[0][index]), reverse=orders[index][1] == self.DESCENDING)
+            if self._cursor is not None:
+                rows = [row for row in rows if self._after_cursor(row[0], orders)]
+            rows = rows[self._offset:]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+            return [
+                MemorySnapshot(
+                    MemoryDocumentReference(client, path),
+                    _project(data, self._projection) if self._projection is not None else _copy(data),
+                )
+                for _, path, data in rows
+            ]
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        snapshots = self._run()
+        self._client._rpc(reads=max(len(snapshots), 1))
+        return snapshots
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        return iter(self.get(transaction=transaction))
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client, path: str):
+        super().__init__(client, collection_path=path)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self.path:
+            return None
+        return MemoryDocumentReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def document(self, document_id: str = None):
+        return MemoryDocumentReference(self._client, f"{self.path}/{document_id or self._client._new_id()}")
+
+    def add(self, document_data: dict, document_id: str = None, retry=None, timeout=None):
+        doc_ref = self.document(document_id)
+        doc_ref.create(document_data)
+        return _now(), doc_ref
+
+    def list_documents(self, page_size=None, retry=None, timeout=None):
+        # also the ids that only have subcollections, like the real client
+        client = self._client
+        client._rpc()
+        with client._lock:
+            ids = set(client._collections.get(self.path, ()))
+            prefix = self.path + "/"
+            ids.update(
+                path[len(prefix):] for path in client._subcollections
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+            )
+        return [self.document(doc_id) for doc_id in sorted(ids)]
+
+
+class MemoryWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data: dict, merge=False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data: dict):
+        self._writes.append(("create", reference, document_data, None))
+
+    def update(self, reference, field_updates: dict, option=None):
+        self._writes.append(("update", reference, field_updates, None))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, None))
+
+    def commit(self, retry=None, timeout=None):
+        writes, self._writes = self._writes, []
+        self._client._commit(writes)
+        return [None] * len(writes)
+
+
+class MemoryBulkWriter(MemoryWriteBatch):
+    # BulkWriter: writes are sent in batches of 20 as they are added, close() flushes the rest
+    BATCH_SIZE = 20
+
+    def __init__(self, client, options=None):
+        super().__init__(client)
+
+    def _add(self, write):
+        self._writes.append(write)
+        if len(self._writes) >= self.BATCH_SIZE:
+            self.flush()
+
+    def set(self, reference, document_data: dict, merge=False):
+        self._add(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data: dict):
+        self._add(("create", reference, document_data, None))
+
+    def update(self, reference, field_updates: dict, option=None):
+        self._add(("update", reference, field_updates, None))
+
+    def delete(self, reference, option=None):
+        self._add(("delete", reference, None, None))
+
+    def flush(self):
+        if self._writes:
+            self.commit()
+
+    def close(self):
+        self.flush()
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Transactions run one at a time: the store lock is held from the begin to the commit or rollback.
+    Supports the private protocol used by @firestore.transactional.
+    """
+
+    def __init__(self, client, max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._client._lock.acquire()
+        self._id = self._client._new_id().encode()
+
+    def _rollback(self):
+        if self._id is not None:
+            self._clean_up()
+            self._client._lock.release()
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._clean_up()
+            self._client._lock.release()
+
+    def get(self, ref_or_query, retry=None, timeout=None):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            self._client._rpc(reads=1)
+            return self._client._snapshot(ref_or_query)
+        return iter(ref_or_query.get())
+
+    def get_all(self, references, retry=None, timeout=None):
+        return self._client.get_all(references)
+
+
+class MemoryFirestore:
+    """
+    In-memory Firestore client.
+
+    Args:
+        latency: Seconds slept per RPC.
+        seed: Seed of the generated document ids (reproducible runs).
+    """
+
+    def __init__(self, latency: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.stats = Stats()
+        self._collections = defaultdict(dict)  # collection path -> {document id: data}
+        self._groups = defaultdict(set)  # collection id -> collection paths (collection_group)
+        self._subcollections = defaultdict(set)  # document path -> subcollection ids
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+
+    def _new_id(self) -> str:
+        with self._lock:
+            return "".join(self._random.choice(_ID_CHARS) for _ in range(20))
+
+    def _rpc(self, reads: int = 0, writes: int = 0) -> None:
+        with self._lock:
+            self.stats.rpcs += 1
+            self.stats.reads += reads
+            self.stats.writes += writes
+        record_rpc(reads, writes)
+        if self.latency:
+            time.sleep(self.latency)
+
+    # storage
+
+    def _register(self, collection_path: str) -> None:
+        if collection_path in self._collections:
+            return
+        self._collections[collection_path]  # defaultdict creates it
+        parent, _, collection_id = collection_path.rpartition("/")
+        self._groups[collection_id].add(collection_path)
+        if parent:
+            self._subcollections[parent].add(collection_id)
+
+    def _unregister(self, collection_path: str) -> None:
+        if self._collections.get(collection_path):
+            return
+        self._collections.pop(collection_path, None)
+        parent, _, collection_id = collection_path.rpartition("/")
+        self._groups[collection_id].discard(collection_path)
+        if parent:
+            self._subcollections[parent].discard(collection_id)
+            if not self._subcollections[parent]:
+                del self._subcollections[parent]
+
+    def _read(self, path: str):
+        collection_path, _, doc_id = path.rpartition("/")
+        collection = self._collections.get(collection_path)
+        return collection.get(doc_id) if collection else None
+
+    def _snapshot(self, reference, field_paths=None) -> MemorySnapshot:
+        with self._lock:
+            data = self._read(reference.path)
+            if data is not None:
+                data = _project(data, field_paths) if field_paths is not None else _copy(data)
+        return MemorySnapshot(reference, data)
+
+    def _apply(self, kind: str, path: str, data, merge) -> None:
+        collection_path, _, doc_id = path.rpartition("/")
+        current = self._read(path)
+        if kind == "delete":
+            if current is not None:
+                del self._collections[collection_path][doc_id]
+                self._unregister(collection_path)
+            return
+        if kind == "create" and current is not None:
+            raise AlreadyExists(f"Document already exists: {path}")
+        if kind == "update":
+            if current is None:
+                raise NotFound(f"No document to update: {path}")
+            document = _copy(current)
+            for field_path, value in data.items():
+                _write_field(document, _split(field_path), value)
+        elif kind == "set" and merge is True:
+            document = _copy(current) if current is not None else {}
+            for parts, value in _leaves(data):
+                _write_field(document, list(parts), value)
+        elif kind == "set" and merge:
+            document = _copy(current) if current is not None else {}
+            for field_path in merge:
+                value = _get_path(data, field_path, _MISSING)
+                _write_field(document, _split(field_path), transforms.DELETE_FIELD if value is _MISSING else value)
+        else:
+            document = _transform(data, None)
+        self._register(collection_path)
+        self._collections[collection_path][doc_id] = document
+
+    def _commit(self, writes) -> None:
+        # writes of a batch are applied atomically: checked on copies first, then stored
+        with self._lock:
+            for kind, reference, data, merge in writes:
+                if kind == "update" and self._read(reference.path) is None and not any(
+                    other_kind in ("set", "create") and other.path == reference.path
+                    for other_kind, other, _, _ in writes
+                ):
+                    raise NotFound(f"No document to update: {reference.path}")
+            for kind, reference, data, merge in writes:
+                self._apply(kind, reference.path, data, merge)
+        self._rpc(writes=len(writes))
+
+    # client API
+
+    def collection(self, collection_path: str):
+        return MemoryCollectionReference(self, collection_path)
+
+    def document(self, document_path: str):
+        return MemoryDocumentReference(self, document_path)
+
+    def collection_group(self, collection_id: str):
+        return MemoryQuery(self, collection_id=collection_id)
+
+    def collections(self, retry=None, timeout=None):
+        self._rpc()
+        with self._lock:
+            names = sorted({path for path in self._collections if "/" not in path})
+        return [self.collection(name) for name in names]
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        references = list(references)
+        self._rpc(reads=max(len(references), 1))
+        return [self._snapshot(reference, field_paths) for reference in references]
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def bulk_writer(self, options=None):
+        return MemoryBulkWriter(self, options)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False):
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def close(self):
+        pass
+
+    # seed data
+
+    def load(self, documents: dict) -> int:
+        """
+        Stores documents given as {document path: data} (no RPC counted).
+
+        Returns:
+            Number of documents stored.
+        """
+        with self._lock:
+            for path, data in documents.items():
+                collection_path, _, doc_id = path.rpartition("/")
+                self._register(collection_path)
+                self._collections[collection_path][doc_id] = _copy(data)
+        return len(documents)
+
+    def dump(self) -> dict:
+        with self._lock:
+            return {
+                f"{collection_path}/{doc_id}": _copy(data)
+                for collection_path, docs in self._collections.items()
+                for doc_id, data in docs.items()
+            }
+
+    def load_file(self, file_path: str) -> int:
+        # JSON {document path: data}, "$timestamp" strings (ISO 8601) become datetimes
+        with open(file_path, encoding="utf-8") as seed_file:
+            documents = json.load(seed_file, object_hook=_decode_timestamps)
+        return self.load(documents)
+
+
+def _decode_timestamps(data: dict):
+    if set(data) == {"$timestamp"}:
+        return datetime.fromisoformat(data["$timestamp"])
+    return data
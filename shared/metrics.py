@@ -0,0 +1,314 @@
+# shared/metrics.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import APIRouter, Response
+
+from .cache import cache_stats
+
+# Per-request instrumentation and the Prometheus endpoint (GET /metrics) of every service.
+# MetricsMiddleware creates a RequestMetrics for each request in a context variable; the datastore counts
+# come from the client itself (instrument_client wraps the Firestore GAPIC calls, the memory store reports its
+# RPCs), run_io adds the time spent waiting for blocking calls, get_current_user the token verification and
+# FastJSONResponse the serialization. The totals are observed in histograms per route and sent back in the
+# Server-Timing header (auth, datastore, serialize, total). run_io copies the context into its thread pool.
+# Metrics are per process: with several uvicorn workers each scrape reads the worker that answers.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class RequestMetrics:
+    __slots__ = ("rpcs", "reads", "writes", "seconds", "_lock")
+
+    def __init__(self):
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+        self.seconds = {"auth": 0.0, "datastore": 0.0, "serialize": 0.0}
+        self._lock = threading.Lock()  # gather_io runs calls of one request in several threads
+
+    def add_rpc(self, reads: int = 0, writes: int = 0, rpcs: int = 1) -> None:
+        with self._lock:
+            self.rpcs += rpcs
+            self.reads += reads
+            self.writes += writes
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] += seconds
+
+    def server_timing(self, total: float) -> str:
+        return ", ".join(
+            [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.seconds.items()]
+            + [f'rpc;desc="rpcs={self.rpcs} reads={self.reads} writes={self.writes}"', f"total;dur={total * 1000:.1f}"]
+        )
+
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_rpc(reads: int = 0, writes: int = 0) -> None:
+    # called by the datastore clients for every RPC, outside a request it does nothing
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_rpc(reads, writes)
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Adds the time of the block to the current request ("auth", "datastore" or "serialize").
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_time(name, time.perf_counter() - started)
+
+
+# Prometheus registry (text exposition format 0.0.4)
+
+def _label_text(labels: dict) -> str:
+    if not labels:
+        return ""
+    values = ",".join(
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels.items()
+    )
+    return "{" + values + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(dict(zip(self.label_names, labels)))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                label_dict = dict(zip(self.label_names, labels))
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text({**label_dict, 'le': bound})} {count}")
+                lines.append(f"{self.name}_bucket{_label_text({**label_dict, 'le': '+Inf'})} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(label_dict)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(label_dict)} {series[-1]}")
+        return lines
+
+
+ROUTE_LABELS = ("service", "method", "route")
+
+requests_total = Counter("http_requests_total", "Requests by route and status.", ROUTE_LABELS + ("status",))
+request_seconds = Histogram("http_request_duration_seconds", "Request duration.", ROUTE_LABELS, SECONDS_BUCKETS)
+auth_seconds = Histogram("auth_duration_seconds", "Token verification time per request.", ROUTE_LABELS, SECONDS_BUCKETS)
+datastore_seconds = Histogram(
+    "datastore_duration_seconds", "Time waiting for datastore calls per request.", ROUTE_LABELS, SECONDS_BUCKETS
+)
+serialize_seconds = Histogram("serialize_duration_seconds", "JSON rendering time per request.", ROUTE_LABELS, SECONDS_BUCKETS)
+datastore_rpcs = Histogram("datastore_rpcs", "Datastore RPCs per request.", ROUTE_LABELS, COUNT_BUCKETS)
+datastore_reads = Histogram("datastore_reads", "Documents read per request.", ROUTE_LABELS, COUNT_BUCKETS)
+datastore_writes = Histogram("datastore_writes", "Documents written per request.", ROUTE_LABELS, COUNT_BUCKETS)
+
+REGISTRY = [
+    requests_total, request_seconds, auth_seconds, datastore_seconds, serialize_seconds,
+    datastore_rpcs, datastore_reads, datastore_writes,
+]
+
+
+def _cache_lines() -> list:
+    # counters of the TTL caches (shared/cache.py)
+    stats = cache_stats()
+    lines = []
+    for metric, field, kind in (
+        ("cache_hits_total", "hits", "counter"),
+        ("cache_misses_total", "misses", "counter"),
+        ("cache_evictions_total", "evictions", "counter"),
+        ("cache_entries", "size", "gauge"),
+    ):
+        lines += [f"# HELP {metric} TTL cache {field}.", f"# TYPE {metric} {kind}"]
+        lines += [f"{metric}{_label_text({'cache': name})} {values[field]}" for name, values in sorted(stats.items())]
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _cache_lines()
+    return "\n".join(lines) + "\n"
+
+
+def observe_request(service: str, method: str, route: str, status: int, total: float, metrics: RequestMetrics) -> None:
+    labels = (service, method, route)
+    requests_total.inc(labels + (str(status),))
+    request_seconds.observe(labels, total)
+    auth_seconds.observe(labels, metrics.seconds["auth"])
+    datastore_seconds.observe(labels, metrics.seconds["datastore"])
+    serialize_seconds.observe(labels, metrics.seconds["serialize"])
+    datastore_rpcs.observe(labels, metrics.rpcs)
+    datastore_reads.observe(labels, metrics.reads)
+    datastore_writes.observe(labels, metrics.writes)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: per-request RequestMetrics, Server-Timing header and the route histograms.
+    Add it last (outermost) so the total includes the other middlewares.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        status = 500
+        finished = None
+
+        async def send_with_timing(message):
+            nonlocal status, finished
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = metrics.server_timing(time.perf_counter() - started).encode()
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", timing)]}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = time.perf_counter()  # background tasks that run after the body are not counted
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            observe_request(
+                self.service, scope["method"], getattr(route, "path", "unmatched"), status,
+                (finished or time.perf_counter()) - started, metrics,
+            )
+
+
+metrics_router = APIRouter(tags=["metrics"])
+
+
+@metrics_router.get("/metrics")
+async def metrics_endpoint():
+    return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Firestore client instrumentation: the GAPIC methods of the client are wrapped once, every RPC of any
+# reference, query, batch or transaction goes through them.
+
+class _CountingStream:
+    # streamed responses (batch_get_documents, run_query): the RPC is counted when it starts, the documents
+    # as they arrive (a stream left unconsumed still counts its RPC)
+    def __init__(self, stream, fields, metrics):
+        self._stream = stream
+        self._fields = fields
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.add_rpc()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        response = next(self._stream)
+        pb = getattr(response, "_pb", response)
+        if self._metrics is not None and any(pb.HasField(field) for field in self._fields):
+            self._metrics.add_rpc(reads=1, rpcs=0)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _wrap_stream(method, fields):
+    def call(*args, **kwargs):
+        # the stream is consumed later, maybe in another thread: bind it to the current request now
+        return _CountingStream(iter(method(*args, **kwargs)), fields, _current.get())
+    return call
+
+
+def _wrap_commit(method):
+    def call(*args, **kwargs):
+        response = method(*args, **kwargs)
+        record_rpc(writes=len(getattr(response, "write_results", ()) or ()))
+        return response
+    return call
+
+
+def _wrap_rpc(method):
+    def call(*args, **kwargs):
+        record_rpc()
+        return method(*args, **kwargs)
+    return call
+
+
+def instrument_client(client) -> None:
+    """
+    Counts the RPCs, reads and writes of a google.cloud.firestore Client in the current request metrics.
+    """
+    api = client._firestore_api
+    if getattr(api, "_instrumented", False):
+        return
+    api.batch_get_documents = _wrap_stream(api.batch_get_documents, ("found", "missing"))
+    api.run_query = _wrap_stream(api.run_query, ("document",))
+    api.commit = _wrap_commit(api.commit)
+    # BulkWriter sends BatchWrite RPCs: one write result per write, like commit
+    api.batch_write = _wrap_commit(api.batch_write)
+    for name in ("begin_transaction", "rollback", "list_documents", "list_collection_ids", "run_aggregation_query"):
+        setattr(api, name, _wrap_rpc(getattr(api, name)))
+    api._instrumented = True
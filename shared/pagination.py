@@ -0,0 +1,82 @@
+# shared/pagination.py
+import base64
+import json
+import os
+import re
+from typing import Optional
+from fastapi import HTTPException, Query, Response
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Cursor pagination and field projection for the list endpoints.
+# Pages are ordered by document id (stable, no extra index needed) and the cursor is the
+# last id of the page encoded as an opaque string. The next cursor is sent in the
+# X-Next-Cursor response header so the body keeps the same shape as before.
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size, max {MAX_PAGE_SIZE}"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, ex: name,code"),
+) -> dict:
+    # FastAPI dependency with the page parameters shared by the list endpoints
+    return {
+        "limit": min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE),
+        "cursor": decode_cursor(cursor) if cursor else None,
+        "fields": parse_fields(fields) if fields else None,
+    }
+
+
+def encode_cursor(document_id: str) -> str:
+    raw = json.dumps({"id": document_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: str) -> list:
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    for name in names:
+        if not _FIELD_RE.match(name):
+            raise HTTPException(status_code=400, detail=f"Invalid field: {name}")
+    return names
+
+
+def paginate(query, page: dict):
+    """
+    Runs one page of a Firestore query (blocking, call it through run_io).
+
+    Args:
+        query: Collection reference or query, already filtered.
+        page: Parameters returned by page_params.
+
+    Returns:
+        (documents, next_cursor), next_cursor is None on the last page.
+    """
+    query = query.order_by(FieldPath.document_id())
+    if page["fields"]:
+        query = query.select(page["fields"])
+    if page["cursor"]:
+        query = query.start_after({FieldPath.document_id(): page["cursor"]})
+
+    # one extra document tells if there is a next page
+    docs = list(query.limit(page["limit"] + 1).stream())
+    if len(docs) > page["limit"]:
+        docs = docs[:page["limit"]]
+        return docs, encode_cursor(docs[-1].id)
+    return docs, None
+
+
+def set_next_cursor(response: Response, next_cursor) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,40 @@
+# shared/repository.py
+
+# Paths of the tenant collections, in one place. Every service builds its references with these helpers
+# from the `db` of shared.config, which is the Firestore client or the in-memory store (STORAGE_BACKEND=memory,
+# shared/memory_store.py); the shared helpers that receive `db` as argument (hydration, estimates, block trees)
+# work with both, so the benchmarks and load tests run the same code offline.
+#   users/{uid}
+#   users/{main}/templates | resourcesTypes | blocks | blocks/{block}/phases | resources | ops | child_users
+
+
+def user_document(db, user_id: str):
+    return db.collection('users').document(user_id)
+
+
+def templates_collection(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('templates')
+
+
+def resource_types_collection(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('resourcesTypes')
+
+
+def blocks_collection(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('blocks')
+
+
+def phases_collection(db, main_user_id: str, block_id: str):
+    return blocks_collection(db, main_user_id).document(block_id).collection('phases')
+
+
+def resources_collection(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('resources')
+
+
+def ops_collection(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('ops')
+
+
+def child_users_collection(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('child_users')
@@ -0,0 +1,187 @@
+# shared/responses.py
+import os
+import zlib
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+from fastapi import Response
+from google.cloud.firestore_v1 import GeoPoint
+from google.cloud.firestore_v1.transforms import Sentinel
+
+from .metrics import timed
+
+try:
+    import orjson
+except ImportError:  # pydantic-core is always installed with FastAPI
+    orjson = None
+    from pydantic_core import to_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fast JSON responses for the large list endpoints.
+# FastAPI's default path walks the whole payload with jsonable_encoder and then calls json.dumps; FastJSONResponse
+# serializes the dicts straight to bytes (orjson, or pydantic-core when orjson is not installed) and only calls
+# firestore_default for the types the serializer does not know: Firestore timestamps (DatetimeWithNanoseconds),
+# DocumentReference, GeoPoint and write sentinels (SERVER_TIMESTAMP in a dict that was just written).
+# Return it from the endpoint (json_response) so jsonable_encoder is skipped.
+# CompressionMiddleware compresses bodies above COMPRESSION_MIN_SIZE with brotli or gzip (Accept-Encoding).
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def firestore_default(value):
+    # same output as jsonable_encoder for these types
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Sentinel):
+        return None  # value resolved by the server, not known here
+    if isinstance(value, GeoPoint):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    if hasattr(value, "path") and hasattr(value, "id"):  # DocumentReference
+        return value.path
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=firestore_default, option=orjson.OPT_NON_STR_KEYS)
+    return to_json(content, fallback=firestore_default)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with timed("serialize"):
+            return dumps(content)
+
+
+def json_response(content: Any, response: Response = None, status_code: int = 200) -> FastJSONResponse:
+    """
+    FastJSONResponse with the headers already set on the injected Response (ETag, X-Next-Cursor...).
+    """
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def _accepted_encoding(headers) -> str:
+    accept = ""
+    for name, value in headers:
+        if name == b"accept-encoding":
+            accept = value.decode("latin-1").lower()
+    encodings = {part.split(";")[0].strip() for part in accept.split(",")}
+    if brotli is not None and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return ""
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+        self.encoding = encoding
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        # end of a streamed chunk, the client can decode what was sent so far
+        if self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: brotli (when the brotli package is installed) or gzip for JSON, NDJSON and text bodies of
+    at least COMPRESSION_MIN_SIZE bytes. Streamed responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _accepted_encoding(scope["headers"])
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body chunk decides
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is None:
+                # next chunks of a streamed response
+                if compressor is None:
+                    await send(message)
+                    return
+                data = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            headers = {name.lower(): value for name, value in start.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            compressible = (
+                b"content-encoding" not in headers
+                and start["status"] not in (204, 304)
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+                and (more_body or len(body) >= self.minimum_size)
+            )
+            if not compressible:
+                await send(start)
+                start = None
+                await send(message)
+                return
+
+            compressor = _Compressor(encoding)
+            data = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+            raw = [(name, value) for name, value in start.get("headers", []) if name.lower() not in (b"content-length", b"vary")]
+            vary = headers.get(b"vary", b"")
+            raw += [(b"content-encoding", encoding.encode()), (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding")]
+            if not more_body:
+                raw.append((b"content-length", str(len(data)).encode()))
+            await send({**start, "headers": raw})
+            start = None
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,67 @@
+# shared/selected_template.py
+import os
+from fastapi import HTTPException
+from .cache import TTLCache
+from .config import db, logger
+from .datastore import run_io, gather_io
+from .repository import user_document
+from .versions import read_versions
+
+# Resolves the template selected by the logged user (users/{uid}.selectedTemplate) for the list endpoints.
+# Main users keep their profile in users/{uid}; child users in users/{main}/child_users/{uid} and fall back
+# to the template selected by the main user. Results are cached per user with the tenant's "selection"
+# version (users/{main}/meta/versions, bumped by select_template) they were read with, and only used while it
+# is unchanged: a selection made through auth_template is seen by the other processes on the next request.
+# The list endpoints already read the versions document for their ETag and pass it here, so a hit costs no
+# read. Read the versions before the profile, never concurrently, or an old selection could be cached under
+# a newer version. The TTL only bounds the memory.
+SELECTED_TEMPLATE_CACHE_SIZE = int(os.getenv("SELECTED_TEMPLATE_CACHE_SIZE", "10000"))
+SELECTED_TEMPLATE_CACHE_TTL = int(os.getenv("SELECTED_TEMPLATE_CACHE_TTL", "300"))
+
+selected_template_cache = TTLCache("selected_templates", maxsize=SELECTED_TEMPLATE_CACHE_SIZE, ttl=SELECTED_TEMPLATE_CACHE_TTL)
+
+
+async def get_selected_template(current_user: dict, versions: dict = None):
+    """
+    Returns the selected template id of the current user, or None when no template is selected.
+
+    Args:
+        current_user: The verified user (uid, mainUserId).
+        versions: The tenant's versions document when the handler already read it (read here otherwise).
+
+    Raises:
+        HTTPException: 404 if the user profile does not exist.
+    """
+    user_id = current_user['uid']
+    main_user_id = current_user['mainUserId']
+
+    if versions is None:
+        versions = await run_io(read_versions, db, main_user_id)
+    version = versions.get("selection", 0)
+    cached = selected_template_cache.get(user_id)
+    if cached is not None and cached["version"] == version:
+        return cached["templateId"]
+
+    main_ref = user_document(db, main_user_id)
+    if user_id == main_user_id:
+        user_doc = await run_io(main_ref.get)
+        main_doc = user_doc
+    else:
+        child_ref = main_ref.collection('child_users').document(user_id)
+        user_doc, main_doc = await gather_io(child_ref.get, main_ref.get)
+
+    if not user_doc.exists:
+        logger.error(f"User {user_id} not found")
+        raise HTTPException(status_code=404, detail="User not found")
+
+    selected_template = user_doc.to_dict().get('selectedTemplate')
+    if not selected_template and main_doc.exists:
+        selected_template = main_doc.to_dict().get('selectedTemplate')
+
+    selected_template_cache.set(user_id, {"templateId": selected_template, "version": version}, tag=main_user_id)
+    return selected_template
+
+
+def invalidate_selected_template(main_user_id: str) -> None:
+    # frees the entries right away in the writing process, the version change covers the others
+    selected_template_cache.invalidate_tag(main_user_id)
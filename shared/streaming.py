@@ -0,0 +1,45 @@
+# shared/streaming.py
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .responses import dumps
+
+# Opt-in NDJSON responses (Accept: application/x-ndjson) for the large list endpoints.
+# Documents are read from Firestore's .stream() generator and written one JSON object per line,
+# so the client starts rendering right away and the worker never holds the whole collection. Each line goes
+# through the serializer of json_response (shared/responses.py), so both formats encode values the same way.
+# StreamingResponse consumes sync generators in a thread pool, the blocking stream does not hold the event loop.
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield dumps(item) + b"\n"
+
+
+def ndjson_response(items) -> StreamingResponse:
+    """
+    Streams an iterable of dicts as NDJSON.
+    """
+    return StreamingResponse(ndjson_lines(items), media_type=NDJSON_MEDIA_TYPE)
+
+
+def iter_documents(query, fields=None):
+    # documents of a query as dicts with "id", one at a time
+    if fields:
+        query = query.select(fields)
+    for doc in query.stream():
+        data = doc.to_dict()
+        data["id"] = doc.id
+        yield data
+
+
+def documents_ndjson(query, fields=None) -> StreamingResponse:
+    """
+    Streams every document of a Firestore query as NDJSON (pagination is not applied, fields is).
+    """
+    return ndjson_response(iter_documents(query, fields))
@@ -0,0 +1,43 @@
+# shared/template_cache.py
+import os
+from .cache import TTLCache
+from .versions import read_versions
+
+# Ownership of templates, (mainUserId, templateId) -> {"exists": bool, "owner": user_id, "dayMinutes": int, "version"}.
+# Used by full_block.validate_template on every write path; dayMinutes (working minutes of a day) converts
+# durations in days for the OP estimates.
+# validate_template uses an entry without any read: the update/delete handlers of auth_template invalidate it
+# in their process (monolith mode) and other processes see the change when the short TTL expires.
+# Readers that already loaded the tenant's "templates" version (users/{main}/meta/versions, bumped by every
+# template write, ex: GET /blocks/full) pass it and only use entries read with that same version. Read the
+# version before the template (templates_version), never concurrently, or an old template could be cached
+# under a newer version. Missing templates are kept for an even shorter time.
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "5000"))
+TEMPLATE_CACHE_TTL = int(os.getenv("TEMPLATE_CACHE_TTL", "30"))
+TEMPLATE_NEGATIVE_CACHE_TTL = int(os.getenv("TEMPLATE_NEGATIVE_CACHE_TTL", "5"))
+
+template_cache = TTLCache("templates", maxsize=TEMPLATE_CACHE_SIZE, ttl=TEMPLATE_CACHE_TTL)
+
+
+def templates_version(db, main_user_id: str) -> int:
+    return read_versions(db, main_user_id).get("templates", 0)
+
+
+def get_template_ownership(main_user_id: str, template_id: str, version: int = None):
+    # version None: any live entry; otherwise only an entry read with that templates version
+    entry = template_cache.get((main_user_id, template_id))
+    if entry is None or (version is not None and entry["version"] != version):
+        return None
+    return entry
+
+
+def set_template_ownership(main_user_id: str, template_id: str, version: int, exists: bool, owner: str = None, day_minutes: int = None) -> dict:
+    entry = {"exists": exists, "owner": owner, "dayMinutes": day_minutes, "version": version}
+    ttl = TEMPLATE_CACHE_TTL if exists else TEMPLATE_NEGATIVE_CACHE_TTL
+    template_cache.set((main_user_id, template_id), entry, ttl=ttl, tag=main_user_id)
+    return entry
+
+
+def invalidate_template(main_user_id: str, template_id: str) -> None:
+    # frees the entry right away in the writing process, the others wait for the TTL (or a newer version)
+    template_cache.invalidate((main_user_id, template_id))
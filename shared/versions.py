@@ -0,0 +1,82 @@
+# shared/versions.py
+import hashlib
+import os
+from fastapi import Request, Response
+from firebase_admin import firestore
+
+from .datastore import run_io
+from .repository import user_document
+
+# Per-tenant version counters for conditional GETs, users/{main}/meta/versions:
+#   {"blocks": n, "resources": n, "ops": n, "templates": n, "resourcesTypes": n, "selection": n}
+# Every write handler increments the counter of the collections it changes in the same batch or transaction
+# (phases and resource assignments count as "blocks"; select_template bumps "selection", checked by the cache
+# of shared/selected_template.py). The list endpoints read this single document, build a weak ETag from the
+# versions and the request variant (query string, Accept, selected template) and answer If-None-Match with
+# 304 before running the collection query.
+ETAG_ENABLED = os.getenv("ETAG_ENABLED", "true").lower() == "true"
+
+
+def versions_ref(db, main_user_id: str):
+    return user_document(db, main_user_id).collection('meta').document('versions')
+
+
+def bump_versions(writer, db, main_user_id: str, *collections) -> None:
+    # adds the increment to a WriteBatch or Transaction
+    writer.set(
+        versions_ref(db, main_user_id),
+        {**{collection: firestore.Increment(1) for collection in collections}, "updatedAt": firestore.SERVER_TIMESTAMP},
+        merge=True,
+    )
+
+
+def versioned_batch(db, main_user_id: str, *collections):
+    """
+    WriteBatch that also increments the versions of the collections, add the writes and commit it as usual.
+    """
+    batch = db.batch()
+    bump_versions(batch, db, main_user_id, *collections)
+    return batch
+
+
+def read_versions(db, main_user_id: str) -> dict:
+    versions_doc = versions_ref(db, main_user_id).get()
+    return versions_doc.to_dict() if versions_doc.exists else {}
+
+
+async def list_etag(request: Request, db, main_user_id: str, collections, *variant, versions: dict = None):
+    """
+    Weak ETag of a list response, None when ETags are disabled.
+
+    Args:
+        collections: Collections the response is built from.
+        variant: Other values the response depends on (ex: the selected template).
+        versions: The versions document when the handler already read it.
+    """
+    if not ETAG_ENABLED:
+        return None
+    if versions is None:
+        versions = await run_io(read_versions, db, main_user_id)
+    version = ".".join(f"{collection}{versions.get(collection, 0)}" for collection in collections)
+    key = "|".join([request.url.path, str(request.url.query), request.headers.get("accept", "")] + [str(value) for value in variant])
+    return f'W/"{version}-{hashlib.blake2s(key.encode(), digest_size=6).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    if etag is None:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def set_etag(response: Response, etag) -> None:
+    if etag is not None:
+        response.headers["ETag"] = etag
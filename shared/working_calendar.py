@@ -0,0 +1,260 @@
+# shared/working_calendar.py
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+# Working time of a template (shifts, working week and holidays) compiled to sorted integer arrays.
+# Times are minutes since EPOCH (naive datetimes, same clock as the stored dates); each working
+# interval i is [starts[i], ends[i]) and cum[i] holds the working minutes before it, so converting
+# between a datetime and a "working minute" offset is one bisect.
+# The arrays cover a rolling horizon from the calendar start and grow on demand; an extension builds
+# new arrays and swaps them at once, so a calendar shared between threads is never read half-built.
+EPOCH = datetime(1970, 1, 1)
+DAY = 1440
+
+
+def to_epoch_minutes(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return int((value - EPOCH).total_seconds() // 60)
+
+
+def from_epoch_minutes(minutes: int) -> datetime:
+    return EPOCH + timedelta(minutes=minutes)
+
+
+def parse_time(value: str) -> int:
+    # "HH:mm:ss" or "HH:mm" -> minutes of the day
+    parts = [int(part) for part in value.split(":")]
+    return parts[0] * 60 + (parts[1] if len(parts) > 1 else 0)
+
+
+def parse_date(value) -> date:
+    # holiday dates are ISO strings ("2025-12-25" or a full ISO datetime), "dd/mm/yyyy" is accepted too
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    if "/" in value:
+        return datetime.strptime(value[:10], "%d/%m/%Y").date()
+    return date.fromisoformat(value[:10])
+
+
+def parse_holidays(template: dict) -> set:
+    holidays = (template.get("holidays") or {}).get("holidays") or []
+    dates = set()
+    for holiday in holidays:
+        value = holiday.get("date") if isinstance(holiday, dict) else None
+        if value:
+            dates.add(parse_date(value))
+    return dates
+
+
+def parse_shifts(template: dict) -> list:
+    # sorted (entry, exit) minutes of the day, exit > entry (overnight shifts end on the next day)
+    shifts = []
+    for shift in template.get("shifts") or []:
+        if not shift.get("entry") or not shift.get("exit"):
+            continue
+        entry, exit_ = parse_time(shift["entry"]), parse_time(shift["exit"])
+        if exit_ <= entry:  # overnight shift
+            exit_ += DAY
+        shifts.append((entry, exit_))
+    return sorted(shifts)
+
+
+def working_day_minutes(template: dict) -> int:
+    # working minutes of one working day (unit of DurationType.days)
+    return sum(exit_ - entry for entry, exit_ in parse_shifts(template))
+
+
+def calendar_fingerprint(template: dict) -> tuple:
+    """
+    Fields of a template that define its working time; two templates with the same fingerprint
+    compile to the same calendar (used as the cache version).
+    """
+    shifts = tuple((shift.get("entry"), shift.get("exit")) for shift in template.get("shifts") or [])
+    return (shifts, template.get("weekStart"), template.get("weekEnd"), tuple(sorted(parse_holidays(template))))
+
+
+class WorkingCalendar:
+    def __init__(self, template: dict, start: datetime, days: int = 365):
+        """
+        Args:
+            template: Template document (shifts, weekStart, weekEnd, holidays).
+            start: First instant of the calendar, earlier instants count as the start.
+            days: Number of days compiled up front, later days are compiled when needed.
+        """
+        self.start = start.replace(tzinfo=None)
+        self.week_start = int(template.get("weekStart", 1))
+        self.week_end = int(template.get("weekEnd", 5))
+        self.holidays = parse_holidays(template)
+
+        self.shifts = parse_shifts(template)
+        self.day_minutes = sum(exit_ - entry for entry, exit_ in self.shifts)
+
+        self.origin = to_epoch_minutes(self.start)
+        self._arrays = ([], [], [0])  # (starts, ends, cum), replaced as a whole on extension
+        self._next_day = self.start.date() - timedelta(days=1)  # shifts of the previous day can end after start
+        self._lock = threading.Lock()
+        self._extend_days(days + 1)
+
+    @property
+    def starts(self) -> list:
+        return self._arrays[0]
+
+    @property
+    def ends(self) -> list:
+        return self._arrays[1]
+
+    @property
+    def cum(self) -> list:
+        return self._arrays[2]
+
+    @property
+    def total(self) -> int:
+        # working minutes compiled
+        return self._arrays[2][-1]
+
+    @property
+    def horizon(self) -> datetime:
+        # first day not compiled yet
+        return datetime(self._next_day.year, self._next_day.month, self._next_day.day)
+
+    def is_working_day(self, day: date) -> bool:
+        if day in self.holidays:
+            return False
+        dow = (day.weekday() + 1) % 7  # 0 = sunday
+        if self.week_start <= self.week_end:
+            return self.week_start <= dow <= self.week_end
+        return dow >= self.week_start or dow <= self.week_end
+
+    def _extend_days(self, days: int) -> None:
+        with self._lock:
+            starts, ends, cum = (list(array) for array in self._arrays)
+            for _ in range(days):
+                day = self._next_day
+                self._next_day = day + timedelta(days=1)
+                if not self.is_working_day(day):
+                    continue
+                base = to_epoch_minutes(datetime(day.year, day.month, day.day))
+                for entry, exit_ in self.shifts:
+                    start, end = max(base + entry, self.origin), base + exit_
+                    if end <= start:
+                        continue
+                    if ends and start <= ends[-1]:
+                        # overlapping or adjacent shifts are merged
+                        if end > ends[-1]:
+                            cum[-1] += end - ends[-1]
+                            ends[-1] = end
+                        continue
+                    starts.append(start)
+                    ends.append(end)
+                    cum.append(cum[-1] + end - start)
+            self._arrays = (starts, ends, cum)
+
+    def extend_to(self, working_minutes: int) -> None:
+        """
+        Compiles more days until the calendar holds at least working_minutes.
+        """
+        if self.day_minutes <= 0:
+            raise ValueError("Template has no working shifts")
+        while self.total < working_minutes:
+            missing_days = (working_minutes - self.total) // self.day_minutes + 1
+            self._extend_days(max(7, missing_days * 7 // 5 + 7))
+
+    def _extend_until(self, minute: int) -> None:
+        # every interval starting before `minute` compiled (a shift never starts after its own day)
+        while to_epoch_minutes(self.horizon) <= minute:
+            self._extend_days(max(30, (minute - to_epoch_minutes(self.horizon)) // DAY + 1))
+
+    def to_working(self, value: datetime) -> int:
+        """
+        Working minutes between the calendar start and value.
+        """
+        minute = to_epoch_minutes(value)
+        self._extend_until(minute)
+        starts, ends, cum = self._arrays
+        i = bisect_right(starts, minute) - 1
+        if i < 0:
+            return 0
+        return cum[i] + min(minute, ends[i]) - starts[i]
+
+    def to_epoch(self, working: int, end: bool = False) -> int:
+        """
+        Instant (minutes since EPOCH) reached after `working` working minutes.
+        end=True returns the end of the previous interval on a boundary (for end times).
+        """
+        if working > self.total or (not end and working == self.total):
+            self.extend_to(max(working + 1, self.total * 2))  # geometric growth, few extensions for a long plan
+        starts, _, cum = self._arrays
+        i = (bisect_left(cum, working) if end else bisect_right(cum, working)) - 1
+        i = min(max(i, 0), len(starts) - 1)
+        return starts[i] + working - cum[i]
+
+    def to_datetime(self, working: int, end: bool = False) -> datetime:
+        return from_epoch_minutes(self.to_epoch(working, end))
+
+    def to_datetimes(self, values, end: bool = False) -> dict:
+        """
+        Converts many working minutes at once (plan output): the distinct values are sorted and
+        matched to the intervals in one linear walk.
+
+        Returns:
+            A dict working minute -> datetime.
+        """
+        values = sorted(set(values))
+        if not values:
+            return {}
+        if values[-1] >= self.total:
+            self.extend_to(max(values[-1] + 1, self.total * 2))
+
+        result = {}
+        starts, _, cum = self._arrays
+        last = len(starts) - 1
+        i = 0
+        for working in values:
+            # first interval holding `working` (end=True keeps a boundary in the previous interval)
+            while i < last and (cum[i + 1] < working or (cum[i + 1] == working and not end)):
+                i += 1
+            result[working] = EPOCH + timedelta(minutes=starts[i] + working - cum[i])
+        return result
+
+    def to_workings(self, minutes: list) -> list:
+        """
+        to_working for a sorted list of instants in minutes since EPOCH (bucket edges), in one linear walk.
+        """
+        if not minutes:
+            return []
+        self._extend_until(minutes[-1])
+        starts, ends, cum = self._arrays
+        result = []
+        i = -1
+        for minute in minutes:
+            while i + 1 < len(starts) and starts[i + 1] <= minute:
+                i += 1
+            result.append(0 if i < 0 else cum[i] + min(minute, ends[i]) - starts[i])
+        return result
+
+    def add_working_minutes(self, value: datetime, minutes: int) -> datetime:
+        """
+        Instant reached after working `minutes` from value (value itself may be outside working time).
+        A positive duration ends at the end of a shift rather than at the start of the next one.
+        """
+        working = self.to_working(value) + minutes
+        if working < 0:
+            raise ValueError("Result is before the calendar start")
+        return self.to_datetime(working, end=minutes > 0)
+
+    def working_minutes_between(self, start: datetime, end: datetime) -> int:
+        """
+        Working minutes in [start, end), negative when end is before start.
+        """
+        return self.to_working(end) - self.to_working(start)
+
+    def next_working_instant(self, value: datetime) -> datetime:
+        """
+        value itself when it falls inside a shift, otherwise the start of the next shift.
+        """
+        return self.to_datetime(self.to_working(value))
@@ -0,0 +1,33 @@
+# tests/conftest.py
+import os
+
+# in-memory storage and unsigned tokens (shared/memory_store.py, shared/auth.py), set before any import of shared
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("AUTH_VERIFIER", "stub")
+os.environ.setdefault("FIREBASE_WARMUP", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest
+
+from shared import cache
+from shared.config import firebase
+from shared.memory_store import MemoryFirestore
+from benchmarks.loadtest.seed import stub_token
+
+
+@pytest.fixture
+def store():
+    # a new empty store and empty caches for every test
+    memory = MemoryFirestore(seed=1)
+    firebase._ensure()
+    firebase._db = memory
+    for ttl_cache in cache._caches.values():
+        ttl_cache.clear()
+    return memory
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(main_user_id: str) -> dict:
+        return {"Authorization": f"Bearer {stub_token(main_user_id)}"}
+    return headers
@@ -0,0 +1,97 @@
+from operator import itemgetter
+
+import pytest
+from fastapi.testclient import TestClient
+
+from shared import block_trees
+from shared.block_trees import check_block_trees, iter_block_trees, rebuild_block_trees, tree_ref
+from shared.config import db
+from shared.hydration import iter_blocks
+from services.full_block.main import app
+
+CLEAN = {"missing": [], "stale": [], "orphan": []}
+
+
+def problems(report: dict) -> dict:
+    return {key: report[key] for key in CLEAN}
+
+
+@pytest.fixture
+def client(store, auth_headers):
+    store.load({
+        "users/main1": {"name": "Main", "selectedTemplate": "t1"},
+        "users/main1/templates/t1": {"user_id": "main1", "name": "Padrão", "shifts": []},
+        "users/main1/resources/r1": {"name": "Prensa", "templateId": "t1", "mainUserId": "main1"},
+    })
+    with TestClient(app, headers=auth_headers("main1")) as client:
+        yield client
+
+
+def create_block(client) -> str:
+    response = client.post("/blocks", json={"name": "Block", "description": "", "templateId": "t1", "durationType": 0})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def create_phase(client, block_id: str, name: str = "Phase") -> str:
+    response = client.post(f"/blocks/{block_id}/phases", json={"name": name, "description": "", "duration": 10})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_tree_follows_phase_writes(client):
+    block_id = create_block(client)
+    phase_id = create_phase(client, block_id)
+    second_id = create_phase(client, block_id, "Second")
+    assert problems(check_block_trees(db, "main1")) == CLEAN
+
+    updated = client.put(f"/blocks/{block_id}/phases/{phase_id}", json={"name": "Renamed", "description": "", "duration": 20})
+    assert updated.status_code == 200, updated.text
+    assigned = client.post(f"/blocks/{block_id}/phases/{phase_id}/assign-resource", params={"resource_id": "r1"})
+    assert assigned.status_code == 200, assigned.text
+    assert problems(check_block_trees(db, "main1")) == CLEAN
+
+    deleted = client.delete(f"/blocks/{block_id}/phases/{second_id}")
+    assert deleted.status_code == 200, deleted.text
+    assert problems(check_block_trees(db, "main1")) == CLEAN
+
+    tree = tree_ref(db, "main1", block_id).get().to_dict()
+    assert list(tree["phases"]) == [phase_id]
+    assert tree["phases"][phase_id]["name"] == "Renamed"
+    assert tree["phases"][phase_id]["resource"]["id"] == "r1"
+    assert tree["resourceIds"] == ["r1"]
+
+
+def test_trees_read_the_same_blocks_as_the_hydration(client):
+    block_id = create_block(client)
+    create_phase(client, block_id)
+    create_phase(client, block_id, "Second")
+    key = itemgetter("id")
+    assert problems(check_block_trees(db, "main1")) == CLEAN
+    trees = sorted(iter_block_trees(db, "main1"), key=key)
+    hydrated = sorted(iter_blocks(db, "main1", chunk_size=0), key=key)
+    assert [block_trees._comparable(block) for block in trees] == [block_trees._comparable(block) for block in hydrated]
+
+
+def test_check_and_rebuild_fix_missing_stale_and_orphan_trees(client, store):
+    block_id = create_block(client)
+    phase_id = create_phase(client, block_id)
+    store.load({
+        # created before the trees: a phase write only leaves a partial tree
+        "users/main1/blocks/old": {"name": "Old", "mainUserId": "main1", "templateId": "t1", "durationType": 0},
+        "users/main1/blocks/old/phases/p1": {"name": "Old phase", "duration": 5, "mainUserId": "main1"},
+        "users/main1/blockTrees/old": {"phases": {"p1": {"name": "Old phase"}}},
+        # tree of a block deleted outside the API
+        "users/main1/blockTrees/gone": {"block": {"name": "Gone"}, "phases": {}},
+    })
+    # phase changed without its tree
+    db.collection(f"users/main1/blocks/{block_id}/phases").document(phase_id).update({"duration": 99})
+
+    report = check_block_trees(db, "main1")
+    assert problems(report) == {"missing": ["old"], "stale": [block_id], "orphan": ["gone"]}
+
+    rebuilt = rebuild_block_trees(db, "main1")
+    assert rebuilt["written"] == 2
+    assert problems(check_block_trees(db, "main1")) == CLEAN
+    assert not tree_ref(db, "main1", "gone").get().exists
+    assert tree_ref(db, "main1", block_id).get().to_dict()["phases"][phase_id]["duration"] == 99
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from shared.config import db
+from shared.repository import ops_collection
+from shared.versions import read_versions
+from services.full_block.main import app
+
+CSV = {"Content-Type": "text/csv"}
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+@pytest.fixture
+def client(store, auth_headers):
+    store.load({
+        "users/main1": {"name": "Main", "selectedTemplate": "t1"},
+        "users/main1/templates/t1": {"user_id": "main1", "name": "Padrão", "shifts": []},
+    })
+    with TestClient(app, headers=auth_headers("main1")) as client:
+        yield client
+
+
+def saved_ops() -> dict:
+    return {doc.id: doc.to_dict() for doc in ops_collection(db, "main1").stream()}
+
+
+def test_csv_quoted_cells_can_span_lines(client):
+    body = (
+        'code,description,templateId,block\n'
+        '1,"first line\nsecond line",t1,"{\n  ""id"": ""b1"", ""name"": ""Block"", ""description"": """",\n'
+        '  ""templateId"": ""t1"", ""durationType"": 0\n}"\n'
+        '2,plain,t1,\n'
+    )
+    report = client.post("/ops/bulk", headers=CSV, content=body).json()
+    assert report["created"] == 2, report
+    assert [result["row"] for result in report["results"]] == [1, 2]
+
+    ops = {op["code"]: op for op in saved_ops().values()}
+    assert ops["1"]["description"] == "first line\nsecond line"
+    assert ops["1"]["block"]["id"] == "b1"
+    assert "block" not in ops["2"]
+
+
+def test_ndjson_rows_report_errors_per_row(client):
+    lines = [
+        json.dumps({"code": "1", "description": "ok", "templateId": "t1", "quantity": 2}),
+        "",  # blank lines are skipped, they are not rows
+        "{not json",
+        json.dumps({"code": "3", "description": "no template"}),
+        json.dumps({"code": "4", "description": "unknown template", "templateId": "missing"}),
+        json.dumps({"code": "5", "description": "zero", "templateId": "t1", "quantity": 0}),
+    ]
+    report = client.post("/ops/bulk", headers=NDJSON, content="\n".join(lines)).json()
+
+    assert (report["created"], report["failed"]) == (1, 4)
+    results = {result["row"]: result for result in report["results"]}
+    assert results[1]["status"] == "created" and results[1]["id"] in saved_ops()
+    assert results[2]["status"] == "error"
+    assert results[3]["error"] == "No templateId provided"
+    assert results[4]["error"] == "Template not found"
+    assert "quantity" in results[5]["error"]
+
+
+def test_csv_rows_are_parsed_with_the_header(client):
+    body = 'code,description,templateId,quantity,customColumn\r\n10,Prensa,t1,3,\r\n11,Corte,t1,abc,x\r\n'
+    report = client.post("/ops/bulk", headers=CSV, content=body).json()
+
+    assert (report["created"], report["failed"]) == (1, 1)
+    op = next(iter(saved_ops().values()))
+    assert (op["code"], op["quantity"]) == ("10", 3)
+    assert "customColumn" not in op  # empty cells are not sent
+    assert report["results"][1]["error"].startswith("quantity")
+
+
+@pytest.mark.parametrize("rows, commits", [(499, 1), (500, 2)])
+def test_rows_are_written_in_chunks_of_499(client, rows, commits):
+    body = "\n".join(json.dumps({"code": str(i), "description": "op", "templateId": "t1"}) for i in range(rows))
+    report = client.post("/ops/bulk", headers=NDJSON, content=body).json()
+
+    assert report["created"] == rows
+    assert len(saved_ops()) == rows
+    # every chunk is one WriteBatch that also increments the ops version (500 writes at most)
+    assert read_versions(db, "main1")["ops"] == commits
+    assert [result["row"] for result in report["results"]] == list(range(1, rows + 1))
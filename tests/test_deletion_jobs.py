@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services.auth_template import deletion
+
+
+class FakeAuth:
+    # fb_auth of the deletion job: the first delete_users call can fail
+    UserNotFoundError = type("UserNotFoundError", (Exception,), {})
+
+    def __init__(self, fail_first: bool = False):
+        self.fail_first = fail_first
+        self.deleted_users = []
+
+    def delete_users(self, uids):
+        if self.fail_first:
+            self.fail_first = False
+            raise RuntimeError("auth unavailable")
+        self.deleted_users += uids
+        return SimpleNamespace(errors=[], success_count=len(uids))
+
+    def delete_user(self, uid):
+        self.deleted_users.append(uid)
+
+
+@pytest.fixture
+def tenant(store):
+    store.load({
+        "users/main1": {"name": "Main"},
+        "users/main1/child_users/child1": {"name": "A"},
+        "users/main1/child_users/child2": {"name": "B"},
+        "users/main1/blocks/b1": {"name": "Block"},
+        "users/main1/blocks/b1/phases/p1": {"name": "Phase"},
+    })
+    return "main1"
+
+
+def test_job_deletes_data_and_child_users(tenant, store, monkeypatch):
+    auth = FakeAuth()
+    monkeypatch.setattr(deletion, "fb_auth", auth)
+
+    job = deletion.create_deletion_job(tenant, tenant)
+    assert deletion.run_deletion_job(job["id"]) is True
+
+    saved = deletion.get_deletion_job(tenant)
+    assert saved["status"] == deletion.JOB_DONE
+    assert saved["leaseOwner"] is None
+    assert sorted(auth.deleted_users) == ["child1", "child2", "main1"]
+    assert not [path for path in store.dump() if path.startswith("users/")]
+
+
+def test_retry_of_failed_job_keeps_child_users(tenant, store, monkeypatch):
+    auth = FakeAuth(fail_first=True)
+    monkeypatch.setattr(deletion, "fb_auth", auth)
+
+    deletion.run_deletion_job(deletion.create_deletion_job(tenant, tenant)["id"])
+    failed = deletion.get_deletion_job(tenant)
+    assert failed["status"] == deletion.JOB_FAILED
+    # the documents (child_users subcollection included) are gone before the Auth step failed
+    assert "users/main1/child_users/child1" not in store.dump()
+
+    retry = deletion.create_deletion_job(tenant, "admin")
+    assert retry["status"] == deletion.JOB_PENDING
+    assert retry["childUsers"] == ["child1", "child2"]
+    deletion.run_deletion_job(retry["id"])
+
+    done = deletion.get_deletion_job(tenant)
+    assert done["status"] == deletion.JOB_DONE
+    assert done["deletedDocuments"] >= failed["deletedDocuments"]
+    assert sorted(auth.deleted_users) == ["child1", "child2", "main1"]
+
+
+def test_job_leased_by_another_worker_is_not_run(tenant, store, monkeypatch):
+    auth = FakeAuth()
+    monkeypatch.setattr(deletion, "fb_auth", auth)
+    deletion.create_deletion_job(tenant, tenant)
+    deletion.job_ref(tenant).update({
+        "status": deletion.JOB_RUNNING,
+        "leaseOwner": "other-host:1:abc",
+        "leaseExpiresAt": datetime.now(timezone.utc) + timedelta(seconds=60),
+    })
+
+    assert deletion.run_deletion_job(tenant) is False
+    assert "users/main1" in store.dump()
+    assert auth.deleted_users == []
+
+
+def test_expired_lease_is_claimed(tenant, store, monkeypatch):
+    monkeypatch.setattr(deletion, "fb_auth", FakeAuth())
+    deletion.create_deletion_job(tenant, tenant)
+    deletion.job_ref(tenant).update({
+        "status": deletion.JOB_RUNNING,
+        "leaseOwner": "crashed-host:1:abc",
+        "leaseExpiresAt": datetime.now(timezone.utc) - timedelta(seconds=1),
+    })
+
+    deletion.resume_deletion_job(tenant)
+    assert deletion.get_deletion_job(tenant)["status"] == deletion.JOB_DONE
@@ -0,0 +1,41 @@
+import math
+
+import pytest
+from pydantic import ValidationError
+
+from services.full_block.estimates import PhaseIndex
+from services.full_block.models import OpModel
+
+BLOCKS = [
+    {"id": "minutes", "durationType": 0, "templateId": "t1", "phases": [{"duration": 10}, {"duration": 5}]},
+    {"id": "hours", "durationType": 1, "templateId": "t1", "phases": [{"duration": 1.5}]},
+    {"id": "days", "durationType": 2, "templateId": "t1", "phases": [{"duration": 0.5}, {"duration": 1}]},
+]
+
+
+@pytest.fixture
+def index():
+    return PhaseIndex(BLOCKS, {"t1": 480})
+
+
+def test_block_totals(index):
+    assert index.block_total("minutes") == 15
+    assert index.block_total("hours") == 90
+    assert index.block_total("days") == 720
+    assert index.block_total("unknown") is None
+
+
+def test_estimate_uses_the_real_quantity(index):
+    estimates = index.estimate(["minutes", "hours", "days", "minutes"], [3, 1, 2, None])
+    assert estimates[:3].tolist() == [45, 90, 1440]
+    assert estimates[3] == 15  # missing quantity counts as 1
+
+
+def test_estimate_of_unknown_block_is_nan(index):
+    assert math.isnan(index.estimate(["unknown"], [2])[0])
+
+
+@pytest.mark.parametrize("quantity", [0, -1])
+def test_op_quantity_must_be_positive(quantity):
+    with pytest.raises(ValidationError):
+        OpModel(description="OP", code="1", quantity=quantity)
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from services.auth_template.main import app as auth_app
+from services.full_block.main import app as blocks_app
+
+TEMPLATE = {
+    "user_id": "main1",
+    "name": "Padrão",
+    "holidays": {"holidays": []},
+    "weekStart": 1,
+    "weekEnd": 5,
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+}
+
+
+@pytest.fixture
+def clients(store):
+    store.load({
+        "users/main1": {"name": "Main", "selectedTemplate": "t1"},
+        "users/main1/templates/t1": TEMPLATE,
+    })
+    with TestClient(blocks_app) as blocks, TestClient(auth_app) as auth:
+        yield blocks, auth
+
+
+@pytest.fixture
+def block_id(clients, auth_headers):
+    # one block measured in days with a one-day phase, created through the API (block tree included)
+    blocks, _ = clients
+    headers = auth_headers("main1")
+    block = {"name": "Block", "description": "", "templateId": "t1", "durationType": 2}
+    block_id = blocks.post("/blocks", headers=headers, json=block).json()["id"]
+    phase = blocks.post(f"/blocks/{block_id}/phases", headers=headers, json={"name": "Phase", "description": "", "duration": 1})
+    assert phase.status_code == 200, phase.text
+    return block_id
+
+
+def get_full(client, headers, etag=None):
+    return client.get("/blocks/full", headers={**headers, **({"If-None-Match": etag} if etag else {})})
+
+
+def test_blocks_full_answers_304_until_a_block_changes(clients, block_id, auth_headers):
+    blocks, _ = clients
+    headers = auth_headers("main1")
+    first = get_full(blocks, headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = get_full(blocks, headers, etag)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+    created = blocks.post(f"/blocks/{block_id}/phases", headers=headers, json={"name": "Second", "description": "", "duration": 2})
+    assert created.status_code == 200, created.text
+    changed = get_full(blocks, headers, etag)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_template_edit_changes_blocks_full_totals(clients, block_id, auth_headers):
+    blocks, auth = clients
+    headers = auth_headers("main1")
+    first = get_full(blocks, headers)
+    assert first.json()["blocks"][0]["totalDuration"] == 480
+
+    edited = auth.put("/templates/t1", headers=headers, json={**TEMPLATE, "shifts": [{"entry": "08:00:00", "exit": "14:00:00"}]})
+    assert edited.status_code == 200, edited.text
+
+    second = get_full(blocks, headers, first.headers["etag"])
+    assert second.status_code == 200
+    assert second.json()["blocks"][0]["totalDuration"] == 360
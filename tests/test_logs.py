@@ -0,0 +1,32 @@
+import logging
+import queue
+
+from shared.logs import AsyncQueueHandler, SamplingFilter
+
+
+def make_logger(handler) -> logging.Logger:
+    logger = logging.getLogger("tests.logs")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_message_is_rendered_when_queued():
+    records = queue.Queue()
+    logger = make_logger(AsyncQueueHandler(records))
+    ops = ["op1"]
+    logger.info("Ops: %s", ops)
+    ops.append("op2")  # the request keeps going before the listener formats the record
+
+    record = records.get_nowait()
+    assert record.getMessage() == "Ops: ['op1']"
+    assert record.args is None
+
+
+def test_sampled_out_records_are_not_queued():
+    records = queue.Queue()
+    handler = AsyncQueueHandler(records)
+    handler.addFilter(SamplingFilter({logging.DEBUG: 0.0}))
+    make_logger(handler).debug("Payload: %s", {"large": True})
+    assert records.empty()
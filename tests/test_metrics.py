@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+from shared import metrics
+
+
+class FakeApi:
+    # GAPIC methods wrapped by instrument_client
+    def __init__(self):
+        for name in ("batch_get_documents", "run_query", "begin_transaction", "rollback", "list_documents",
+                     "list_collection_ids", "run_aggregation_query"):
+            setattr(self, name, lambda *args, **kwargs: iter(()))
+
+    def commit(self, request=None):
+        return SimpleNamespace(write_results=[None] * len(request["writes"]))
+
+    def batch_write(self, request=None):
+        return SimpleNamespace(write_results=[None] * len(request["writes"]), status=[None] * len(request["writes"]))
+
+
+def test_batch_write_of_bulk_writer_is_counted():
+    api = FakeApi()
+    metrics.instrument_client(SimpleNamespace(_firestore_api=api))
+    request_metrics = metrics.RequestMetrics()
+    token = metrics._current.set(request_metrics)
+    try:
+        api.commit(request={"writes": [1, 2]})
+        api.batch_write(request={"writes": [1, 2, 3]})
+    finally:
+        metrics._current.reset(token)
+    assert (request_metrics.rpcs, request_metrics.writes) == (2, 5)
@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from shared.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from services.full_block.main import app
+
+
+@pytest.fixture
+def client(store, auth_headers):
+    store.load({
+        "users/main1": {"name": "Main", "selectedTemplate": "t1"},
+        **{f"users/main1/resources/r{i}": {"name": f"Resource {i}", "templateId": "t1"} for i in range(1, 6)},
+        "users/main1/resources/other": {"name": "Other template", "templateId": "t2"},
+    })
+    with TestClient(app, headers=auth_headers("main1")) as client:
+        yield client
+
+
+def read_pages(client, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/resources", params=params)
+        assert response.status_code == 200
+        pages.append([resource["id"] for resource in response.json()["resources"]])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("r1")) == "r1"
+
+
+def test_pages_follow_the_next_cursor_until_the_last_page(client):
+    assert read_pages(client, 2) == [["r1", "r2"], ["r3", "r4"], ["r5"]]
+
+
+def test_full_last_page_has_no_next_cursor(client):
+    assert read_pages(client, 5) == [["r1", "r2", "r3", "r4", "r5"]]
+
+
+def test_fields_are_projected(client):
+    response = client.get("/resources", params={"limit": 1, "fields": "name"})
+    assert response.json()["resources"] == [{"name": "Resource 1", "id": "r1"}]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor("r1")[:-3]])
+def test_invalid_cursor_is_rejected(client, cursor):
+    response = client.get("/resources", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
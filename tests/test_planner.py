@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.full_block.main import app
+from services.production_orders.planner import Planner
+from services.production_orders.schedule import build_planner, tenant_planners
+from shared.working_calendar import WorkingCalendar
+
+TEMPLATE = {
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+    "weekStart": 0,
+    "weekEnd": 6,
+}
+BLOCKS = {"blk1": {"id": "blk1", "durationType": 0, "phases": [{"id": "ph1", "duration": 30, "resources": ["res1"]}]}}
+
+
+def op(op_id: str, quantity: int = 1) -> dict:
+    return {"id": op_id, "priority": 0, "quantity": quantity, "status": 0, "active": True, "block": {"id": "blk1"}}
+
+
+@pytest.fixture
+def planner():
+    # a plan built ten days ago, its first OPs start in the past
+    start = datetime.now().replace(second=0, microsecond=0) - timedelta(days=10)
+    calendar = WorkingCalendar(TEMPLATE, start)
+    return Planner("tpl", calendar, start, BLOCKS, [op("op1"), op("op2")])
+
+
+def now_working(planner) -> int:
+    return planner.calendar.to_working(datetime.now().replace(second=0, microsecond=0))
+
+
+def test_edited_op_is_not_placed_in_the_past(planner):
+    assert planner.placements["op1"][0][2] < now_working(planner)
+
+    planner.upsert_op(op("op1", quantity=2))
+    _, _, start, end = planner.placements["op1"][0]
+    assert start >= now_working(planner)
+    assert end - start == 60
+
+
+def test_new_op_is_not_placed_in_the_past(planner):
+    planner.upsert_op(op("op3"))
+    assert planner.placements["op3"][0][2] >= now_working(planner)
+
+
+def test_bulk_import_drops_the_cached_plans(store, auth_headers):
+    store.load({
+        "users/main1": {"name": "Main", "selectedTemplate": "t1"},
+        "users/main1/templates/t1": {**TEMPLATE, "user_id": "main1", "name": "Padrão"},
+    })
+    build_planner("main1", "t1")
+    assert tenant_planners("main1")
+
+    body = '{"description": "OP", "code": "1", "templateId": "t1"}\n'
+    with TestClient(app) as client:
+        response = client.post("/ops/bulk", headers={**auth_headers("main1"), "Content-Type": "application/x-ndjson"}, content=body)
+    assert response.json()["created"] == 1
+    # the planner subscribes in process (monolith), its plans are rebuilt with the imported OPs on the next read
+    assert tenant_planners("main1") == []
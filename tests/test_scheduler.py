@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from services.production_orders.scheduler import build_jobs, build_plan, schedule
+from shared.working_calendar import WorkingCalendar
+
+TEMPLATE = {
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+    "weekStart": 1,
+    "weekEnd": 5,
+}
+MONDAY = datetime(2026, 11, 2, 8, 0)
+
+
+def job(op_id: str, *tasks, priority: int = 1):
+    return ({"id": op_id, "priority": priority}, list(tasks))
+
+
+def test_phases_of_an_op_run_in_sequence():
+    placed = schedule([job("op1", ("cut", "r1", 30), ("press", "r2", 20))])
+    assert placed == [[("cut", "r1", 0, 30), ("press", "r2", 30, 50)]]
+
+
+def test_a_resource_runs_one_phase_at_a_time_by_priority():
+    placed = schedule([job("low", ("p", "r1", 60), priority=0), job("high", ("p", "r1", 60), priority=2)])
+    assert placed[1] == [("p", "r1", 0, 60)]
+    assert placed[0] == [("p", "r1", 60, 120)]
+
+
+def test_phase_waits_for_both_its_op_and_its_resource():
+    placed = schedule([
+        job("op1", ("a", "r1", 50)),
+        job("op2", ("b", "r2", 10), ("c", "r1", 10)),
+    ])
+    # op2's second phase is ready at 10 but r1 is busy until 50
+    assert placed[1] == [("b", "r2", 0, 10), ("c", "r1", 50, 60)]
+
+
+def test_phases_without_resource_have_no_capacity_limit():
+    placed = schedule([job("op1", ("manual", None, 30)), job("op2", ("manual", None, 30))], release=100)
+    assert [phases[0][2] for phases in placed] == [100, 100]
+
+
+def test_build_jobs_converts_units_and_reports_unschedulable_ops():
+    blocks = {
+        "hours": {"id": "hours", "durationType": 1, "phases": [{"id": "p1", "duration": 1.5, "resources": ["r1"]}]},
+        "days": {"id": "days", "durationType": 2, "phases": [{"id": "p1", "duration": 0.5}]},
+        "empty": {"id": "empty", "durationType": 0, "phases": []},
+    }
+    ops = [
+        {"id": "op1", "quantity": 2, "block": {"id": "hours"}},
+        {"id": "op2", "block": {"id": "days"}},
+        {"id": "op3", "block": {"id": "empty"}},
+        {"id": "op4", "block": {"id": "missing"}},
+        {"id": "op5", "status": 3, "block": {"id": "hours"}},  # finished, not planned
+    ]
+    jobs, unscheduled = build_jobs(ops, blocks, day_minutes=480)
+    assert [(op["id"], tasks) for op, tasks in jobs] == [("op1", [("p1", "r1", 180)]), ("op2", [("p1", None, 240)])]
+    assert unscheduled == [
+        {"opId": "op3", "reason": "block without phases"},
+        {"opId": "op4", "reason": "block not found"},
+    ]
+
+
+def test_plan_skips_lunch_and_weekend():
+    blocks = {"b1": {"id": "b1", "durationType": 0, "phases": [
+        {"id": "p1", "duration": 300, "resources": ["r1"]},
+        {"id": "p2", "duration": 1440, "resources": ["r2"]},
+    ]}}
+    ops = [{"id": "op1", "code": "1", "block": {"id": "b1"}, "dateLimit": datetime(2026, 11, 5, 17, 0)}]
+    plan = build_plan(ops, blocks, WorkingCalendar(TEMPLATE, MONDAY), MONDAY)
+
+    first, second = plan["ops"][0]["phases"]
+    assert (first["start"], first["end"]) == (MONDAY, datetime(2026, 11, 2, 14, 0))
+    # 24 working hours = 3 working days from Monday 14:00: Thursday 14:00
+    assert (second["start"], second["end"]) == (datetime(2026, 11, 2, 14, 0), datetime(2026, 11, 5, 14, 0))
+    assert plan["ops"][0]["late"] is False
+
+
+def test_plan_started_on_friday_continues_on_monday():
+    blocks = {"b1": {"id": "b1", "durationType": 1, "phases": [{"id": "p1", "duration": 2, "resources": ["r1"]}]}}
+    friday = datetime(2026, 11, 6, 16, 0)
+    ops = [{"id": "op1", "block": {"id": "b1"}, "dateLimit": datetime(2026, 11, 6, 17, 0)}]
+    plan = build_plan(ops, blocks, WorkingCalendar(TEMPLATE, friday), friday)
+
+    assert plan["ops"][0]["end"] == datetime(2026, 11, 9, 9, 0)
+    assert plan["ops"][0]["late"] is True
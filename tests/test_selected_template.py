@@ -0,0 +1,54 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from shared.config import db
+from shared.repository import user_document
+from shared.versions import read_versions, versioned_batch
+from services.auth_template.main import app as auth_app
+from services.full_block.main import app
+
+
+@pytest.fixture
+def client(store):
+    store.load({
+        "users/main1": {"name": "Main", "selectedTemplate": "t1"},
+        "users/main1/templates/t1": {"user_id": "main1", "name": "A"},
+        "users/main1/templates/t2": {"user_id": "main1", "name": "B"},
+        "users/main1/blocks/b1": {"name": "Block 1", "mainUserId": "main1", "templateId": "t1"},
+        "users/main1/blocks/b2": {"name": "Block 2", "mainUserId": "main1", "templateId": "t2"},
+    })
+    with TestClient(app) as client:
+        yield client
+
+
+def test_template_switch_is_seen_by_the_list_endpoints(client, auth_headers):
+    headers = auth_headers("main1")
+    first = client.get("/blocks", headers=headers)
+    assert [block["id"] for block in first.json()["blocks"]] == ["b1"]
+
+    # what select_template does in auth_template, another process: this process' cache is not invalidated
+    batch = versioned_batch(db, "main1", "selection")
+    batch.update(user_document(db, "main1"), {"selectedTemplate": "t2"})
+    batch.commit()
+
+    second = client.get("/blocks", headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert [block["id"] for block in second.json()["blocks"]] == ["b2"]
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+def test_second_list_request_does_not_read_the_user_profile(client, auth_headers, store):
+    headers = auth_headers("main1")
+    first = client.get("/blocks", headers=headers)
+
+    reads = store.stats.reads
+    second = client.get("/blocks", headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert second.status_code == 304
+    assert store.stats.reads - reads == 1  # the versions document only, no users/main1 read
+
+
+def test_select_template_bumps_the_selection_version(client, auth_headers):
+    with TestClient(auth_app) as auth:
+        assert auth.post("/select-template/t2", headers=auth_headers("main1")).status_code == 200
+    assert read_versions(db, "main1")["selection"] == 1
+    assert [block["id"] for block in client.get("/blocks", headers=auth_headers("main1")).json()["blocks"]] == ["b2"]
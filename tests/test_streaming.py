@@ -0,0 +1,24 @@
+import json
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, GeoPoint
+
+from shared.responses import json_response
+from shared.streaming import ndjson_lines
+
+
+def test_ndjson_lines_encode_like_json_response():
+    item = {
+        "id": "r1",
+        "createdAt": datetime(2026, 10, 17, 8, 30, tzinfo=timezone.utc),
+        "updatedAt": SERVER_TIMESTAMP,
+        "location": GeoPoint(-23.5, -46.6),
+        "name": "Prensa ção",
+    }
+    lines = list(ndjson_lines([item, {"id": "r2"}]))
+    assert all(isinstance(line, bytes) and line.endswith(b"\n") for line in lines)
+
+    expected = json.loads(json_response({"items": [item]}).body)["items"][0]
+    assert json.loads(lines[0]) == expected
+    assert expected["updatedAt"] is None
+    assert expected["location"] == {"latitude": -23.5, "longitude": -46.6}
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from shared import cache
+from shared.config import db
+from shared.repository import templates_collection
+from shared.template_cache import TEMPLATE_CACHE_TTL
+from shared.versions import versioned_batch
+from services.auth_template.main import app as auth_app
+from services.full_block.estimates import template_day_minutes
+from services.full_block.utils import validate_template
+
+TEMPLATE = {
+    "user_id": "main1",
+    "name": "Padrão",
+    "weekStart": 1,
+    "weekEnd": 5,
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+}
+DAY_BLOCK = {"id": "b1", "templateId": "t1", "durationType": 2, "phases": [{"duration": 1}]}
+
+
+@pytest.fixture
+def template(store):
+    store.load({"users/main1": {"name": "Main"}, "users/main1/templates/t1": TEMPLATE})
+    return templates_collection(db, "main1").document("t1")
+
+
+def write_from_other_process(write):
+    # what auth_template does on update/delete, without the invalidation of this process' cache
+    batch = versioned_batch(db, "main1", "templates")
+    write(batch)
+    batch.commit()
+
+
+def test_cache_hit_makes_no_read(template, store):
+    asyncio.run(validate_template("t1", "main1"))
+    reads = store.stats.reads
+    asyncio.run(validate_template("t1", "main1"))
+    assert store.stats.reads == reads
+
+
+def test_delete_through_auth_template_invalidates_right_away(template, auth_headers):
+    asyncio.run(validate_template("t1", "main1"))
+    with TestClient(auth_app) as auth:
+        assert auth.delete("/templates/t1", headers=auth_headers("main1")).status_code == 200
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(validate_template("t1", "main1"))
+    assert error.value.status_code == 404
+
+
+def test_delete_by_another_process_is_seen_after_the_ttl(template, monkeypatch):
+    asyncio.run(validate_template("t1", "main1"))
+    write_from_other_process(lambda batch: batch.delete(template))
+    asyncio.run(validate_template("t1", "main1"))  # still cached
+
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + TEMPLATE_CACHE_TTL + 1)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(validate_template("t1", "main1"))
+    assert error.value.status_code == 404
+
+
+def test_day_minutes_follow_template_edits(template):
+    assert template_day_minutes(db, "main1", [DAY_BLOCK]) == {"t1": 480}
+    write_from_other_process(lambda batch: batch.update(template, {"shifts": [{"entry": "08:00:00", "exit": "14:00:00"}]}))
+    assert template_day_minutes(db, "main1", [DAY_BLOCK]) == {"t1": 360}
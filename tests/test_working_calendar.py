@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from shared.working_calendar import WorkingCalendar, working_day_minutes
+
+# Monday to Friday, 08-12 and 13-17; Tuesday 2026-11-03 is a holiday
+TEMPLATE = {
+    "shifts": [{"entry": "08:00:00", "exit": "12:00:00"}, {"entry": "13:00:00", "exit": "17:00:00"}],
+    "weekStart": 1,
+    "weekEnd": 5,
+    "holidays": {"holidays": [{"date": "2026-11-03", "name": "Feriado"}]},
+}
+MONDAY = datetime(2026, 11, 2, 8, 0)
+
+
+@pytest.fixture
+def calendar():
+    return WorkingCalendar(TEMPLATE, MONDAY)
+
+
+def test_day_minutes():
+    assert working_day_minutes(TEMPLATE) == 480
+
+
+def test_lunch_break_is_not_working_time(calendar):
+    assert calendar.to_working(MONDAY) == 0
+    assert calendar.to_working(datetime(2026, 11, 2, 12, 30)) == 240
+    assert calendar.to_working(datetime(2026, 11, 2, 13, 30)) == 270
+    assert calendar.next_working_instant(datetime(2026, 11, 2, 12, 30)) == datetime(2026, 11, 2, 13, 0)
+
+
+def test_duration_ending_on_a_shift_boundary_ends_at_the_shift_end(calendar):
+    assert calendar.add_working_minutes(MONDAY, 240) == datetime(2026, 11, 2, 12, 0)
+    assert calendar.to_datetime(240) == datetime(2026, 11, 2, 13, 0)  # a start on the boundary is the next shift
+
+
+def test_holidays_are_skipped(calendar):
+    # Monday 16:00 + 2h: one hour on Monday, Tuesday is a holiday, one hour on Wednesday
+    assert calendar.add_working_minutes(datetime(2026, 11, 2, 16, 0), 120) == datetime(2026, 11, 4, 9, 0)
+    assert calendar.working_minutes_between(datetime(2026, 11, 2, 17, 0), datetime(2026, 11, 4, 8, 0)) == 0
+
+
+def test_weekends_are_skipped(calendar):
+    friday = datetime(2026, 11, 6, 16, 30)
+    assert calendar.add_working_minutes(friday, 60) == datetime(2026, 11, 9, 8, 30)
+    assert calendar.working_minutes_between(friday, datetime(2026, 11, 9, 9, 0)) == 90
+
+
+def test_batch_conversion_matches_single_conversion(calendar):
+    values = [0, 240, 241, 480, 2000]
+    converted = calendar.to_datetimes(values)
+    assert converted == {value: calendar.to_datetime(value) for value in values}
+
+
+def test_calendar_grows_past_the_compiled_horizon():
+    calendar = WorkingCalendar(TEMPLATE, MONDAY, days=7)
+    later = datetime(2027, 3, 1, 9, 0)  # a Monday
+    assert calendar.to_datetime(calendar.to_working(later)) == later